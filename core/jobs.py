@@ -0,0 +1,158 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Dataset, Report
+from .services.reports import build_report_data
+
+# Retry backoff base; attempt N waits RETRY_BACKOFF_SECONDS * 2**(N-1)
+RETRY_BACKOFF_SECONDS = 5
+
+
+class LeaseLost(Exception):
+    """
+    The dataset was requeued (stale lease) and claimed by another worker meanwhile.
+    """
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim_next_dataset(worker_id):
+    """
+    Atomically claims the oldest unprocessed dataset, or returns None when there is none.
+
+    Same compare-and-set UPDATE on (id, status='QUEUED') as the dispute analysis
+    queue, safe across threads, processes and hosts without row locks.
+    """
+    for _ in range(10):
+        now = timezone.now()
+        dataset_id = (
+            Dataset.objects.filter(status='QUEUED', processed=False, available_at__lte=now)
+            .order_by('available_at', 'id').values_list('id', flat=True).first()
+        )
+        if dataset_id is None:
+            return None
+
+        claimed = Dataset.objects.filter(id=dataset_id, status='QUEUED').update(
+            status='RUNNING',
+            worker_id=worker_id,
+            started_at=now,
+            stage='',
+            progress=0,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Dataset.objects.get(id=dataset_id)
+        # Another worker won the race; try the next candidate
+    return None
+
+
+def _owned(dataset):
+    return Dataset.objects.filter(id=dataset.id, status='RUNNING', worker_id=dataset.worker_id)
+
+
+def update_progress(dataset, stage, percent):
+    if not _owned(dataset).update(stage=stage, progress=percent):
+        raise LeaseLost(f"Dataset #{dataset.id} is no longer held by {dataset.worker_id}")
+
+
+def complete_dataset(dataset, data):
+    """
+    Saves the Report and marks the dataset DONE in one transaction, provided this
+    worker still holds it; otherwise nothing is written.
+    """
+    with transaction.atomic():
+        finished = _owned(dataset).update(
+            status='DONE', processed=True, stage='', progress=100, finished_at=timezone.now(), last_error='',
+        )
+        if not finished:
+            raise LeaseLost(f"Dataset #{dataset.id} is no longer held by {dataset.worker_id}")
+        Report.objects.update_or_create(dataset=dataset, defaults=data)
+
+
+def fail_dataset(dataset, error):
+    """
+    Re-queues a failed dataset with exponential backoff, or marks it FAILED once
+    max_attempts is reached.
+    """
+    now = timezone.now()
+    if dataset.attempts >= dataset.max_attempts:
+        _owned(dataset).update(status='FAILED', finished_at=now, last_error=str(error))
+    else:
+        delay = RETRY_BACKOFF_SECONDS * 2 ** (dataset.attempts - 1)
+        _owned(dataset).update(
+            status='QUEUED',
+            available_at=now + timedelta(seconds=delay),
+            last_error=str(error),
+        )
+    print(f"Dataset #{dataset.id} failed (attempt {dataset.attempts}/{dataset.max_attempts}): {error}")
+
+
+def run_dataset(dataset, pool=None, groups=1):
+    """
+    Builds and saves a claimed dataset's Report. Failures are re-queued with
+    exponential backoff until max_attempts is reached, after which the dataset
+    is marked FAILED. A worker that lost its lease drops the result.
+    """
+    try:
+        data = build_report_data(
+            dataset, pool=pool, groups=groups, progress=lambda stage, percent: update_progress(dataset, stage, percent),
+        )
+        complete_dataset(dataset, data)
+    except LeaseLost as e:
+        print(e)
+        return False
+    except Exception as e:
+        fail_dataset(dataset, e)
+        return False
+    return True
+
+
+def requeue_stale_datasets(lease_seconds):
+    """
+    Returns RUNNING datasets whose worker has held them longer than the lease to the queue
+    (e.g. the worker process was killed mid-report).
+    """
+    cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+    return Dataset.objects.filter(status='RUNNING', started_at__lt=cutoff).update(status='QUEUED', worker_id='')
+
+
+def work(worker_id=None, pool=None, groups=1, once=False, poll_interval=1.0, max_jobs=None, stop_event=None):
+    """
+    Worker loop: claims datasets and builds their reports until stopped. With
+    once=True it returns as soon as no dataset is waiting. Returns the number of
+    datasets processed.
+    """
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    try:
+        while not (stop_event and stop_event.is_set()):
+            if max_jobs is not None and processed >= max_jobs:
+                break
+            close_old_connections()
+            dataset = claim_next_dataset(worker_id)
+            if dataset is None:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            run_dataset(dataset, pool=pool, groups=groups)
+            processed += 1
+    finally:
+        connection.close()
+    return processed
+
+
+def init_worker_process():
+    # Spawned children start from a bare interpreter
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'data_intelligence_agent.settings')
+    django.setup()
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+from core.services.datasets import dataset_cache_options
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds Reports for unprocessed datasets: threads claim datasets, and a process pool '
+        'analyzes each dataset\'s column groups in parallel'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Datasets processed at once (threads)')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Pool processes for column groups (0 = in the worker thread)')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when no dataset is waiting')
+        parser.add_argument('--once', action='store_true', help='Exit once no dataset is waiting')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Per-thread dataset limit')
+        parser.add_argument('--lease-seconds', type=int, default=900, help='Requeue RUNNING datasets older than this')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        processes = max(0, options['processes'] or 0)
+        requeued = jobs.requeue_stale_datasets(options['lease_seconds'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale dataset(s).")
+        if processes > 1 and not dataset_cache_options()['SPILL_DIR']:
+            # Without the spill every pool process would parse the file again
+            self.stdout.write(self.style.WARNING("CORE_DATASET_CACHE has no SPILL_DIR; analyzing datasets without the pool."))
+            processes = 0
+
+        self.stdout.write(f"Starting {concurrency} worker thread(s), {processes or 'no'} pool process(es)...")
+        if processes > 1:
+            # Children must not inherit the parent's open database connections
+            connections.close_all()
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=jobs.init_worker_process) as pool:
+                processed = self._run_threads(concurrency, pool, processes, options)
+        else:
+            processed = self._run_threads(concurrency, None, 1, options)
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} dataset(s)."))
+
+    def _run_threads(self, concurrency, pool, groups, options):
+        stop_event = threading.Event()
+        results = [0] * concurrency
+
+        def target(slot):
+            results[slot] = jobs.work(
+                pool=pool,
+                groups=groups,
+                once=options['once'],
+                poll_interval=options['poll_interval'],
+                max_jobs=options['max_jobs'],
+                stop_event=stop_event,
+            )
+
+        threads = [threading.Thread(target=target, args=(i,), daemon=True) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers after current datasets...")
+            stop_event.set()
+            for t in threads:
+                t.join()
+        return sum(results)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='schema',
+            field=models.JSONField(default=dict),
+        ),
+    ]
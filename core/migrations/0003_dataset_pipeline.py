@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_processed(apps, schema_editor):
+    # Datasets processed before the pipeline existed are not queued again
+    Dataset = apps.get_model('core', 'Dataset')
+    Dataset.objects.filter(processed=True).update(status='DONE', progress=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_report_schema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='available_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Not claimable before this time (retry backoff)'),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='max_attempts',
+            field=models.PositiveIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Percent done'),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='stage',
+            field=models.CharField(blank=True, help_text='Pipeline step in progress', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='status',
+            field=models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='QUEUED', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='worker_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(backfill_processed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['status', 'available_at', 'id'], name='dataset_claim_idx'),
+        ),
+    ]
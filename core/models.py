@@ -1,10 +1,38 @@
 from django.db import models
+from django.utils import timezone
 
 class Dataset(models.Model):
+    """
+    An uploaded file. Unprocessed datasets are the queue of the `run_report_worker`
+    command, which claims them through the status fields below (core/jobs.py).
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
     file = models.FileField(upload_to='datasets/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processed = models.BooleanField(default=False)
 
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    stage = models.CharField(max_length=50, blank=True, help_text="Pipeline step in progress")
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent done")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    worker_id = models.CharField(max_length=100, blank=True)
+    available_at = models.DateTimeField(default=timezone.now, help_text="Not claimable before this time (retry backoff)")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id'], name='dataset_claim_idx'),
+        ]
+
     def __str__(self):
         return f"Dataset {self.id} - {self.uploaded_at}"
 
@@ -13,6 +41,8 @@ class Report(models.Model):
     profiling_data = models.JSONField(default=dict)
     anomaly_data = models.JSONField(default=dict)
     insights_data = models.JSONField(default=dict)
+    # Dtypes the dataset was read with and the memory they saved (core.services.schema)
+    schema = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -1,31 +1,150 @@
-import pandas as pd
+import io
+import warnings
+
 import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .streaming import StreamingProfile, streaming_options
+
+ANOMALY_DEFAULTS = {
+    'IQR_MULTIPLIER': 1.5,
+    # Outlier indices and values kept inline in the report, per column
+    'SAMPLE_SIZE': 20,
+    # Full outlier index sets are saved here (in default_storage), one .npz per dataset
+    'INDEX_DIR': 'anomalies',
+}
+
+
+def anomaly_options():
+    return {**ANOMALY_DEFAULTS, **getattr(settings, 'CORE_ANOMALY_DETECTION', {})}
+
+
+def iqr_bounds(q1, q3, multiplier):
+    iqr = q3 - q1
+    return q1 - multiplier * iqr, q3 + multiplier * iqr
+
+
+class _OutlierSets:
+    # Collects each column's outlier positions, chunk by chunk
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.counts = np.zeros(len(self.columns), dtype=np.int64)
+        self.positions = [[] for _ in self.columns]
+        self.samples = [[] for _ in self.columns]
+
+    def add(self, block, lower, upper, offset, sample_size):
+        # NaN compares False on both sides, so missing values are never outliers
+        mask = (block < lower) | (block > upper)
+        self.counts += mask.sum(axis=0)
+        for j in np.flatnonzero(mask.any(axis=0)):
+            rows = np.flatnonzero(mask[:, j])
+            self.positions[j].append(rows + offset)
+            room = sample_size - sum(len(positions) for positions, _ in self.samples[j])
+            if room > 0:
+                self.samples[j].append((rows[:room] + offset, block[rows[:room], j]))
+
 
 class AnomalyDetectionService:
-    def detect(self, file_path):
+    def detect(self, dataset):
         """
-        Detects basic anomalies (outliers) in numeric columns.
+        Detects basic anomalies (outliers) in numeric columns of a DatasetHandle.
+        All numeric columns' IQR bounds come from one pass over the NumPy block;
+        files of the streaming THRESHOLD_BYTES that are not loaded are read twice
+        in chunks instead, with quartiles from the profiler's quantile sketches.
+        Each column reports a count, its bounds and a SAMPLE_SIZE sample; the full
+        index set is stored out of line (see load_outlier_indices).
         """
         try:
-            df = pd.read_csv(file_path)
-            anomalies = {}
-            
-            numeric_cols = df.select_dtypes(include=[np.number]).columns
-            
-            for col in numeric_cols:
-                # Simple IQR based outlier detection
-                Q1 = df[col].quantile(0.25)
-                Q3 = df[col].quantile(0.75)
-                IQR = Q3 - Q1
-                outliers = df[(df[col] < (Q1 - 1.5 * IQR)) | (df[col] > (Q3 + 1.5 * IQR))]
-                
-                if not outliers.empty:
-                    anomalies[col] = {
-                        "count": len(outliers),
-                        "indices": outliers.index.tolist(),
-                        "values": outliers[col].tolist()
-                    }
-                    
-            return anomalies
+            options = anomaly_options()
+            stream = streaming_options()
+            if dataset.size >= stream['THRESHOLD_BYTES'] and not dataset.loaded:
+                outliers, bounds, rows = self._detect_stream(dataset, options, stream)
+            else:
+                outliers, bounds, rows = self._detect_frame(dataset.frame, options)
+            return self._results(dataset, outliers, bounds, rows, options)
         except Exception as e:
             return {"error": str(e)}
+
+    def _detect_frame(self, df, options):
+        numeric = df.select_dtypes(include=[np.number])
+        outliers = _OutlierSets(numeric.columns)
+        if not len(outliers.columns):
+            return outliers, {}, len(df)
+        block = numeric.to_numpy(dtype=float)
+        with warnings.catch_warnings():
+            # All-NaN columns get NaN bounds and no outliers
+            warnings.simplefilter('ignore', RuntimeWarning)
+            q1, q3 = np.nanquantile(block, [0.25, 0.75], axis=0)
+        lower, upper = iqr_bounds(q1, q3, options['IQR_MULTIPLIER'])
+        outliers.add(block, lower, upper, 0, options['SAMPLE_SIZE'])
+        return outliers, dict(zip(outliers.columns, zip(lower, upper))), len(df)
+
+    def _detect_stream(self, dataset, options, stream):
+        profile = StreamingProfile(stream)
+        for chunk in dataset.chunks(stream['CHUNK_ROWS']):
+            profile.update(chunk)
+        numeric = [name for name, column in profile.columns.items() if column.numeric]
+        quartiles = np.array([profile.columns[name].quantiles.quantiles((0.25, 0.75)) for name in numeric]).reshape(-1, 2)
+        lower, upper = iqr_bounds(quartiles[:, 0], quartiles[:, 1], options['IQR_MULTIPLIER'])
+
+        outliers = _OutlierSets(numeric)
+        offset = 0
+        for chunk in dataset.chunks(stream['CHUNK_ROWS']):
+            outliers.add(chunk[numeric].to_numpy(dtype=float), lower, upper, offset, options['SAMPLE_SIZE'])
+            offset += len(chunk)
+        return outliers, dict(zip(numeric, zip(lower, upper))), profile.rows
+
+    def _results(self, dataset, outliers, bounds, rows, options):
+        anomalies = {}
+        arrays = {}
+        for j, col in enumerate(outliers.columns):
+            if not outliers.counts[j]:
+                continue
+            key = f"c{j}"
+            index_format, arrays[key] = _pack_positions(np.concatenate(outliers.positions[j]), rows)
+            anomalies[col] = {
+                "count": int(outliers.counts[j]),
+                "lower": float(bounds[col][0]),
+                "upper": float(bounds[col][1]),
+                "indices": np.concatenate([positions for positions, _ in outliers.samples[j]]).tolist(),
+                "values": np.concatenate([values for _, values in outliers.samples[j]]).tolist(),
+                "index_set": {"key": key, "format": index_format, "rows": rows},
+            }
+        if arrays:
+            name = _save_index_sets(dataset, arrays, options)
+            for entry in anomalies.values():
+                entry["index_set"]["name"] = name
+        return anomalies
+
+
+def _pack_positions(positions, rows):
+    # Whichever is smaller: a bitmap over all rows or the sorted positions themselves
+    dtype = np.uint32 if rows < 2 ** 32 else np.int64
+    if rows // 8 < len(positions) * np.dtype(dtype).itemsize:
+        bitmap = np.zeros(rows, dtype=bool)
+        bitmap[positions] = True
+        return 'bitmap', np.packbits(bitmap)
+    return 'positions', positions.astype(dtype)
+
+
+def _save_index_sets(dataset, arrays, options):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    name = f"{options['INDEX_DIR']}/{dataset.digest}.npz"
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def load_outlier_indices(entry):
+    """
+    The full, sorted outlier row positions behind one column of a detect() result.
+    """
+    index_set = entry["index_set"]
+    with default_storage.open(index_set["name"], 'rb') as f:
+        packed = np.load(io.BytesIO(f.read()))[index_set["key"]]
+    if index_set["format"] == 'bitmap':
+        return np.flatnonzero(np.unpackbits(packed, count=index_set["rows"]))
+    return packed.astype(np.int64)
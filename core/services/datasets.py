@@ -0,0 +1,399 @@
+"""
+Shared dataset loading for the report services.
+
+An uploaded Dataset is identified by the sha256 of its contents and parsed
+with `pd.read_csv` once: the frame is kept in a bounded in-process LRU and
+spilled to disk column by column (.npy files per column plus a small
+manifest; text is stored as UTF-8 bytes and offsets, never pickled), so other
+workers and later reports reuse it without parsing the CSV again. Numeric
+columns are memory-mapped when read back from the spill.
+Frames are stored with the dtypes inferred by core.services.schema.
+
+Services receive a DatasetHandle and read `handle.frame`. The frame is
+shared between them, so they must not modify it in place (pandas'
+copy-on-write already makes derived frames independent).
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .schema import apply_schema, frame_bytes, infer_schema, optimize_frame
+from .streaming import streaming_options
+
+DATASET_CACHE_DEFAULTS = {
+    'MEMORY_ENTRIES': 8,
+    'MEMORY_BYTES': 512 * 1024 * 1024,
+    # Columnar spill shared by the workers on this host; None keeps frames in memory only
+    'SPILL_DIR': None,
+    'SPILL_MAX_BYTES': 4 * 1024 * 1024 * 1024,
+}
+
+SPILL_FORMAT_VERSION = 3
+_MANIFEST = 'manifest.json'
+
+
+def dataset_cache_options():
+    return {**DATASET_CACHE_DEFAULTS, **getattr(settings, 'CORE_DATASET_CACHE', {})}
+
+
+def content_hash(fileobj, block_size=1 << 20):
+    """
+    sha256 of a binary file, read in blocks. Rewinds the file afterwards.
+    """
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(block_size), b''):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class DatasetHandle:
+    """
+    One dataset's contents, parsed on first use through the loader.
+    """
+
+    def __init__(self, loader, digest, name, opener, size):
+        self.loader = loader
+        self.digest = digest
+        self.name = name
+        self.size = size
+        self._opener = opener
+        self._frame = None
+        self._schema = None
+
+    def __repr__(self):
+        return f"<DatasetHandle {self.name} ({self.digest[:12]})>"
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            self._frame = self.loader.frame(self.digest, self._opener)
+        return self._frame
+
+    @property
+    def schema(self):
+        """
+        The schema the frame was read with (core.services.schema), with its memory
+        saving. A dataset that is only streamed gets one inferred from its first
+        chunk, without numeric downcasts.
+        """
+        if self._schema is None:
+            if self.loaded:
+                self._schema = self.frame.attrs['schema']
+            else:
+                next(self.chunks(streaming_options()['CHUNK_ROWS']), None)
+        return self._schema
+
+    @property
+    def loaded(self):
+        """
+        Whether the frame can be had without parsing the file.
+        """
+        return self._frame is not None or self.loader.cached(self.digest)
+
+    def select(self, columns, part):
+        """
+        A FrameHandle over some of the columns, for running the services on a
+        column group. `part` keeps the group's stored outlier sets apart.
+        """
+        return FrameHandle(self.frame[list(columns)], f"{self.digest}-{part}", self.name)
+
+    def chunks(self, rows):
+        """
+        The dataset as DataFrames of up to `rows` rows with a running index,
+        read straight from the file (or sliced from the frame if it is loaded).
+        """
+        if self.loaded:
+            yield from _slices(self.frame, rows)
+            return
+        with self._opener() as f, pd.read_csv(f, chunksize=rows) as reader:
+            for chunk in reader:
+                if self._schema is None:
+                    before = frame_bytes(chunk)
+                    schema = infer_schema(chunk, downcast=False)
+                    chunk = apply_schema(chunk, schema)
+                    schema.update(memory_bytes=before, optimized_bytes=frame_bytes(chunk), sampled_rows=len(chunk))
+                    self._schema = schema
+                    yield chunk
+                else:
+                    yield apply_schema(chunk, self._schema)
+
+
+class FrameHandle:
+    """
+    A DatasetHandle stand-in over a frame that is already in memory.
+    """
+    loaded = True
+
+    def __init__(self, frame, digest, name=''):
+        self.frame = frame
+        self.digest = digest
+        self.name = name
+        self.size = int(frame.memory_usage().sum())
+        self.schema = frame.attrs.get('schema', {})
+
+    def __repr__(self):
+        return f"<FrameHandle {self.name} ({self.digest[:12]})>"
+
+    def chunks(self, rows):
+        return _slices(self.frame, rows)
+
+
+def _slices(frame, rows):
+    for start in range(0, len(frame), rows):
+        yield frame.iloc[start:start + rows]
+
+
+class DatasetLoader:
+    """
+    Content-addressed frame cache: an in-process LRU bounded by entry count and
+    memory, in front of an optional columnar spill directory.
+    """
+
+    def __init__(self, memory_entries=8, memory_bytes=512 * 1024 * 1024, spill_dir=None, spill_max_bytes=None):
+        self.memory_entries = memory_entries
+        self.memory_bytes = memory_bytes
+        self.spill_dir = str(spill_dir) if spill_dir else None
+        self.spill_max_bytes = spill_max_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # digest -> (frame, bytes)
+        self._memory_used = 0
+        self._loading = {}  # digest -> Lock, so concurrent callers parse a file once
+        self.stats = Counter()
+
+    def open(self, dataset):
+        """
+        Returns a DatasetHandle for a core.models.Dataset (hashing, not parsing, its file).
+        """
+        with dataset.file.open('rb') as f:
+            digest = content_hash(f)
+        return DatasetHandle(self, digest, dataset.file.name, lambda: dataset.file.open('rb'), dataset.file.size)
+
+    def open_path(self, path):
+        with open(path, 'rb') as f:
+            digest = content_hash(f)
+        return DatasetHandle(self, digest, os.path.basename(path), lambda: open(path, 'rb'), os.path.getsize(path))
+
+    def frame(self, digest, opener):
+        frame = self._memory_get(digest)
+        if frame is not None:
+            return frame
+
+        with self._lock:
+            loading = self._loading.setdefault(digest, threading.Lock())
+        with loading:
+            # Another thread may have finished loading it while we waited
+            frame = self._memory_get(digest, count=False)
+            if frame is None:
+                frame = self._read_spill(digest)
+                if frame is not None:
+                    self.stats['spill_hits'] += 1
+                else:
+                    with opener() as f:
+                        frame = pd.read_csv(f)
+                    frame, schema = optimize_frame(frame)
+                    frame.attrs['schema'] = schema
+                    self.stats['parses'] += 1
+                    self._write_spill(digest, frame)
+                self._memory_put(digest, frame)
+        with self._lock:
+            self._loading.pop(digest, None)
+        return frame
+
+    def cached(self, digest):
+        with self._lock:
+            if digest in self._memory:
+                return True
+        return bool(self.spill_dir) and os.path.exists(os.path.join(self._spill_path(digest), _MANIFEST))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+            self.stats.clear()
+
+    def _memory_get(self, digest, count=True):
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is None:
+                return None
+            self._memory.move_to_end(digest)
+            if count:
+                self.stats['memory_hits'] += 1
+            return entry[0]
+
+    def _memory_put(self, digest, frame):
+        size = frame.attrs['schema']['optimized_bytes']
+        with self._lock:
+            if digest in self._memory:
+                return
+            self._memory[digest] = (frame, size)
+            self._memory_used += size
+            # The newest frame stays even if it alone is over the byte budget
+            while len(self._memory) > 1 and (len(self._memory) > self.memory_entries or self._memory_used > self.memory_bytes):
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_used -= evicted
+                self.stats['evictions'] += 1
+
+    # Columnar spill: <spill_dir>/<digest>/manifest.json + .npy files per column (see _save_column)
+
+    def _spill_path(self, digest):
+        return os.path.join(self.spill_dir, digest)
+
+    def _read_spill(self, digest):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(digest)
+        try:
+            with open(os.path.join(path, _MANIFEST)) as f:
+                manifest = json.load(f)
+            if manifest['version'] != SPILL_FORMAT_VERSION:
+                return None
+            columns = {}
+            for i, (name, dtype, kind) in enumerate(manifest['columns']):
+                columns[name] = _load_column(os.path.join(path, str(i)), name, dtype, kind)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(path)  # recently used, for the spill trim
+        frame = pd.DataFrame(columns, index=pd.RangeIndex(manifest['rows']), columns=[column[0] for column in manifest['columns']])
+        frame.attrs['schema'] = manifest['schema']
+        return frame
+
+    def _write_spill(self, digest, frame):
+        if not self.spill_dir or not frame.columns.is_unique:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{digest[:12]}-", dir=self.spill_dir)
+        try:
+            columns = []
+            for i, name in enumerate(frame.columns):
+                column = frame[name]
+                kind = _save_column(os.path.join(staging, str(i)), column)
+                columns.append((str(name), str(column.dtype), kind))
+            with open(os.path.join(staging, _MANIFEST), 'w') as f:
+                json.dump({'version': SPILL_FORMAT_VERSION, 'rows': len(frame), 'columns': columns, 'schema': frame.attrs['schema']}, f)
+            # Publish atomically; a concurrent writer of the same content may have won
+            os.rename(staging, self._spill_path(digest))
+            self.stats['spill_writes'] += 1
+        except (OSError, _Unspillable):
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self._trim_spill(keep=digest)
+
+    def _trim_spill(self, keep):
+        # Least recently used entries go first; the one just written stays
+        if not self.spill_max_bytes:
+            return
+        entries = []
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            if name.startswith('.') or name == keep or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            entries.append((os.stat(path).st_mtime, size, path))
+        total = sum(size for _, size, _ in entries) + sum(entry.stat().st_size for entry in os.scandir(self._spill_path(keep)))
+        for _, size, path in sorted(entries):
+            if total <= self.spill_max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class _Unspillable(Exception):
+    """
+    A column holds values the spill has no encoding for (Python objects other than text).
+    """
+
+
+def _save_strings(prefix, values):
+    # Arrow-style layout without pickling: UTF-8 bytes, offsets into them, null mask
+    nulls = pd.isna(values)
+    encoded = []
+    for value, null in zip(values, nulls):
+        if null:
+            encoded.append(b'')
+        elif isinstance(value, str):
+            encoded.append(value.encode('utf-8'))
+        else:
+            raise _Unspillable(type(value).__name__)
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(f"{prefix}.data.npy", np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(f"{prefix}.offsets.npy", offsets)
+    np.save(f"{prefix}.nulls.npy", np.asarray(nulls, dtype=bool))
+
+
+def _load_strings(prefix):
+    data = np.load(f"{prefix}.data.npy").tobytes()
+    offsets = np.load(f"{prefix}.offsets.npy")
+    nulls = np.load(f"{prefix}.nulls.npy")
+    values = np.empty(len(nulls), dtype=object)
+    for i, (start, end) in enumerate(zip(offsets[:-1].tolist(), offsets[1:].tolist())):
+        values[i] = None if nulls[i] else data[start:end].decode('utf-8')
+    return values
+
+
+def _save_column(prefix, column):
+    """
+    Writes one column and returns how it was encoded: 'array' (a plain .npy,
+    memory-mapped on load), 'category' (codes plus string categories) or
+    'strings'. Nothing is pickled, so loading a spill never runs code.
+    """
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biufcmM':
+        np.save(f"{prefix}.npy", column.to_numpy())
+        return 'array'
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        np.save(f"{prefix}.codes.npy", column.cat.codes.to_numpy())
+        _save_strings(prefix, column.cat.categories.to_numpy(dtype=object))
+        return 'category'
+    _save_strings(prefix, column.to_numpy(dtype=object))
+    return 'strings'
+
+
+def _load_column(prefix, name, dtype, kind):
+    if kind == 'array':
+        return pd.Series(np.load(f"{prefix}.npy", mmap_mode='r'), name=name, copy=False)
+    if kind == 'category':
+        categories = pd.Index(_load_strings(prefix), dtype='str')
+        return pd.Series(pd.Categorical.from_codes(np.load(f"{prefix}.codes.npy"), categories=categories), name=name)
+    return pd.Series(_load_strings(prefix), name=name).astype(dtype)
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_dataset_loader():
+    global _loader
+    with _loader_lock:
+        if _loader is None:
+            options = dataset_cache_options()
+            _loader = DatasetLoader(
+                memory_entries=options['MEMORY_ENTRIES'],
+                memory_bytes=options['MEMORY_BYTES'],
+                spill_dir=options['SPILL_DIR'],
+                spill_max_bytes=options['SPILL_MAX_BYTES'],
+            )
+        return _loader
+
+
+def reset_dataset_loader():
+    global _loader
+    with _loader_lock:
+        _loader = None
+
+
+def load_dataset(dataset):
+    """
+    Shared handle for a core.models.Dataset.
+    """
+    return get_dataset_loader().open(dataset)
@@ -1,19 +1,26 @@
-import pandas as pd
+from .streaming import profile_stream, streaming_options
 
 class DataProfilingService:
-    def profile(self, file_path):
+    def profile(self, dataset):
         """
-        Generates summary statistics for the given dataset.
+        Generates summary statistics for the given dataset (a DatasetHandle from core.services.datasets).
+        Files of THRESHOLD_BYTES or more that are not already loaded are profiled in
+        one streaming pass with approximate quartiles (core.services.streaming).
         """
         try:
-            df = pd.read_csv(file_path)
+            options = streaming_options()
+            if dataset.size >= options['THRESHOLD_BYTES'] and not dataset.loaded:
+                return profile_stream(dataset, options)
+
+            df = dataset.frame
             
             summary = {
                 "rows": len(df),
                 "columns": list(df.columns),
                 "missing_values": df.isnull().sum().to_dict(),
                 "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
-                "numeric_desc": df.describe().to_dict()
+                # Parsed date columns are left out, as before the schema parsed them
+                "numeric_desc": df.select_dtypes(exclude=['datetime', 'datetimetz']).describe().to_dict()
             }
             return summary
         except Exception as e:
@@ -0,0 +1,125 @@
+import os
+from concurrent.futures import as_completed
+
+import numpy as np
+from django.db import transaction
+
+from core.models import Report
+
+from .anomaly import AnomalyDetectionService
+from .datasets import DatasetHandle, get_dataset_loader, load_dataset
+from .insights import InsightGeneratorService
+from .profiler import DataProfilingService
+from .streaming import streaming_options
+
+
+class ReportError(Exception):
+    """
+    A service could not analyze the dataset (its result was {"error": ...}).
+    """
+
+
+def column_groups(frame, count):
+    """
+    Splits a frame's columns into up to `count` groups, each with at least one
+    numeric column (so each group's describe() covers numerics only, as the
+    whole frame's does). Other columns are dealt round-robin.
+    """
+    numeric = list(frame.select_dtypes(include=[np.number]).columns)
+    count = max(1, min(count, len(numeric)))
+    groups = [[] for _ in range(count)]
+    others = 0
+    for name in frame.columns:
+        if name in numeric:
+            groups[numeric.index(name) % count].append(name)
+        else:
+            groups[others % count].append(name)
+            others += 1
+    return groups
+
+
+def analyze_group(path, digest, columns, part):
+    """
+    Profiles a column group and detects its anomalies. Runs in a pool process,
+    which reads the frame from the loader's spill rather than parsing the file.
+    """
+    handle = DatasetHandle(get_dataset_loader(), digest, os.path.basename(path), lambda: open(path, 'rb'), os.path.getsize(path))
+    group = handle.select(columns, part)
+    return DataProfilingService().profile(group), AnomalyDetectionService().detect(group)
+
+
+def _merge_profiles(frame, profiles):
+    merged = {"rows": len(frame), "columns": list(frame.columns)}
+    for key in ("missing_values", "dtypes", "numeric_desc"):
+        values = {}
+        for profile in profiles:
+            values.update(profile[key])
+        merged[key] = {name: values[name] for name in frame.columns if name in values}
+    return merged
+
+
+def _check(result):
+    if isinstance(result.get("error"), str):
+        raise ReportError(result["error"])
+    return result
+
+
+def build_report_data(dataset, pool=None, groups=1, progress=None):
+    """
+    Runs profiling, anomaly detection and insight generation for a Dataset from
+    one shared parse and returns the Report fields. With an executor `pool`, the
+    columns are split into `groups` groups analyzed in parallel (the pool's
+    processes read the frame from the dataset spill). Large files that are
+    streamed are analyzed in this process. `progress(stage, percent)` is called
+    between steps.
+    """
+    progress = progress or (lambda stage, percent: None)
+    progress('loading', 5)
+    handle = load_dataset(dataset)
+    streamed = handle.size >= streaming_options()['THRESHOLD_BYTES'] and not handle.loaded
+
+    if streamed or pool is None or groups < 2:
+        progress('profiling', 10)
+        profiling_data = _check(DataProfilingService().profile(handle))
+        progress('detecting anomalies', 50)
+        anomaly_data = _check(AnomalyDetectionService().detect(handle))
+    else:
+        frame = handle.frame  # parsed and spilled here, once, before the pool reads it
+        parts = column_groups(frame, groups)
+        futures = [pool.submit(analyze_group, dataset.file.path, handle.digest, part, f"g{i}") for i, part in enumerate(parts)]
+        progress('analyzing columns', 10)
+        for done, _ in enumerate(as_completed(futures), 1):
+            progress('analyzing columns', 10 + 80 * done // len(futures))
+        results = [future.result() for future in futures]
+        profiling_data = _merge_profiles(frame, [_check(profile) for profile, _ in results])
+        anomaly_data = {}
+        for _, anomalies in results:
+            anomaly_data.update(_check(anomalies))
+
+    progress('generating insights', 90)
+    insights_data = InsightGeneratorService().generate(profiling_data, anomaly_data)
+    return {
+        'profiling_data': profiling_data,
+        'anomaly_data': anomaly_data,
+        'insights_data': insights_data,
+        'schema': handle.schema,
+    }
+
+
+def save_report(dataset, data):
+    """
+    Saves (or replaces) a Dataset's Report and marks the dataset processed, in one transaction.
+    """
+    with transaction.atomic():
+        report, _ = Report.objects.update_or_create(dataset=dataset, defaults=data)
+        dataset.processed, dataset.status, dataset.stage, dataset.progress = True, 'DONE', '', 100
+        dataset.save(update_fields=['processed', 'status', 'stage', 'progress'])
+    return report
+
+
+def generate_report(dataset):
+    """
+    Profiles a Dataset, detects anomalies and derives insights from one shared
+    parse of its file, then saves (or replaces) its Report.
+    """
+    return save_report(dataset, build_report_data(dataset))
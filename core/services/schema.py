@@ -0,0 +1,177 @@
+"""
+Ingest-time schema inference for uploaded datasets.
+
+`pd.read_csv` leaves text as Python strings and numbers as 64-bit. infer_schema
+looks at a parsed frame and decides, per column:
+- text with few distinct values becomes `category`, if that is smaller
+- text whose every value parses with one date format becomes datetime64
+- integers are downcast to the smallest dtype that holds every value; floats only
+  with DOWNCAST_FLOATS, since float32 arithmetic changes the report statistics
+- other text optionally uses Arrow-backed strings (if pyarrow is installed)
+
+The schema is plain JSON. The loader applies it to each frame it parses, and
+the Report records it with the memory it saved (estimated for large text columns).
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from pandas.tseries.api import guess_datetime_format
+
+SCHEMA_DEFAULTS = {
+    'ENABLED': True,
+    # Text columns with at most this share of distinct values (and at most MAX_CATEGORIES) become categories
+    'CATEGORY_MAX_RATIO': 0.5,
+    'MAX_CATEGORIES': 10000,
+    'PARSE_DATES': True,
+    'DOWNCAST_NUMERICS': True,
+    # float32 holds the values exactly but describe() then computes in float32 (off in the 7th digit)
+    'DOWNCAST_FLOATS': False,
+    'ARROW_STRINGS': False,
+}
+
+# Rows looked at for date formats and text sizes; the conversion itself checks every row
+SAMPLE_ROWS = 10000
+
+
+def schema_options():
+    return {**SCHEMA_DEFAULTS, **getattr(settings, 'CORE_DATASET_SCHEMA', {})}
+
+
+def _arrow_strings_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _is_text(series):
+    return pd.api.types.is_string_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def _date_format(series):
+    values = series.iloc[:SAMPLE_ROWS].dropna()
+    if not len(values) or not isinstance(values.iloc[0], str):
+        return None
+    fmt = guess_datetime_format(values.iloc[0])
+    if fmt is None:
+        return None
+    # The sample must parse with the same format (apply_schema checks the rest)
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce')
+    return fmt if parsed.notna().all() else None
+
+
+def column_bytes(series):
+    """
+    A column's memory. Text columns are measured on SAMPLE_ROWS rows and scaled,
+    since measuring millions of Python strings takes seconds.
+    """
+    if (series.dtype == object or _is_text(series)) and len(series) > SAMPLE_ROWS:
+        sample = series.iloc[:SAMPLE_ROWS]
+        return int(sample.memory_usage(deep=True, index=False) * len(series) / max(len(sample), 1))
+    return int(series.memory_usage(deep=True, index=False))
+
+
+def frame_bytes(frame):
+    return sum(column_bytes(frame[name]) for name in frame.columns) + int(frame.index.memory_usage())
+
+
+def _downcast(series, floats=False):
+    kind = series.dtype.kind
+    if kind in 'iu':
+        downcast = pd.to_numeric(series, downcast='unsigned' if series.min() >= 0 else 'integer')
+    elif kind == 'f' and floats:
+        downcast = series.astype(np.float32)
+        # Only if every value survives the round trip (NaN stays NaN)
+        if not (downcast.astype(series.dtype) == series).eq(series.notna()).all():
+            return None
+    else:
+        return None
+    return str(downcast.dtype) if downcast.dtype != series.dtype else None
+
+
+def infer_schema(frame, options=None, downcast=True):
+    """
+    The schema for a parsed frame: {"columns": {name: {"from": dtype, "to": dtype[, "format"]}}}
+    for the columns it changes. `downcast=False` leaves numerics alone, for schemas
+    inferred from a sample (later rows may not fit).
+    """
+    options = options or schema_options()
+    columns = {}
+    for name in frame.columns:
+        series = frame[name]
+        change = None
+        if _is_text(series):
+            fmt = _date_format(series) if options['PARSE_DATES'] else None
+            values = series.count()
+            distinct = series.nunique()
+            if fmt is not None:
+                change = {"to": "datetime64", "format": fmt}
+            elif values and distinct <= options['MAX_CATEGORIES'] and distinct / values <= options['CATEGORY_MAX_RATIO']:
+                # Small frames can be smaller as plain text
+                sample = series.iloc[:SAMPLE_ROWS]
+                if sample.astype('category').memory_usage(deep=True) < sample.memory_usage(deep=True):
+                    change = {"to": "category"}
+            if change is None and options['ARROW_STRINGS'] and _arrow_strings_available():
+                change = {"to": "string[pyarrow]"}
+        elif downcast and options['DOWNCAST_NUMERICS'] and not pd.api.types.is_bool_dtype(series.dtype):
+            to = _downcast(series, floats=options['DOWNCAST_FLOATS'])
+            if to is not None:
+                change = {"to": to}
+        if change is not None:
+            columns[str(name)] = {"from": str(series.dtype), **change}
+    return {"columns": columns}
+
+
+def apply_schema(frame, schema):
+    """
+    `frame` with the schema's dtypes. A column that no longer fits (a value that
+    does not parse as a date, or overflows a downcast) keeps its parsed dtype.
+    """
+    converted = {}
+    for name, change in schema.get("columns", {}).items():
+        if name not in frame.columns:
+            continue
+        series = frame[name]
+        if str(series.dtype) == change["to"]:
+            continue
+        try:
+            if change["to"] == "datetime64":
+                if not _is_text(series):
+                    continue
+                values = pd.to_datetime(series, format=change["format"], errors='coerce')
+                if values.isna().sum() != series.isna().sum():
+                    continue
+            elif change["to"] in ("category", "string[pyarrow]"):
+                if not _is_text(series):
+                    continue
+                values = series.astype(change["to"])
+            else:
+                values = series.astype(change["to"])
+                if not (values.astype(series.dtype) == series).eq(series.notna()).all():
+                    continue
+        except (ValueError, TypeError, OverflowError):
+            continue
+        converted[name] = values
+    if not converted:
+        return frame
+    return frame.assign(**converted)
+
+
+def optimize_frame(frame, options=None):
+    """
+    Infers and applies a schema to a whole frame; returns the new frame and the
+    schema with the memory before and after.
+    """
+    options = options or schema_options()
+    before = frame_bytes(frame)
+    if not options['ENABLED']:
+        return frame, {"columns": {}, "memory_bytes": before, "optimized_bytes": before}
+    schema = infer_schema(frame, options)
+    optimized = apply_schema(frame, schema)
+    # Drop what did not apply (a date format that only fit the sample)
+    schema["columns"] = {
+        name: change for name, change in schema["columns"].items() if optimized[name].dtype != frame[name].dtype
+    }
+    schema.update(memory_bytes=before, optimized_bytes=frame_bytes(optimized))
+    return optimized, schema
@@ -0,0 +1,291 @@
+"""
+One-pass, bounded-memory profiling for datasets too large to load.
+
+The CSV is read in chunks of CHUNK_ROWS. Each column keeps mergeable
+accumulators: row and null counts, mean and variance (Welford/Chan), min and
+max, a KLL quantile sketch and a HyperLogLog distinct count. Memory depends
+on the column count and the sketch sizes, not on the file size. Quantiles
+carry roughly 1.7/QUANTILE_K rank error. Distinct counts carry roughly
+1.04/sqrt(2**DISTINCT_PRECISION) relative error.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+STREAMING_DEFAULTS = {
+    # Datasets at least this large are profiled in chunks instead of loaded whole
+    'THRESHOLD_BYTES': 256 * 1024 * 1024,
+    'CHUNK_ROWS': 200000,
+    'QUANTILE_K': 200,
+    'DISTINCT_PRECISION': 12,
+}
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+_UINT64_MAX = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def streaming_options():
+    return {**STREAMING_DEFAULTS, **getattr(settings, 'CORE_STREAMING_PROFILE', {})}
+
+
+class QuantileSketch:
+    """
+    KLL sketch: level h holds items of weight 2**h. A level over its capacity is
+    sorted and every other item (random offset) is promoted to the next level.
+    Updates and compactions work on whole NumPy arrays.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        return max(2, math.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            items = np.sort(items)
+            kept = items[-1:] if len(items) % 2 else items[:0]
+            paired = items[:len(items) - len(kept)]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], paired[self._rng.integers(2)::2]])
+            self.levels[level] = kept
+            # Adding a level shrinks the lower capacities, so start over
+            level = 0
+
+    def quantiles(self, qs):
+        items = np.concatenate(self.levels)
+        if not len(items):
+            return [float('nan')] * len(qs)
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        if cumulative[-1] == 1:
+            return [float(items[0])] * len(qs)
+        # Each item stands for `weight` ranks; place it at their centre and interpolate
+        # like pandas' default 'linear' method (exact while nothing has been compacted)
+        positions = (cumulative - (weights[order] + 1) / 2) / (cumulative[-1] - 1)
+        return [float(np.interp(q, positions, items)) for q in qs]
+
+
+class DistinctCounter:
+    """
+    HyperLogLog over pandas' 64-bit value hashes.
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, series):
+        if not len(series):
+            return
+        hashes = pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64)
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        # A sentinel bit below the remaining bits bounds the rank
+        rest = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        np.maximum.at(self.registers, index, _leading_zeros(rest) + 1)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+def _leading_zeros(values):
+    # Branch-free binary search over the bit halves; values must be non-zero
+    values = values.copy()
+    zeros = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high_clear = values <= (_UINT64_MAX >> np.uint64(shift))
+        zeros[high_clear] += shift
+        values[high_clear] <<= np.uint64(shift)
+    return zeros
+
+
+def _merge_dtypes(a, b):
+    # The dtype pandas would infer for the whole column from two chunks' dtypes
+    if a is None or a == b:
+        return b
+    if _is_numeric(a) and _is_numeric(b):
+        return np.result_type(a, b)
+    if isinstance(a, pd.CategoricalDtype) and isinstance(b, pd.CategoricalDtype):
+        # Each chunk has its own categories
+        return pd.CategoricalDtype()
+    if isinstance(a, pd.StringDtype) or isinstance(b, pd.StringDtype):
+        return a if isinstance(a, pd.StringDtype) else b
+    return np.dtype(object)
+
+
+def _is_numeric(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+class ColumnAccumulator:
+    """
+    Mergeable one-pass statistics for one column.
+    """
+
+    def __init__(self, options, seed=None):
+        self.dtype = None
+        self.count = 0
+        self.nulls = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.numeric = True
+        self.quantiles = QuantileSketch(options['QUANTILE_K'], seed)
+        self.distinct = DistinctCounter(options['DISTINCT_PRECISION'])
+
+    def update(self, series):
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if not len(values):
+            return
+        self.dtype = _merge_dtypes(self.dtype, series.dtype)
+        self.distinct.update(values)
+        if self.numeric and not _is_numeric(self.dtype):
+            # Text turned up: like a full read, the column is no longer numeric
+            self.numeric = False
+            self.quantiles = None
+        if self.numeric:
+            array = values.to_numpy(dtype=float)
+            self._merge_moments(len(array), float(array.mean()), float(((array - array.mean()) ** 2).sum()))
+            self.min = min(self.min, float(array.min()))
+            self.max = max(self.max, float(array.max()))
+            self.quantiles.update(array)
+        else:
+            self.count += len(values)
+
+    def merge(self, other):
+        self.nulls += other.nulls
+        if other.dtype is None:
+            return
+        self.dtype = _merge_dtypes(self.dtype, other.dtype)
+        self.distinct.merge(other.distinct)
+        if self.numeric and other.numeric and _is_numeric(self.dtype):
+            self._merge_moments(other.count, other.mean, other.m2)
+            self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+            self.quantiles.merge(other.quantiles)
+        else:
+            self.numeric = False
+            self.quantiles = None
+            self.count += other.count
+
+    def _merge_moments(self, count, mean, m2):
+        # Chan et al.'s pairwise combination of two (count, mean, M2) summaries
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def describe(self):
+        # Matches DataFrame.describe() for a numeric column
+        if not self.count:
+            return {'count': 0.0, 'mean': math.nan, 'std': math.nan, 'min': math.nan, '25%': math.nan,
+                    '50%': math.nan, '75%': math.nan, 'max': math.nan}
+        q1, median, q3 = self.quantiles.quantiles(QUANTILES)
+        return {
+            'count': float(self.count),
+            'mean': self.mean,
+            'std': math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan,
+            'min': self.min,
+            '25%': q1,
+            '50%': median,
+            '75%': q3,
+            'max': self.max,
+        }
+
+
+class StreamingProfile:
+    """
+    Per-column accumulators for a whole dataset, fed chunk by chunk.
+    """
+
+    def __init__(self, options=None, seed=0):
+        self.options = options or streaming_options()
+        self.seed = seed
+        self.rows = 0
+        self.columns = {}
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        for name in chunk.columns:
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = ColumnAccumulator(self.options, seed=self.seed + len(self.columns))
+            column.update(chunk[name])
+
+    def merge(self, other):
+        self.rows += other.rows
+        for name, column in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(column)
+            else:
+                self.columns[name] = column
+        return self
+
+    def summary(self):
+        """
+        The DataProfilingService summary, with approximate quartiles, plus
+        approximate distinct counts.
+        """
+        # A column with no values anywhere is float64, as pandas reads it
+        dtypes = {name: column.dtype if column.dtype is not None else np.dtype(float) for name, column in self.columns.items()}
+        return {
+            "rows": self.rows,
+            "columns": list(self.columns),
+            "missing_values": {name: column.nulls for name, column in self.columns.items()},
+            "dtypes": {name: str(dtype) for name, dtype in dtypes.items()},
+            "numeric_desc": {name: column.describe() for name, column in self.columns.items() if _is_numeric(dtypes[name])},
+            "distinct_values": {name: column.distinct.estimate() for name, column in self.columns.items()},
+            "approximate": True,
+        }
+
+
+def profile_stream(dataset, options=None):
+    """
+    Profiles a DatasetHandle in one pass over its file, CHUNK_ROWS rows at a time.
+    """
+    options = options or streaming_options()
+    profile = StreamingProfile(options)
+    for chunk in dataset.chunks(options['CHUNK_ROWS']):
+        profile.update(chunk)
+    return profile.summary()
@@ -1,3 +1,395 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+
+from core.models import Dataset, Report
+from core.services import datasets
+from core.services.anomaly import AnomalyDetectionService, load_outlier_indices
+from core.services.datasets import DatasetLoader, reset_dataset_loader
+from core.services.profiler import DataProfilingService
+from core.services.reports import build_report_data, column_groups, generate_report
+from core.services.schema import SCHEMA_DEFAULTS, apply_schema, optimize_frame
+from core.services.streaming import STREAMING_DEFAULTS, StreamingProfile
+
+SAMPLE_CSV = b"amount,category,note\n10,Retail,a\n12,Retail,\n11,Travel,c\n9,Retail,d\n500,Travel,e\n"
+
+
+class DatasetLoaderTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.spill = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.spill, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, CORE_DATASET_CACHE={'SPILL_DIR': self.spill})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_dataset_loader()
+        self.addCleanup(reset_dataset_loader)
+
+    def _dataset(self, content=SAMPLE_CSV, name='upload.csv'):
+        dataset = Dataset()
+        dataset.file.save(name, ContentFile(content))
+        return dataset
+
+    def _read_csv(self):
+        return mock.patch.object(datasets.pd, 'read_csv', wraps=pd.read_csv)
+
+    def test_report_parses_the_file_once(self):
+        dataset = self._dataset()
+        with self._read_csv() as read_csv:
+            report = generate_report(dataset)
+        self.assertEqual(read_csv.call_count, 1)
+        self.assertEqual(report.profiling_data['rows'], 5)
+        self.assertEqual(report.anomaly_data['amount']['values'], [500])
+        self.assertIn("The dataset contains 5 rows.", report.insights_data)
+        dataset.refresh_from_db()
+        self.assertTrue(dataset.processed)
+
+        # Regenerating, or another upload of the same content, reuses the parse
+        with self._read_csv() as read_csv:
+            generate_report(dataset)
+            generate_report(self._dataset(name='copy.csv'))
+        read_csv.assert_not_called()
+        self.assertEqual(Report.objects.count(), 2)
+
+    def test_other_workers_reuse_the_spill(self):
+        dataset = self._dataset()
+        first = DatasetLoader(spill_dir=self.spill)
+        original = first.open(dataset).frame
+
+        other = DatasetLoader(spill_dir=self.spill)
+        with self._read_csv() as read_csv:
+            frame = other.open(dataset).frame
+        read_csv.assert_not_called()
+        self.assertEqual(other.stats['spill_hits'], 1)
+        pd.testing.assert_frame_equal(frame, original)
+
+    def test_spill_does_not_pickle_text(self):
+        dataset = self._dataset(SAMPLE_CSV + "7,Café,naïve — ✓\n".encode())
+        original = DatasetLoader(spill_dir=self.spill).open(dataset).frame
+        for root, _, files in os.walk(self.spill):
+            for name in files:
+                if name.endswith('.npy'):
+                    np.load(os.path.join(root, name), allow_pickle=False)
+
+        frame = DatasetLoader(spill_dir=self.spill).open(dataset).frame
+        pd.testing.assert_frame_equal(frame, original)
+        self.assertEqual(frame['note'].iloc[-1], "naïve — ✓")
+        self.assertTrue(pd.isna(frame['note'].iloc[1]))
+
+    def test_memory_is_bounded(self):
+        loader = DatasetLoader(memory_entries=2, spill_dir=None)
+        handles = [loader.open(self._dataset(SAMPLE_CSV + f"{i},Retail,x\n".encode())) for i in range(3)]
+        for handle in handles:
+            handle.frame
+        self.assertEqual(loader.stats['parses'], 3)
+        self.assertEqual(loader.stats['evictions'], 1)
+
+        # The oldest was evicted and is parsed again; the newest is still in memory
+        loader.open(self._dataset(SAMPLE_CSV + b"2,Retail,x\n")).frame
+        loader.open(self._dataset(SAMPLE_CSV + b"0,Retail,x\n")).frame
+        self.assertEqual(loader.stats['memory_hits'], 1)
+        self.assertEqual(loader.stats['parses'], 4)
+
+    def test_spill_is_trimmed(self):
+        loader = DatasetLoader(spill_dir=self.spill, spill_max_bytes=1)
+        loader.open(self._dataset()).frame
+        loader.open(self._dataset(SAMPLE_CSV + b"1,Retail,x\n")).frame
+        # Only the newest entry survives a budget smaller than one entry
+        self.assertEqual(len([name for name in os.listdir(self.spill) if not name.startswith('.')]), 1)
+
+
+class StreamingProfileTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, CORE_DATASET_CACHE={'SPILL_DIR': None})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_dataset_loader()
+        self.addCleanup(reset_dataset_loader)
+
+    def test_small_files_match_describe(self):
+        frame = pd.read_csv('sample_data.csv')
+        profile = StreamingProfile(dict(STREAMING_DEFAULTS))
+        for start in range(0, len(frame), 3):
+            profile.update(frame.iloc[start:start + 3])
+        summary = profile.summary()
+        expected = frame.describe().to_dict()
+        self.assertEqual(set(summary['numeric_desc']), set(expected))
+        for column, stats in expected.items():
+            for stat, value in stats.items():
+                self.assertAlmostEqual(summary['numeric_desc'][column][stat], value, places=9, msg=f"{column} {stat}")
+        self.assertEqual(summary['dtypes'], {col: str(dtype) for col, dtype in frame.dtypes.items()})
+        self.assertEqual(summary['missing_values'], frame.isnull().sum().to_dict())
+        self.assertEqual(summary['distinct_values']['Region'], frame['Region'].nunique())
+
+    def test_large_columns_are_approximate_and_mergeable(self):
+        rng = np.random.default_rng(3)
+        values = pd.DataFrame({'x': rng.normal(100, 15, 300000), 'tag': rng.integers(0, 5000, 300000).astype(str)})
+        halves = [StreamingProfile(dict(STREAMING_DEFAULTS), seed=i) for i in range(2)]
+        for i, half in enumerate(halves):
+            for start in range(i * 150000, (i + 1) * 150000, 50000):
+                half.update(values.iloc[start:start + 50000])
+        summary = halves[0].merge(halves[1]).summary()
+
+        exact = values.describe().to_dict()['x']
+        approx = summary['numeric_desc']['x']
+        self.assertEqual(approx['count'], exact['count'])
+        self.assertAlmostEqual(approx['mean'], exact['mean'], places=9)
+        self.assertAlmostEqual(approx['std'], exact['std'], places=9)
+        for q in ('25%', '50%', '75%'):
+            # Within 1% of rank
+            self.assertLess(abs((values['x'] < approx[q]).mean() - float(q[:-1]) / 100), 0.01)
+        self.assertLess(abs(summary['distinct_values']['tag'] - 5000) / 5000, 0.05)
+        self.assertNotIn('tag', summary['numeric_desc'])
+
+    def test_mixed_chunks_follow_pandas_inference(self):
+        profile = StreamingProfile(dict(STREAMING_DEFAULTS))
+        profile.update(pd.DataFrame({'a': [1, 2], 'b': [1, 2], 'c': [np.nan, np.nan]}))
+        profile.update(pd.DataFrame({'a': [2.5, np.nan], 'b': ['x', 'y'], 'c': [np.nan, np.nan]}))
+        summary = profile.summary()
+        self.assertEqual(summary['dtypes'], {'a': 'float64', 'b': 'str', 'c': 'float64'})
+        self.assertEqual(set(summary['numeric_desc']), {'a', 'c'})
+        self.assertEqual(summary['numeric_desc']['c']['count'], 0.0)
+        self.assertEqual(summary['missing_values'], {'a': 1, 'b': 0, 'c': 4})
+
+    def test_large_files_are_streamed(self):
+        dataset = Dataset()
+        dataset.file.save('upload.csv', ContentFile(SAMPLE_CSV))
+        handle = datasets.load_dataset(dataset)
+        with override_settings(CORE_STREAMING_PROFILE={'THRESHOLD_BYTES': 1, 'CHUNK_ROWS': 2}), \
+                mock.patch.object(datasets.pd, 'read_csv', wraps=pd.read_csv) as read_csv:
+            summary = DataProfilingService().profile(handle)
+        self.assertTrue(summary['approximate'])
+        self.assertEqual(summary['rows'], 5)
+        self.assertEqual(read_csv.call_args.kwargs, {'chunksize': 2})
+        self.assertFalse(handle.loaded)
+        # Below the threshold the frame is loaded as before
+        self.assertNotIn('approximate', DataProfilingService().profile(handle))
+
+
+class AnomalyDetectionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, CORE_DATASET_CACHE={'SPILL_DIR': None})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_dataset_loader()
+        self.addCleanup(reset_dataset_loader)
+
+        rng = np.random.default_rng(5)
+        self.frame = pd.DataFrame({
+            'dense': np.where(rng.random(5000) < 0.2, 1000.0, rng.normal(0, 1, 5000)),
+            'sparse': np.r_[rng.integers(0, 10, 4997), [500, 600, 700]],
+            'gaps': np.r_[[np.nan] * 10, rng.normal(0, 1, 4989), [50.0]],
+            'text': 'x',
+        })
+        dataset = Dataset()
+        dataset.file.save('upload.csv', ContentFile(self.frame.to_csv(index=False).encode()))
+        self.handle = datasets.load_dataset(dataset)
+
+    def _expected(self, column):
+        series = self.handle.frame[column]
+        q1, q3 = series.quantile(0.25), series.quantile(0.75)
+        return series[(series < q1 - 1.5 * (q3 - q1)) | (series > q3 + 1.5 * (q3 - q1))]
+
+    def test_matches_per_column_iqr(self):
+        with override_settings(CORE_ANOMALY_DETECTION={'SAMPLE_SIZE': 5}):
+            result = AnomalyDetectionService().detect(self.handle)
+        self.assertEqual(set(result), {'dense', 'sparse', 'gaps'})
+        for column, entry in result.items():
+            expected = self._expected(column)
+            self.assertEqual(entry['count'], len(expected))
+            self.assertEqual(entry['indices'], expected.index[:5].tolist())
+            self.assertEqual(entry['values'], expected.iloc[:5].tolist())
+            self.assertEqual(load_outlier_indices(entry).tolist(), expected.index.tolist())
+        # Many outliers pack into a bitmap, a few stay as positions
+        self.assertEqual(result['dense']['index_set']['format'], 'bitmap')
+        self.assertEqual(result['sparse']['index_set']['format'], 'positions')
+
+    def test_streaming_mode_is_close(self):
+        exact = AnomalyDetectionService().detect(self.handle)
+        handle = DatasetLoader().open_path(os.path.join(self.media, self.handle.name))
+        with override_settings(CORE_STREAMING_PROFILE={'THRESHOLD_BYTES': 1, 'CHUNK_ROWS': 700}):
+            streamed = AnomalyDetectionService().detect(handle)
+        self.assertFalse(handle.loaded)
+        self.assertEqual(set(streamed), set(exact))
+        for column, entry in streamed.items():
+            self.assertLess(abs(entry['count'] - exact[column]['count']), 0.01 * len(self.frame) + 1)
+            self.assertEqual(len(load_outlier_indices(entry)), entry['count'])
+        self.assertEqual(streamed['sparse']['indices'], [4997, 4998, 4999])
+
+
+class DatasetSchemaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.spill = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.spill, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, CORE_DATASET_CACHE={'SPILL_DIR': self.spill})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_dataset_loader()
+        self.addCleanup(reset_dataset_loader)
+
+    def test_sample_data_schema(self):
+        with open('sample_data.csv', 'rb') as f:
+            dataset = Dataset()
+            dataset.file.save('sample_data.csv', ContentFile(f.read()))
+        report = generate_report(dataset)
+        self.assertEqual(report.schema['columns'], {
+            'Date': {'from': 'str', 'to': 'datetime64', 'format': '%Y-%m-%d'},
+            'Region': {'from': 'str', 'to': 'category'},
+            'Product': {'from': 'str', 'to': 'category'},
+            'Units': {'from': 'int64', 'to': 'uint8'},
+        })
+        self.assertLess(report.schema['optimized_bytes'], report.schema['memory_bytes'])
+        self.assertEqual(report.profiling_data['dtypes']['Region'], 'category')
+        self.assertEqual(set(report.profiling_data['numeric_desc']), {'Sales', 'Units', 'Customer_Rating'})
+
+        # Another worker reads the same dtypes and schema back from the spill
+        frame = DatasetLoader(spill_dir=self.spill).open(dataset).frame
+        pd.testing.assert_frame_equal(frame, datasets.load_dataset(dataset).frame)
+        self.assertEqual(frame.attrs['schema'], report.schema)
+
+    def test_only_lossless_conversions(self):
+        rng = np.random.default_rng(2)
+        frame = pd.DataFrame({
+            'small_int': rng.integers(-100, 100, 1000),
+            'big_int': rng.integers(0, 2 ** 40, 1000),
+            'halves': rng.integers(0, 100, 1000) / 2,
+            'tenths': rng.integers(0, 100, 1000) / 10,
+            'label': pd.array(rng.choice(['a', 'b', 'c'], 1000), dtype='str'),
+            'free_text': pd.array([f"note {i}" for i in range(1000)], dtype='str'),
+        })
+        optimized, schema = optimize_frame(frame)
+        self.assertEqual({name: change['to'] for name, change in schema['columns'].items()}, {
+            'small_int': 'int8', 'big_int': 'uint64', 'label': 'category',
+        })
+        for name in frame.columns:
+            self.assertTrue((optimized[name].astype(frame[name].dtype) == frame[name]).all(), name)
+        self.assertLess(schema['optimized_bytes'], schema['memory_bytes'])
+        # Statistics are unchanged: floats stay float64 unless DOWNCAST_FLOATS
+        self.assertEqual(optimized.describe().to_dict(), frame.describe().to_dict())
+
+        _, schema = optimize_frame(frame, options={**SCHEMA_DEFAULTS, 'DOWNCAST_FLOATS': True})
+        self.assertEqual(schema['columns']['halves']['to'], 'float32')
+        self.assertNotIn('tenths', schema['columns'])
+
+    def test_rows_that_do_not_fit_keep_their_dtype(self):
+        schema = {'columns': {'when': {'from': 'str', 'to': 'datetime64', 'format': '%Y-%m-%d'}, 'n': {'from': 'int64', 'to': 'int8'}}}
+        chunk = apply_schema(pd.DataFrame({'when': ['2024-01-01', 'soon'], 'n': [1, 1000]}), schema)
+        self.assertEqual(chunk['when'].tolist(), ['2024-01-01', 'soon'])
+        self.assertEqual(chunk['n'].dtype, np.int64)
+        chunk = apply_schema(pd.DataFrame({'when': ['2024-01-01', None], 'n': [1, 100]}), schema)
+        self.assertEqual(chunk['when'].dtype.kind, 'M')
+        self.assertEqual(chunk['n'].dtype, np.int8)
+
+    def test_streamed_datasets_sample_a_schema(self):
+        dataset = Dataset()
+        dataset.file.save('upload.csv', ContentFile(b"day,region,amount\n" + b"".join(
+            f"2024-02-{i % 28 + 1:02d},{'North' if i % 3 else 'South'},{i}\n".encode() for i in range(300)
+        )))
+        with override_settings(CORE_STREAMING_PROFILE={'THRESHOLD_BYTES': 1, 'CHUNK_ROWS': 100}):
+            handle = datasets.load_dataset(dataset)
+            summary = DataProfilingService().profile(handle)
+            self.assertEqual(handle.schema['sampled_rows'], 100)
+        self.assertEqual(summary['dtypes'], {'day': 'datetime64[us]', 'region': 'category', 'amount': 'int64'})
+        self.assertEqual(set(summary['numeric_desc']), {'amount'})
+
+
+class ReportPipelineTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.spill = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.spill, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, CORE_DATASET_CACHE={'SPILL_DIR': self.spill})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_dataset_loader()
+        self.addCleanup(reset_dataset_loader)
+
+    def _dataset(self, content=None):
+        if content is None:
+            with open('sample_data.csv', 'rb') as f:
+                content = f.read()
+        dataset = Dataset()
+        dataset.file.save('upload.csv', ContentFile(content))
+        return dataset
+
+    def test_worker_builds_reports(self):
+        first, second = self._dataset(), self._dataset(SAMPLE_CSV)
+        done = self._dataset()
+        generate_report(done)
+        stages = []
+        with mock.patch.object(jobs, 'update_progress', wraps=jobs.update_progress) as update_progress:
+            self.assertEqual(jobs.work(worker_id='w1', once=True), 2)
+            stages = [call.args[1:] for call in update_progress.call_args_list]
+        self.assertEqual(stages[0], ('loading', 5))
+        self.assertEqual(stages[-1], ('generating insights', 90))
+        for dataset in (first, second):
+            dataset.refresh_from_db()
+            self.assertEqual((dataset.status, dataset.processed, dataset.progress, dataset.attempts), ('DONE', True, 100, 1))
+        self.assertEqual(first.report.profiling_data['rows'], 10)
+        self.assertEqual(second.report.anomaly_data['amount']['count'], 1)
+
+    def test_column_groups_in_parallel_match_serial(self):
+        dataset = self._dataset()
+        serial = build_report_data(dataset)
+        frame = datasets.load_dataset(dataset).frame
+        groups = column_groups(frame, 2)
+        self.assertEqual(groups, [['Date', 'Product', 'Sales', 'Customer_Rating'], ['Region', 'Units']])
+        with ThreadPoolExecutor(2) as pool, self._read_csv_counter() as read_csv:
+            parallel = build_report_data(dataset, pool=pool, groups=2)
+        read_csv.assert_not_called()
+        self.assertEqual(parallel['profiling_data'], serial['profiling_data'])
+        self.assertEqual(list(parallel['profiling_data']['dtypes']), list(frame.columns))
+        self.assertEqual({c: e['count'] for c, e in parallel['anomaly_data'].items()}, {c: e['count'] for c, e in serial['anomaly_data'].items()})
+        self.assertEqual(load_outlier_indices(parallel['anomaly_data']['Sales']).tolist(), [6])
+        self.assertEqual(parallel['insights_data'], serial['insights_data'])
+
+    def _read_csv_counter(self):
+        return mock.patch.object(datasets.pd, 'read_csv', wraps=pd.read_csv)
+
+    def test_failures_are_retried_then_failed(self):
+        dataset = self._dataset(b"")
+        for attempt in range(1, 4):
+            claimed = jobs.claim_next_dataset('w1')
+            self.assertEqual((claimed.id, claimed.attempts), (dataset.id, attempt))
+            self.assertFalse(jobs.run_dataset(claimed))
+            dataset.refresh_from_db()
+            self.assertTrue(dataset.last_error)
+            # Backoff: not claimable until available_at
+            self.assertIsNone(jobs.claim_next_dataset('w1'))
+            jobs.Dataset.objects.filter(id=dataset.id).update(available_at=timezone.now())
+        self.assertEqual(dataset.status, 'FAILED')
+        self.assertFalse(Report.objects.exists())
+
+    def test_workers_do_not_share_datasets(self):
+        dataset = self._dataset()
+        claimed = jobs.claim_next_dataset('w1')
+        self.assertIsNone(jobs.claim_next_dataset('w2'))
+
+        # w1 stalls past its lease; w2 takes over and w1's late result is dropped
+        jobs.Dataset.objects.filter(id=dataset.id).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale_datasets(900), 1)
+        taken = jobs.claim_next_dataset('w2')
+        self.assertFalse(jobs.run_dataset(claimed))
+        self.assertFalse(Report.objects.exists())
+        self.assertTrue(jobs.run_dataset(taken))
+        dataset.refresh_from_db()
+        self.assertEqual((dataset.status, dataset.worker_id, dataset.attempts), ('DONE', 'w2', 2))
@@ -3,6 +3,10 @@ ASGI config for data_intelligence_agent project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn data_intelligence_agent.asgi:application``)
+so the dispute result page's live event stream stays open; the lifespan hook
+stops the live-chat change notifier (disputes/live.py) on shutdown.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -13,4 +17,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'data_intelligence_agent.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from disputes.live import get_notifier  # noqa: E402  (needs the app registry set up above)
+
+
+async def application(scope, receive, send):
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await get_notifier().stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,11 +43,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'disputes.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'disputes.roles.RoleCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +58,7 @@ ROOT_URLCONF = 'data_intelligence_agent.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'disputes.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,10 +78,30 @@ WSGI_APPLICATION = 'data_intelligence_agent.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite connection profiles. 'concurrent' suits several threads/processes submitting at
+# once: WAL lets readers run alongside the writer, IMMEDIATE transactions take the write
+# lock up front (waiting up to `timeout` seconds) instead of failing with "database is
+# locked" when a read upgrades to a write, and connections persist across requests.
+# 'legacy' is the stock Django behaviour. Compare them with `manage.py bench_analysis_path`.
+SQLITE_PROFILES = {
+    'legacy': {},
+    'concurrent': {
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
+        'CONN_MAX_AGE': None,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+SQLITE_PROFILE = 'concurrent'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **SQLITE_PROFILES[SQLITE_PROFILE],
     }
 }
 
@@ -129,5 +152,177 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+TEST_RUNNER = 'data_intelligence_agent.test_runner.TestRunner'
+
 LOGIN_REDIRECT_URL = 'customer_dashboard'
 LOGOUT_REDIRECT_URL = 'home'
+
+# Dispute analysis runs in the `run_analysis_worker` queue by default.
+# Set to False to analyze inline during the submission request (e.g. local dev without a worker).
+DISPUTES_ASYNC_ANALYSIS = True
+
+# Content-addressed cache in front of DisputeReasoningAgent.analyze.
+# PATH is a SQLite file shared by all workers on the host; set it to None (or the
+# DISPUTES_ANALYSIS_CACHE_PATH environment variable to an empty string) for a
+# memory-only cache. The test runner always uses a memory-only cache.
+DISPUTES_ANALYSIS_CACHE = {
+    'ENABLED': True,
+    'PATH': os.environ.get('DISPUTES_ANALYSIS_CACHE_PATH', str(BASE_DIR / 'analysis_cache.sqlite3')) or None,
+    'MEMORY_ENTRIES': 1024,
+    'MAX_ENTRIES': 100000,
+    'TTL_SECONDS': 7 * 24 * 3600,
+}
+
+# When True, the analysis worker streams each answer and publishes the fields received so
+# far (through the CaseEvent feed), so open result pages show reasoning steps as the model
+# produces them. Streamed calls are not hedged, so this is off by default.
+DISPUTES_STREAM_ANALYSIS = False
+
+# LLM provider routing: per-call deadline, circuit breakers and optional hedging.
+# Submissions at or above HEDGE_MIN_AMOUNT get a second request to the other provider
+# once the first is slower than its rolling HEDGE_PERCENTILE latency (None disables hedging).
+DISPUTES_LLM_ROUTING = {
+    'DEADLINE_SECONDS': 30,
+    'FAILURE_THRESHOLD': 3,
+    'SLOW_CALL_SECONDS': 20,
+    'SLOW_THRESHOLD': 3,
+    'RESET_SECONDS': 30,
+    'HEDGE_PERCENTILE': 95,
+    'HEDGE_MIN_AMOUNT': None,
+}
+
+# Near-duplicate reuse: a new dispute whose description is at least THRESHOLD similar
+# (character-shingle Jaccard) to an analyzed case from the last MAX_AGE_DAYS, in the same
+# merchant category and amount band, reuses that analysis instead of calling the LLM.
+DISPUTES_SIMILARITY = {
+    'ENABLED': True,
+    'THRESHOLD': 0.6,
+    'MAX_AGE_DAYS': 30,
+    'MAX_CANDIDATES': 10,
+}
+
+# Bulk import (ingest_disputes command and /ingest/ upload): rows per transaction,
+# heuristic pre-scoring processes (0 = inline), and whether imported cases are queued for LLM analysis.
+# A second import of a file that is still being imported is refused, unless the first has not
+# committed a chunk for STALE_SECONDS (it is then assumed dead and resumed).
+DISPUTES_INGEST = {
+    'CHUNK_SIZE': 1000,
+    'WORKERS': 2,
+    'ENQUEUE': True,
+    'MAX_ERRORS': 50,
+    'STALE_SECONDS': 600,
+}
+
+# Local stand-in for the LLM providers (disputes/fake_llm.py). When ENABLED it replaces
+# OpenAI/Gemini: answers come from the heuristic rules after a lognormal delay
+# (median LATENCY_MEDIAN seconds, shape LATENCY_SIGMA) streamed at TOKENS_PER_SECOND,
+# with MALFORMED_RATE of answers fenced, Python-framed or truncated and ERROR_RATE failing.
+DISPUTES_FAKE_LLM = {
+    'ENABLED': False,
+    'LATENCY_MEDIAN': 0.8,
+    'LATENCY_SIGMA': 0.5,
+    'TOKENS_PER_SECOND': 80,
+    'MALFORMED_RATE': 0.1,
+    'ERROR_RATE': 0.0,
+    'SEED': None,
+}
+
+# Insights dashboard figures are read from the InsightRollup table and cached for this long
+# (seconds, 0 disables the cache). Repair the rollup with `manage.py rebuild_rollups`.
+DISPUTES_INSIGHTS_CACHE_SECONDS = 60
+
+# Specialist assignment (disputes/routing.py): 'least_open' or 'round_robin' within the
+# 'Specialist: <Classification>' group; classifications without a staffed group try
+# FALLBACKS, then DEFAULT_FALLBACK. The in-memory table is also refreshed every TABLE_TTL_SECONDS.
+DISPUTES_SPECIALIST_ROUTING = {
+    'STRATEGY': 'least_open',
+    'FALLBACKS': {
+        'Merchant Dispute': ['Merchandise Dispute'],
+        'Merchandise Dispute': ['Merchant Dispute'],
+    },
+    'DEFAULT_FALLBACK': [],
+    'TABLE_TTL_SECONDS': 300,
+}
+
+# Ops role checks are cached in the session for this long (seconds, 0 disables); group
+# membership and user changes invalidate them immediately (disputes/roles.py).
+DISPUTES_ROLE_CACHE_SECONDS = 300
+
+# Invalidations (roles above, the specialist routing table) bump a version row in the database.
+# Each process re-reads it at most this often (seconds), so a change reaches other processes
+# and hosts within it.
+DISPUTES_VERSION_POLL_SECONDS = 1.0
+
+# Live chat on the result page (disputes/live.py): each process checks the change feed every
+# POLL_SECONDS while streams are open; streams send keep-alives every HEARTBEAT_SECONDS and
+# end after STREAM_SECONDS, when the browser reconnects (after RETRY_MS) where it left off.
+# Feed rows are re-read for RESCAN_SECONDS, so a write whose transaction commits later than
+# that after its row was inserted is not reported to open streams.
+DISPUTES_LIVE_CHAT = {
+    'POLL_SECONDS': 1.0,
+    'HEARTBEAT_SECONDS': 15,
+    'STREAM_SECONDS': 300,
+    'RETRY_MS': 3000,
+    'EVENT_RETENTION_SECONDS': 3600,
+    'RESCAN_SECONDS': 5,
+}
+
+# Request metrics (disputes/metrics.py): per-view latency and query histograms, LLM call
+# latency and parse tiers, template render time, served in the Prometheus text format at
+# /metrics/. Requests slower than SLOW_REQUEST_SECONDS (None disables) are logged to
+# 'disputes.metrics' with their SLOW_LOG_QUERIES slowest and most repeated queries.
+# Scrapers send "Authorization: Bearer <BEARER_TOKEN>" (from DISPUTES_METRICS_TOKEN), or
+# connect from ALLOWED_IPS. ALLOWED_IPS is matched against REMOTE_ADDR, which is the proxy's
+# address behind a reverse proxy: with one on the same host every request comes from
+# loopback, so list addresses only where clients reach the app directly.
+DISPUTES_METRICS = {
+    'ENABLED': True,
+    'ALLOWED_IPS': [],
+    'BEARER_TOKEN': os.environ.get('DISPUTES_METRICS_TOKEN') or None,
+    'SLOW_REQUEST_SECONDS': 1.0,
+    'SLOW_LOG_QUERIES': 5,
+}
+
+# Uploaded datasets (core/services/datasets.py) are parsed once per content hash: frames stay in
+# an LRU of MEMORY_ENTRIES / MEMORY_BYTES per process and are spilled column by column to SPILL_DIR
+# (shared by the workers on the host, trimmed to SPILL_MAX_BYTES; None keeps them in memory only).
+CORE_DATASET_CACHE = {
+    'MEMORY_ENTRIES': 8,
+    'MEMORY_BYTES': 512 * 1024 * 1024,
+    'SPILL_DIR': BASE_DIR / 'dataset_cache',
+    'SPILL_MAX_BYTES': 4 * 1024 * 1024 * 1024,
+}
+
+# Datasets of THRESHOLD_BYTES or more are profiled in one pass of CHUNK_ROWS-row chunks
+# (core/services/streaming.py) with bounded memory: approximate quartiles from a KLL sketch
+# of size QUANTILE_K and HyperLogLog distinct counts with 2**DISTINCT_PRECISION registers.
+CORE_STREAMING_PROFILE = {
+    'THRESHOLD_BYTES': 256 * 1024 * 1024,
+    'CHUNK_ROWS': 200000,
+    'QUANTILE_K': 200,
+    'DISTINCT_PRECISION': 12,
+}
+
+# Anomaly detection (core/services/anomaly.py): IQR fences at IQR_MULTIPLIER, SAMPLE_SIZE outlier
+# rows kept inline per column in the Report, full outlier index sets saved under INDEX_DIR in
+# default_storage. Files above CORE_STREAMING_PROFILE's THRESHOLD_BYTES use approximate quartiles.
+CORE_ANOMALY_DETECTION = {
+    'IQR_MULTIPLIER': 1.5,
+    'SAMPLE_SIZE': 20,
+    'INDEX_DIR': 'anomalies',
+}
+
+# Dtype inference when a dataset is parsed (core/services/schema.py): text with at most
+# CATEGORY_MAX_RATIO distinct values (and at most MAX_CATEGORIES) becomes 'category', date
+# text is parsed, integers are downcast when lossless (floats too with DOWNCAST_FLOATS, which
+# makes describe() compute in float32), other text uses Arrow strings if ARROW_STRINGS and
+# pyarrow is installed. The schema and the memory saved go in the Report.
+CORE_DATASET_SCHEMA = {
+    'ENABLED': True,
+    'CATEGORY_MAX_RATIO': 0.5,
+    'MAX_CATEGORIES': 10000,
+    'PARSE_DATES': True,
+    'DOWNCAST_NUMERICS': True,
+    'DOWNCAST_FLOATS': False,
+    'ARROW_STRINGS': False,
+}
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the suite with a memory-only analysis cache, so tests neither read
+    answers cached by earlier runs nor write the on-disk cache in the project.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._analysis_cache = override_settings(
+            DISPUTES_ANALYSIS_CACHE={**settings.DISPUTES_ANALYSIS_CACHE, 'PATH': None},
+        )
+        self._analysis_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._analysis_cache.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,70 @@
+"""
+Helpers shared by the bench_* management commands.
+"""
+import contextlib
+import copy
+import os
+import tempfile
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextlib.contextmanager
+def temporary_database(verbosity=0):
+    """
+    Runs the block against a throwaway database with the current schema
+    (Django's test database), so benchmarks never touch real data. SQLite
+    gets an on-disk file rather than the shared in-memory database, so
+    concurrent threads see realistic locking.
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    tmp_path = None
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        fd, tmp_path = tempfile.mkstemp(prefix='bench_', suffix='.sqlite3')
+        os.close(fd)
+        test_settings['NAME'] = tmp_path
+
+    old_name = connection.settings_dict['NAME']
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+        if tmp_path is not None:
+            test_settings.pop('NAME', None)
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(tmp_path + suffix):
+                    os.remove(tmp_path + suffix)
+
+
+@contextlib.contextmanager
+def sqlite_profile(name):
+    """
+    Runs the block with `settings.SQLITE_PROFILES[name]` applied to the default
+    connection (all threads share its settings), then restores the configured one.
+    """
+    settings_dict = connection.settings_dict
+    saved = {key: settings_dict[key] for key in ('OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS') if key in settings_dict}
+    connection.close()
+    settings_dict.update({'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False})
+    settings_dict.update(copy.deepcopy(settings.SQLITE_PROFILES[name]))
+    try:
+        yield
+    finally:
+        connection.close()
+        settings_dict.update(saved)
+
+
+def latency_percentiles(samples, percentiles=(50, 95, 99)):
+    """
+    Returns {percentile: milliseconds} for a list of latencies in seconds.
+    """
+    if not samples:
+        return {p: 0.0 for p in percentiles}
+    values = np.percentile(np.asarray(samples, dtype=float) * 1000, percentiles)
+    return dict(zip(percentiles, values.tolist()))
@@ -0,0 +1,195 @@
+import bisect
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# Amount band edges; aligned with the thresholds the heuristics and analysts reason about
+AMOUNT_BUCKETS = [10, 50, 200, 500, 1000, 5000]
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text):
+    """
+    Lowercases and strips punctuation/extra whitespace so trivially different
+    phrasings of the same complaint share a key.
+    """
+    return _NON_WORD.sub(" ", (text or "").lower()).strip()
+
+
+def amount_bucket(amount):
+    return bisect.bisect_right(AMOUNT_BUCKETS, float(amount))
+
+
+def make_cache_key(text, category, amount, model_version):
+    """
+    Content address for an analysis: normalized text, category, amount band and
+    the provider/model/prompt version that produced the answer.
+    """
+    parts = [normalize_text(text), (category or "").strip().lower(), str(amount_bucket(amount)), model_version or ""]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-tier cache of LLM analysis results.
+
+    Tier 1 is a per-process LRU; tier 2 is a SQLite file shared by all workers
+    on the host. Both tiers honour the TTL; the SQLite tier is trimmed to
+    `max_entries` by least-recent access.
+    """
+
+    # Run the size/TTL trim on the SQLite tier every N writes rather than on each one
+    TRIM_EVERY = 100
+
+    def __init__(self, path=None, memory_entries=1024, max_entries=100000, ttl_seconds=7 * 24 * 3600):
+        self.path = str(path) if path else None
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._writes_since_trim = 0
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'expired': 0}
+
+        self._db = None
+        if self.path:
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS analysis_cache_access ON analysis_cache (last_access)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return json.loads(value)
+                del self._memory[key]
+                self._counters['expired'] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if now - created_at <= self.ttl_seconds:
+                        self._db.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, key))
+                        self._remember(key, value, created_at)
+                        self._counters['disk_hits'] += 1
+                        return json.loads(value)
+                    self._db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                    self._counters['expired'] += 1
+
+            self._counters['misses'] += 1
+            return None
+
+    def set(self, key, result):
+        value = json.dumps(result)
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._counters['writes'] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                self._writes_since_trim += 1
+                if self._writes_since_trim >= self.TRIM_EVERY:
+                    self._trim(now)
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _trim(self, now):
+        self._writes_since_trim = 0
+        self._db.execute("DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM analysis_cache WHERE key IN "
+                "(SELECT key FROM analysis_cache ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+            self._counters['evictions'] += overflow
+
+    def purge(self):
+        """
+        Drops expired entries and enforces the size cap immediately.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._trim(time.time())
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analysis_cache")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_size'] = len(self._memory)
+            if self._db is not None:
+                (stats['disk_size'],) = self._db.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """
+    Returns the process-wide analysis cache configured by DISPUTES_ANALYSIS_CACHE,
+    or None when caching is disabled.
+    """
+    global _cache
+    options = getattr(settings, 'DISPUTES_ANALYSIS_CACHE', {})
+    if not options.get('ENABLED', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnalysisCache(
+                    path=options.get('PATH'),
+                    memory_entries=options.get('MEMORY_ENTRIES', 1024),
+                    max_entries=options.get('MAX_ENTRIES', 100000),
+                    ttl_seconds=options.get('TTL_SECONDS', 7 * 24 * 3600),
+                )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_analysis_cache(setting, **kwargs):
+    # The cache is built from the settings once; rebuild it when they are overridden
+    global _cache
+    if setting == 'DISPUTES_ANALYSIS_CACHE':
+        with _cache_lock:
+            _cache = None
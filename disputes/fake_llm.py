@@ -0,0 +1,158 @@
+"""
+Local stand-in for the provider chat models, for benchmarks and offline work.
+
+`FakeDisputeLLM` answers the analysis prompts (single and packed) with the
+heuristic rules' verdict, after a lognormally distributed delay and at a fixed
+token rate. A configurable share of answers comes back malformed in the shapes
+real providers produce: markdown fences, Python-dict content frames and
+truncated JSON. Enable it with DISPUTES_FAKE_LLM['ENABLED']; it then replaces
+the real providers so no API key is needed and nothing leaves the process.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from .heuristics import HEURISTIC_INTRO, heuristic_analyze
+
+FAKE_LLM_MODEL = "fake-dispute-llm"
+
+FAKE_LLM_DEFAULTS = {
+    'ENABLED': False,
+    'LATENCY_MEDIAN': 0.8,
+    'LATENCY_SIGMA': 0.5,
+    'TOKENS_PER_SECOND': 80,
+    'MALFORMED_RATE': 0.1,
+    'ERROR_RATE': 0.0,
+    'SEED': None,
+}
+
+MALFORMED_STYLES = ('fence', 'python_frame', 'truncated')
+
+# Roughly 4 characters per token for English JSON
+CHARS_PER_TOKEN = 4
+
+_SINGLE_CASE_RE = re.compile(
+    r"- Description: (?P<description>.*)\n\s*- Amount: \$(?P<amount>.*)\n\s*- Merchant Category: (?P<category>.*)"
+)
+_PACKED_CASES_RE = re.compile(r'^\s*(\[\{"case_ref".*\])\s*$', re.MULTILINE)
+
+
+def fake_llm_options():
+    return {**FAKE_LLM_DEFAULTS, **getattr(settings, 'DISPUTES_FAKE_LLM', {})}
+
+
+def _to_amount(value):
+    try:
+        return float(str(value).replace(',', ''))
+    except ValueError:
+        return 0.0
+
+
+def fake_answer(description, amount, category):
+    """
+    The answer a well-behaved model would give, derived from the heuristic rules.
+    """
+    answer = heuristic_analyze(description, _to_amount(amount), category)
+    answer['reasoning_steps'] = [step for step in answer['reasoning_steps'] if step != HEURISTIC_INTRO]
+    return answer
+
+
+class FakeDisputeLLM(BaseChatModel):
+    """
+    Chat model with a lognormal time-to-first-token, a fixed token rate, and
+    injectable malformed answers and errors. Thread-safe; seed it for
+    reproducible runs.
+    """
+    latency_median: float = 0.8
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 80
+    malformed_rate: float = 0.1
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+
+    _rng: random.Random = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def from_options(cls, options):
+        options = {**FAKE_LLM_DEFAULTS, **dict(options)}
+        return cls(
+            latency_median=options['LATENCY_MEDIAN'],
+            latency_sigma=options['LATENCY_SIGMA'],
+            tokens_per_second=options['TOKENS_PER_SECOND'],
+            malformed_rate=options['MALFORMED_RATE'],
+            error_rate=options['ERROR_RATE'],
+            seed=options['SEED'],
+        )
+
+    @property
+    def _llm_type(self):
+        return FAKE_LLM_MODEL
+
+    def _answer_text(self, prompt):
+        packed = _PACKED_CASES_RE.search(prompt)
+        if packed:
+            answers = []
+            for case in json.loads(packed.group(1)):
+                answer = fake_answer(case.get('description', ''), case.get('amount', 0), case.get('category', ''))
+                answers.append({'case_ref': case.get('case_ref'), **answer})
+            return json.dumps(answers)
+        single = _SINGLE_CASE_RE.search(prompt)
+        if single:
+            return json.dumps(fake_answer(single['description'], single['amount'], single['category']))
+        return json.dumps(fake_answer(prompt, 0, 'Unknown'))
+
+    def _plan(self, messages):
+        # One locked draw per call keeps seeded runs reproducible under concurrency
+        text = self._answer_text("\n".join(str(m.content) for m in messages))
+        with self._lock:
+            rng = self._rng
+            latency = self.latency_median * math.exp(rng.gauss(0, self.latency_sigma)) if self.latency_sigma else self.latency_median
+            fail = rng.random() < self.error_rate
+            style = rng.choice(MALFORMED_STYLES) if rng.random() < self.malformed_rate else None
+            cut = rng.uniform(0.5, 0.95)
+
+        if style == 'fence':
+            text = f"```json\n{text}\n```"
+        elif style == 'python_frame':
+            text = repr({'type': 'text', 'text': text})
+        elif style == 'truncated':
+            text = text[:int(len(text) * cut)]
+        return latency, fail, text
+
+    def _token_seconds(self, text):
+        if not self.tokens_per_second:
+            return 0.0
+        return len(text) / CHARS_PER_TOKEN / self.tokens_per_second
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        latency, fail, text = self._plan(messages)
+        time.sleep(latency)
+        if fail:
+            raise ConnectionError("fake provider error")
+        time.sleep(self._token_seconds(text))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        latency, fail, text = self._plan(messages)
+        time.sleep(latency)
+        if fail:
+            raise ConnectionError("fake provider error")
+        step = 4 * CHARS_PER_TOKEN
+        for start in range(0, len(text), step):
+            chunk = text[start:start + step]
+            time.sleep(self._token_seconds(chunk))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
@@ -0,0 +1,280 @@
+"""
+Streaming bulk import of disputes from CSV or JSONL exports.
+
+Rows are parsed lazily, so files of any size run in constant memory. Each
+fixed-size chunk of rows is validated, pre-scored with the heuristic rules
+(in a process pool, a chunk or two ahead of the writer) and written with one
+`bulk_create`. The chunk commits together with its IngestionRun checkpoint,
+so re-running an interrupted import of the same file resumes after the last
+committed chunk instead of duplicating cases. An import claims its run first,
+so a second import of the same file is refused while the first one is alive.
+"""
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .heuristics import prescore_rows
+from .models import AnalysisJob, DisputeCase, IngestionRun
+from .rollups import record_new_cases
+
+INGEST_DEFAULTS = {
+    'CHUNK_SIZE': 1000,
+    'WORKERS': 2,
+    'ENQUEUE': True,
+    'MAX_ERRORS': 50,
+    'STALE_SECONDS': 600,
+}
+
+REQUIRED_COLUMNS = ('description', 'amount', 'merchant_category')
+
+# The analyze form posts 'category'; accept it in exports too
+COLUMN_ALIASES = {'category': 'merchant_category'}
+
+MAX_AMOUNT = Decimal('99999999.99')
+
+# Initial triage priority from the heuristic pre-score; the LLM analysis replaces it later
+PRESCORE_PRIORITY = {'High': 'HIGH', 'Medium': 'MEDIUM', 'Low': 'LOW'}
+
+IngestSummary = namedtuple(
+    'IngestSummary',
+    ['run', 'resumed_from', 'rows_read', 'rows_created', 'rows_rejected', 'elapsed', 'rows_per_second'],
+)
+
+
+class IngestError(ValueError):
+    pass
+
+
+def ingest_options():
+    return {**INGEST_DEFAULTS, **getattr(settings, 'DISPUTES_INGEST', {})}
+
+
+def detect_format(name):
+    name = (name or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise IngestError(f"Cannot tell the format of '{name}'; expected .csv or .jsonl")
+
+
+def file_fingerprint(fileobj, block_size=1 << 20):
+    """
+    sha256 of a binary file, read in blocks. Rewinds the file afterwards.
+    """
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(block_size), b''):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def iter_records(fileobj, fmt):
+    """
+    Yields (row_number, record, error) for each data row of a binary file.
+    `record` is a dict, or None when the row could not be parsed (see `error`).
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        columns = {COLUMN_ALIASES.get(c.strip(), c.strip()) for c in reader.fieldnames or []}
+        missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+        if missing:
+            raise IngestError(f"CSV header is missing columns: {missing}")
+        for row_number, row in enumerate(reader, 1):
+            yield row_number, row, None
+    elif fmt == 'jsonl':
+        row_number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, None, f"invalid JSON ({e.msg})"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "expected a JSON object"
+                continue
+            yield row_number, record, None
+    else:
+        raise IngestError(f"Unsupported format '{fmt}'")
+
+
+def validate_record(record):
+    """
+    Returns (fields, None) for a usable row or (None, error) otherwise.
+    """
+    record = {COLUMN_ALIASES.get(str(k).strip(), str(k).strip()): v for k, v in record.items() if k is not None}
+
+    description = str(record.get('description') or '').strip()
+    if not description:
+        return None, "description is required"
+
+    category = str(record.get('merchant_category') or '').strip()
+    if not category:
+        return None, "merchant_category is required"
+    if len(category) > 100:
+        return None, "merchant_category is longer than 100 characters"
+
+    raw_amount = str(record.get('amount') or '').strip().lstrip('$').replace(',', '')
+    try:
+        amount = Decimal(raw_amount).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None, f"amount '{record.get('amount')}' is not a number"
+    if not amount.is_finite() or amount <= 0 or amount > MAX_AMOUNT:
+        return None, f"amount {raw_amount} is out of range"
+
+    return {'description': description, 'amount': amount, 'merchant_category': category}, None
+
+
+def _chunks(records, chunk_size):
+    # Validates rows chunk by chunk: yields (rows_read, valid_fields, errors)
+    while True:
+        raw = list(islice(records, chunk_size))
+        if not raw:
+            return
+        valid, errors = [], []
+        for row_number, record, error in raw:
+            fields = None
+            if error is None:
+                fields, error = validate_record(record)
+            if error is None:
+                valid.append(fields)
+            else:
+                errors.append(f"row {row_number}: {error}")
+        yield len(raw), valid, errors
+
+
+def _score_args(valid):
+    return [(f['description'], float(f['amount']), f['merchant_category']) for f in valid]
+
+
+def _write_chunk(run, rows_read, valid, errors, scores, enqueue, max_errors):
+    # bulk_create skips DisputeCase.save() and signals: the triage rank and rollup counts are done here
+    cases = []
+    for fields, (risk_level, classification) in zip(valid, scores):
+        priority = PRESCORE_PRIORITY.get(risk_level, 'MEDIUM')
+        if classification == 'Unauthorized Transaction':
+            priority = 'HIGH'
+        cases.append(DisputeCase(
+            status='NEW', priority=priority, priority_rank=DisputeCase.PRIORITY_RANKS[priority], priority_prescored=True, **fields,
+        ))
+
+    with transaction.atomic():
+        created = DisputeCase.objects.bulk_create(cases)
+        record_new_cases(created)
+        if enqueue:
+            AnalysisJob.objects.bulk_create([AnalysisJob(case=case) for case in created])
+        updates = {
+            'rows_read': F('rows_read') + rows_read,
+            'rows_created': F('rows_created') + len(created),
+            'rows_rejected': F('rows_rejected') + len(errors),
+            # queryset updates skip auto_now; this is the run's heartbeat
+            'updated_at': timezone.now(),
+        }
+        if errors and len(run.errors) < max_errors:
+            run.errors = (run.errors + errors)[:max_errors]
+            updates['errors'] = run.errors
+        IngestionRun.objects.filter(pk=run.pk).update(**updates)
+    return len(created)
+
+
+def claim_run(run, stale_seconds):
+    """
+    Marks an existing run RUNNING for this import and reloads its checkpoint.
+    Refused while another import of the file is running and has written a
+    chunk in the last `stale_seconds`.
+    """
+    now = timezone.now()
+    claimable = ~Q(status='RUNNING') | Q(updated_at__lt=now - timedelta(seconds=stale_seconds))
+    if not IngestionRun.objects.filter(claimable, pk=run.pk).update(status='RUNNING', updated_at=now):
+        raise IngestError(f"'{run.source}' is already being imported (run #{run.pk}); try again once it finishes")
+    run.refresh_from_db()
+
+
+def ingest_file(fileobj, source, fmt=None, chunk_size=None, workers=None, enqueue=None, restart=False, progress=None):
+    """
+    Imports a CSV/JSONL export from a binary file object and returns an IngestSummary.
+
+    A file that was already imported (same contents) resumes from its checkpoint;
+    `restart=True` discards the checkpoint and imports it again. `progress` is
+    called with the running summary after every chunk.
+    """
+    options = ingest_options()
+    fmt = fmt or detect_format(source)
+    chunk_size = chunk_size or options['CHUNK_SIZE']
+    workers = options['WORKERS'] if workers is None else workers
+    enqueue = options['ENQUEUE'] if enqueue is None else enqueue
+
+    fingerprint = file_fingerprint(fileobj)
+    run, created = IngestionRun.objects.get_or_create(fingerprint=fingerprint, defaults={'source': str(source)[:255]})
+    if not created:
+        claim_run(run, options['STALE_SECONDS'])
+        if restart:
+            run.rows_read = run.rows_created = run.rows_rejected = 0
+            run.errors = []
+            run.save()
+    resumed_from = run.rows_read
+
+    records = iter_records(fileobj, fmt)
+    # Skip rows committed by an earlier, interrupted run of this file
+    for _ in islice(records, resumed_from):
+        pass
+
+    started = time.perf_counter()
+    totals = {'rows_read': 0, 'rows_created': 0, 'rows_rejected': 0}
+
+    def summary():
+        elapsed = time.perf_counter() - started
+        rate = totals['rows_read'] / elapsed if elapsed else 0.0
+        return IngestSummary(run, resumed_from, totals['rows_read'], totals['rows_created'], totals['rows_rejected'], elapsed, rate)
+
+    def commit(rows_read, valid, errors, scores):
+        totals['rows_created'] += _write_chunk(run, rows_read, valid, errors, scores, enqueue, options['MAX_ERRORS'])
+        totals['rows_read'] += rows_read
+        totals['rows_rejected'] += len(errors)
+        if progress:
+            progress(summary())
+
+    pool = None
+    try:
+        if workers > 0:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            # Score up to `workers + 1` chunks ahead of the writer; commits stay in file order
+            in_flight = deque()
+            for rows_read, valid, errors in _chunks(records, chunk_size):
+                in_flight.append((rows_read, valid, errors, pool.submit(prescore_rows, _score_args(valid))))
+                if len(in_flight) > workers:
+                    rows_read, valid, errors, future = in_flight.popleft()
+                    commit(rows_read, valid, errors, future.result())
+            while in_flight:
+                rows_read, valid, errors, future = in_flight.popleft()
+                commit(rows_read, valid, errors, future.result())
+        else:
+            for rows_read, valid, errors in _chunks(records, chunk_size):
+                commit(rows_read, valid, errors, prescore_rows(_score_args(valid)) if valid else [])
+    except Exception:
+        IngestionRun.objects.filter(pk=run.pk).update(status='FAILED')
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    IngestionRun.objects.filter(pk=run.pk).update(status='DONE')
+    run.refresh_from_db()
+    return summary()
@@ -0,0 +1,183 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .live import record_case_event
+from .models import AnalysisJob
+from .pipeline import analyze_case
+
+# Retry backoff base; attempt N waits RETRY_BACKOFF_SECONDS * 2**(N-1)
+RETRY_BACKOFF_SECONDS = 5
+
+# A streaming worker writes its partial answer at most this often
+PARTIAL_INTERVAL_SECONDS = 0.5
+
+
+def enqueue_analysis(case):
+    """
+    Queues an analysis job for a case. The worker picks it up asynchronously.
+    """
+    return AnalysisJob.objects.create(case=case)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim_next_job(worker_id, job_filter=None):
+    """
+    Atomically claims the oldest runnable job, or returns None when the queue is empty.
+
+    Claiming is a compare-and-set UPDATE on (id, status='QUEUED'), which is safe
+    across threads and processes on both SQLite and Postgres without row locks.
+    """
+    for _ in range(10):
+        now = timezone.now()
+        candidates = AnalysisJob.objects.filter(status='QUEUED', available_at__lte=now)
+        if job_filter:
+            candidates = candidates.filter(**job_filter)
+        job_id = candidates.order_by('available_at', 'id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+
+        claimed = AnalysisJob.objects.filter(id=job_id, status='QUEUED').update(
+            status='RUNNING',
+            worker_id=worker_id,
+            started_at=now,
+            attempts=F('attempts') + 1,
+            partial={},
+        )
+        if claimed:
+            return AnalysisJob.objects.select_related('case').get(id=job_id)
+        # Another worker won the race; try the next candidate
+    return None
+
+
+def _owned(job):
+    # Compare-and-set guard: the job is still RUNNING under this claim
+    return AnalysisJob.objects.filter(id=job.id, status='RUNNING', worker_id=job.worker_id)
+
+
+def complete_job(job):
+    """
+    Marks a claimed job DONE if this worker still holds it. Returns False when the
+    claim was lost (e.g. the job was requeued as stale and claimed elsewhere).
+    """
+    return bool(_owned(job).update(status='DONE', finished_at=timezone.now(), last_error=''))
+
+
+def fail_job(job, error):
+    """
+    Re-queues a failed job with exponential backoff, or marks it FAILED once
+    max_attempts is reached.
+    """
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        if _owned(job).update(status='FAILED', finished_at=now, last_error=str(error)):
+            # Open result pages stop waiting for the analysis
+            record_case_event(job.case_id, 'STATUS')
+    else:
+        delay = RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        _owned(job).update(
+            status='QUEUED',
+            available_at=now + timedelta(seconds=delay),
+            last_error=str(error),
+        )
+    print(f"Job #{job.id} failed (attempt {job.attempts}/{job.max_attempts}): {error}")
+
+
+def release_job(job):
+    """
+    Hands a claimed job back to the queue untouched (e.g. the client that claimed it went away).
+    """
+    _owned(job).update(status='QUEUED', worker_id='', attempts=F('attempts') - 1)
+
+
+def partial_publisher(job):
+    """
+    Returns a `progress` callback for analyze_case that stores the partial
+    answer on the job and adds an ANALYSIS row to the CaseEvent feed, so open
+    result pages render it. Writes are throttled to one per PARTIAL_INTERVAL_SECONDS.
+    """
+    last = [0.0]
+
+    def publish(partial):
+        now = time.monotonic()
+        if now - last[0] < PARTIAL_INTERVAL_SECONDS:
+            return
+        last[0] = now
+        if _owned(job).update(partial=partial):
+            record_case_event(job.case_id, 'ANALYSIS')
+
+    return publish
+
+
+def run_job(job):
+    """
+    Executes a claimed job. Failures are re-queued with exponential backoff
+    until max_attempts is reached, after which the job is marked FAILED.
+    With DISPUTES_STREAM_ANALYSIS the answer is streamed and published as it arrives.
+    """
+    progress = partial_publisher(job) if getattr(settings, 'DISPUTES_STREAM_ANALYSIS', False) else None
+    try:
+        analyze_case(job.case, progress=progress)
+    except Exception as e:
+        fail_job(job, e)
+        return False
+
+    if not complete_job(job):
+        print(f"Job #{job.id} is no longer held by {job.worker_id}")
+        return False
+    return True
+
+
+def requeue_stale_jobs(lease_seconds):
+    """
+    Returns RUNNING jobs whose worker has held them longer than the lease back to the queue
+    (e.g. the worker process was killed mid-analysis).
+    """
+    cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+    return AnalysisJob.objects.filter(status='RUNNING', started_at__lt=cutoff).update(status='QUEUED', worker_id='')
+
+
+def work(worker_id=None, once=False, poll_interval=1.0, max_jobs=None, stop_event=None):
+    """
+    Worker loop: claims and runs jobs until stopped. With once=True it returns as
+    soon as the queue is drained. Returns the number of jobs processed.
+    """
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    try:
+        while not (stop_event and stop_event.is_set()):
+            if max_jobs is not None and processed >= max_jobs:
+                break
+            close_old_connections()
+            job = claim_next_job(worker_id)
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            run_job(job)
+            processed += 1
+    finally:
+        connection.close()
+    return processed
+
+
+def init_worker_process():
+    # Spawned children start from a bare interpreter
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'data_intelligence_agent.settings')
+    django.setup()
+
+
+def work_in_process(once, poll_interval, max_jobs):
+    return work(once=once, poll_interval=poll_interval, max_jobs=max_jobs)
@@ -0,0 +1,275 @@
+"""
+Live updates for the dispute result page.
+
+Chat messages, case status changes and the partial answers of streaming
+analysis workers are recorded in the CaseEvent feed.
+Each web process runs one ChangeNotifier on its event loop while any stream
+is open: it reads new feed rows each tick (or at once when a write in this
+process pokes it) and wakes only the streams watching the cases that changed.
+Feed ids are not committed in order (on Postgres a transaction holding a
+lower id can commit after a higher one), so rows younger than RESCAN_SECONDS
+are read again and the ones already seen are skipped. A woken stream then reads its own case, so idle
+clients cost no queries beyond a periodic keep-alive comment.
+
+Streams need an ASGI server (see data_intelligence_agent/asgi.py). Under
+WSGI they send what is new and end, and EventSource reconnects after RETRY_MS.
+"""
+import asyncio
+import json
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, JSONField, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import AnalysisJob, CaseEvent, DisputeCase, DisputeChatMessage, RiskAnalysis
+
+LIVE_CHAT_DEFAULTS = {
+    'POLL_SECONDS': 1.0,
+    'HEARTBEAT_SECONDS': 15,
+    'STREAM_SECONDS': 300,
+    'RETRY_MS': 3000,
+    'EVENT_RETENTION_SECONDS': 3600,
+    'RESCAN_SECONDS': 5,
+}
+
+MESSAGE_PAGE_SIZE = 100
+
+# How often the notifier prunes feed rows older than EVENT_RETENTION_SECONDS
+PRUNE_INTERVAL_SECONDS = 60
+
+
+def live_chat_options():
+    return {**LIVE_CHAT_DEFAULTS, **getattr(settings, 'DISPUTES_LIVE_CHAT', {})}
+
+
+def record_case_event(case_id, kind):
+    """
+    Adds a feed row and, once it commits, wakes this process's notifier.
+    """
+    CaseEvent.objects.create(case_id=case_id, kind=kind)
+    transaction.on_commit(get_notifier().poke)
+
+
+def message_payload(message, viewer_id):
+    return {
+        'id': message.id,
+        'message': message.message,
+        'sender': 'Support Agent' if message.sender.is_staff else message.sender.username,
+        'from_staff': message.sender.is_staff,
+        'mine': message.sender_id == viewer_id,
+        'internal': message.is_internal_note,
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+def visible_messages(case_id, include_internal):
+    messages = DisputeChatMessage.objects.filter(case_id=case_id)
+    if not include_internal:
+        messages = messages.filter(is_internal_note=False)
+    return messages
+
+
+def messages_after(case_id, viewer_id, include_internal, after_id=0, limit=MESSAGE_PAGE_SIZE):
+    """
+    Payloads of the messages after `after_id` the viewer may see, oldest first.
+    """
+    messages = visible_messages(case_id, include_internal).filter(id__gt=after_id).select_related('sender').order_by('id')
+    return [message_payload(message, viewer_id) for message in messages[:limit]]
+
+
+def case_state(case_id):
+    """
+    What the result page needs to know about a case, or None once it is deleted.
+    """
+    return (
+        DisputeCase.objects.filter(pk=case_id)
+        .annotate(
+            analyzed=Exists(RiskAnalysis.objects.filter(case=OuterRef('pk'))),
+            analysis_failed=Exists(AnalysisJob.objects.filter(case=OuterRef('pk'), status='FAILED')),
+            # What a streaming worker has published of the answer so far
+            partial=Subquery(
+                AnalysisJob.objects.filter(case=OuterRef('pk'), status='RUNNING').order_by('-id').values('partial')[:1],
+                output_field=JSONField(),
+            ),
+        )
+        .values('status', 'analyzed', 'analysis_failed', 'partial')
+        .first()
+    )
+
+
+def _changes(case_id, viewer_id, include_internal, after_id):
+    return messages_after(case_id, viewer_id, include_internal, after_id), case_state(case_id)
+
+
+def sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class ChangeNotifier:
+    """
+    Per-process poller of the CaseEvent feed. Runs on the event loop of the
+    streams it serves and stops when the last one closes.
+    """
+
+    def __init__(self):
+        self._watchers = defaultdict(set)
+        self._loop = None
+        self._task = None
+        self._wake = None
+        self._last_id = None
+        self._seen = {}  # event id -> loop time it was read, for the re-scan window
+        self._pruned_at = 0.0
+        self.stats = Counter()
+
+    async def subscribe(self, case_id):
+        """
+        Returns an asyncio.Event that is set whenever the case changes.
+        Subscribe before reading the case, so no change can slip in between.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First stream, or the previous loop is gone (e.g. a restarted server)
+            self._loop, self._task, self._watchers = loop, None, defaultdict(set)
+            self._wake = asyncio.Event()
+            self._last_id = None
+        if self._last_id is None:
+            self._seen = {}
+            self._last_id = await sync_to_async(_latest_event_id)()
+        changed = asyncio.Event()
+        self._watchers[case_id].add(changed)
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+        return changed
+
+    def unsubscribe(self, case_id, changed):
+        watchers = self._watchers.get(case_id)
+        if watchers is not None:
+            watchers.discard(changed)
+            if not watchers:
+                del self._watchers[case_id]
+
+    def poke(self):
+        """
+        Wakes the poller now; safe to call from any thread.
+        """
+        loop, wake = self._loop, self._wake
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self._watchers = defaultdict(set)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        options = live_chat_options()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), options['POLL_SECONDS'])
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self._watchers:
+                # Checked and cleared without an await in between, so a new subscriber restarts us
+                self._task = None
+                self._last_id = None
+                return
+            since = timezone.now() - timedelta(seconds=options['RESCAN_SECONDS'])
+            events = await sync_to_async(_events_after)(self._last_id, since)
+            self.stats['polls'] += 1
+            now = self._loop.time()
+            for event_id, case_id in events:
+                if event_id in self._seen:
+                    continue
+                if event_id < self._last_id:
+                    self.stats['late_events'] += 1
+                self._seen[event_id] = now
+                self._last_id = max(self._last_id, event_id)
+                for changed in self._watchers.get(case_id, ()):
+                    changed.set()
+            # Twice the window, so clock drift between processes cannot bring a row back
+            horizon = now - 2 * options['RESCAN_SECONDS']
+            self._seen = {event_id: seen_at for event_id, seen_at in self._seen.items() if seen_at >= horizon}
+            if self._loop.time() - self._pruned_at > PRUNE_INTERVAL_SECONDS:
+                self._pruned_at = self._loop.time()
+                await sync_to_async(prune_events)(options['EVENT_RETENTION_SECONDS'])
+
+
+def _latest_event_id():
+    return CaseEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _events_after(last_id, since):
+    # Rows past the high-water mark, plus recent ones below it that may have committed late
+    late = CaseEvent.objects.filter(id__lte=last_id, created_at__gte=since).order_by('id').values_list('id', 'case_id')
+    new = CaseEvent.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'case_id')[:1000]
+    return list(late) + list(new)
+
+
+def prune_events(retention_seconds):
+    return CaseEvent.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=retention_seconds)).delete()[0]
+
+
+_notifier = ChangeNotifier()
+
+
+def get_notifier():
+    return _notifier
+
+
+async def case_stream(case_id, viewer_id, include_internal, after_id=0, follow=True):
+    """
+    Server-sent events for one result page: 'message' events (id = message id,
+    so a reconnecting EventSource resumes after the last one it saw) and a
+    'status' event whenever the case status or analysis state changes. With
+    `follow=False` it sends what is new and ends.
+    """
+    options = live_chat_options()
+    notifier = get_notifier()
+    changed = await notifier.subscribe(case_id) if follow else None
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + options['STREAM_SECONDS']
+    state = None
+    try:
+        yield f"retry: {options['RETRY_MS']}\n\n"
+        while True:
+            if changed is not None:
+                changed.clear()
+            messages, current = await sync_to_async(_changes)(case_id, viewer_id, include_internal, after_id)
+            for message in messages:
+                yield sse('message', message, message['id'])
+                after_id = message['id']
+            if current != state:
+                state = current
+                yield sse('status', state or {'deleted': True})
+            if not follow or state is None:
+                return
+            if len(messages) == MESSAGE_PAGE_SIZE:
+                continue
+
+            # Sleep until the notifier reports a change; idle streams only send keep-alives
+            while not changed.is_set():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), min(options['HEARTBEAT_SECONDS'], remaining))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+    finally:
+        if changed is not None:
+            notifier.unsubscribe(case_id, changed)
+
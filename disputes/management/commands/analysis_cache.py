@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from disputes.cache import get_analysis_cache
+
+
+class Command(BaseCommand):
+    help = 'Inspects or maintains the persistent LLM analysis cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Delete every cached analysis')
+        parser.add_argument('--purge', action='store_true', help='Drop expired entries and enforce the size cap')
+
+    def handle(self, *args, **options):
+        cache = get_analysis_cache()
+        if cache is None:
+            self.stdout.write("Analysis cache is disabled (DISPUTES_ANALYSIS_CACHE['ENABLED'] is False).")
+            return
+
+        if options['clear']:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS("Cleared analysis cache."))
+        elif options['purge']:
+            cache.purge()
+            self.stdout.write(self.style.SUCCESS("Purged expired/overflow entries."))
+
+        stats = cache.stats()
+        self.stdout.write(f"Location: {cache.path or 'memory only'}")
+        self.stdout.write(f"Entries on disk: {stats.get('disk_size', 0)} (cap {cache.max_entries}, TTL {cache.ttl_seconds}s)")
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from disputes.models import AnalysisJob, DisputeCase
+from disputes.pipeline import apply_analysis
+from disputes.services import get_agent
+
+
+class Command(BaseCommand):
+    help = 'Analyzes every DisputeCase without a RiskAnalysis through the batched agent API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100, help='Cases per analyze_many call')
+        parser.add_argument('--concurrency', type=int, default=8, help='Max LLM requests in flight')
+        parser.add_argument('--pack', type=int, default=1, help='Disputes packed into one prompt (1 disables packing)')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many cases')
+
+    def handle(self, *args, **options):
+        agent = get_agent()
+        chunk_size = options['chunk_size']
+        limit = options['limit']
+
+        backlog = DisputeCase.objects.filter(analysis__isnull=True).order_by('id')
+        total = backlog.count() if limit is None else min(limit, backlog.count())
+        self.stdout.write(f"{total} case(s) awaiting analysis.")
+
+        processed = 0
+        last_id = 0
+        started = time.perf_counter()
+        while limit is None or processed < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - processed)
+            # Keyset over id so chunks stay cheap however deep into the table we are
+            cases = list(backlog.filter(id__gt=last_id)[:size])
+            if not cases:
+                break
+            last_id = cases[-1].id
+
+            chunk_started = time.perf_counter()
+            results = agent.analyze_many(
+                [(case.description, case.amount, case.merchant_category) for case in cases],
+                max_concurrency=options['concurrency'],
+                pack_size=options['pack'],
+            )
+            for case, analysis_json in zip(cases, results):
+                apply_analysis(case, analysis_json)
+
+            # Queued worker jobs for these cases are now redundant
+            AnalysisJob.objects.filter(case__in=cases, status='QUEUED').update(status='DONE', finished_at=timezone.now())
+
+            processed += len(cases)
+            chunk_elapsed = time.perf_counter() - chunk_started
+            self.stdout.write(
+                f"  {processed}/{total} analyzed ({len(cases) / chunk_elapsed:.1f} cases/sec this chunk)"
+            )
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(f"Analyzed {processed} case(s) in {elapsed:.1f}s ({rate:.1f} cases/sec)."))
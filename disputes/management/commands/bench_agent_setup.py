@@ -0,0 +1,55 @@
+import contextlib
+import io
+import os
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from langchain_core.prompts import ChatPromptTemplate
+
+from disputes.services import AgentRegistry, DisputeReasoningAgent, SYSTEM_PROMPT
+
+# Long enough to pass key validation; never sent anywhere since no call is made.
+DUMMY_KEYS = {
+    'openai': {'OPENAI_API_KEY': 'sk-benchmark-0000000000000000000000', 'GOOGLE_API_KEY': ''},
+    'gemini': {'OPENAI_API_KEY': '', 'GOOGLE_API_KEY': 'benchmark-0000000000000000000000'},
+    'none': {'OPENAI_API_KEY': '', 'GOOGLE_API_KEY': ''},
+}
+
+
+class Command(BaseCommand):
+    help = 'Measures per-request agent setup cost: fresh agent per submission vs the shared registry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--provider', choices=sorted(DUMMY_KEYS), default='openai')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        provider = options['provider']
+
+        with mock.patch.dict(os.environ, DUMMY_KEYS[provider]):
+            # Agent construction prints debug lines; keep them out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                cold = self._time(iterations, self._cold_setup)
+                registry = AgentRegistry()
+                registry.get_agent()  # first build is paid once per process
+                warm = self._time(iterations, registry.get_agent)
+
+        self.stdout.write(f"Provider: {provider} ({iterations} iterations)")
+        self.stdout.write(f"  Per-request agent (before): {cold * 1e6:10.1f} us/request")
+        self.stdout.write(f"  Shared registry   (after):  {warm * 1e6:10.1f} us/request")
+        if warm:
+            self.stdout.write(self.style.SUCCESS(f"  Speedup: {cold / warm:.0f}x"))
+
+    def _cold_setup(self):
+        # What analyze_dispute used to pay on every POST: env read, client and prompt construction
+        agent = DisputeReasoningAgent()
+        if agent.llm:
+            ChatPromptTemplate.from_template(SYSTEM_PROMPT) | agent.llm
+
+    def _time(self, iterations, fn):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - start) / iterations
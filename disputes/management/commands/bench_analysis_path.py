@@ -0,0 +1,143 @@
+import contextlib
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from disputes.benchmarking import latency_percentiles, sqlite_profile, temporary_database
+from disputes.heuristics import HEURISTIC_INTRO
+from disputes.management.commands.seed_disputes import SEED_DISPUTES
+from disputes.models import RiskAnalysis
+from disputes.services import _registry
+
+
+class Command(BaseCommand):
+    help = 'End-to-end benchmark of analyze_dispute -> agent -> RiskAnalysis against the fake LLM, in a temporary database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=40, help='Submissions per concurrency level')
+        parser.add_argument('--concurrency', default='1,4,8,16', help='Comma-separated client thread counts')
+        parser.add_argument('--latency-median', type=float, default=0.3, help='Fake LLM median time to first token (s)')
+        parser.add_argument('--latency-sigma', type=float, default=0.5)
+        parser.add_argument('--tokens-per-second', type=float, default=200)
+        parser.add_argument('--malformed-rate', type=float, default=0.1)
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument(
+            '--sqlite-profiles', default='legacy,concurrent',
+            help='Comma-separated SQLITE_PROFILES to compare (SQLite only), each in a fresh database',
+        )
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',') if level.strip()]
+        fake_llm = {
+            'ENABLED': True,
+            'LATENCY_MEDIAN': options['latency_median'],
+            'LATENCY_SIGMA': options['latency_sigma'],
+            'TOKENS_PER_SECOND': options['tokens_per_second'],
+            'MALFORMED_RATE': options['malformed_rate'],
+            'ERROR_RATE': options['error_rate'],
+            'SEED': options['seed'],
+        }
+        self.stdout.write(
+            f"Fake LLM: median {options['latency_median']}s (sigma {options['latency_sigma']}), "
+            f"{options['tokens_per_second']:.0f} tok/s, {options['malformed_rate']:.0%} malformed, "
+            f"{options['error_rate']:.0%} errors; {options['requests']} submissions per level"
+        )
+
+        # Inline analysis so each request covers the whole path; no cache or
+        # near-duplicate reuse, so every submission reaches the model
+        overrides = override_settings(
+            DISPUTES_FAKE_LLM=fake_llm,
+            DISPUTES_ASYNC_ANALYSIS=False,
+            DISPUTES_ANALYSIS_CACHE={'ENABLED': False},
+            DISPUTES_SIMILARITY={'ENABLED': False},
+        )
+        profiles = [None]
+        if connection.vendor == 'sqlite':
+            profiles = [name.strip() for name in options['sqlite_profiles'].split(',') if name.strip()]
+            unknown = set(profiles) - set(settings.SQLITE_PROFILES)
+            if unknown:
+                raise CommandError(f"Unknown SQLite profiles: {', '.join(sorted(unknown))}")
+
+        for profile in profiles:
+            if profile is not None:
+                self.stdout.write(f"\nSQLite profile '{profile}'")
+            with contextlib.ExitStack() as stack:
+                if profile is not None:
+                    stack.enter_context(sqlite_profile(profile))
+                stack.enter_context(temporary_database())
+                stack.enter_context(overrides)
+                _registry.reset()
+                stack.callback(_registry.reset)
+                user = User.objects.create_user('bench-customer', password='bench')
+                self.stdout.write(
+                    f"{'threads':>7} {'cases/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'fallback':>8} {'errors':>6} {'locked':>6}"
+                )
+                for level in levels:
+                    self._run_level(user, level, options['requests'])
+
+    def _run_level(self, user, threads, requests):
+        url = reverse('analyze_dispute')
+        local = threading.local()
+        start_id = RiskAnalysis.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        def submit(i):
+            if not hasattr(local, 'client'):
+                # Server errors (e.g. SQLite lock timeouts) are counted, not raised
+                local.client = Client(raise_request_exception=False)
+                local.client.force_login(user)
+            description, amount, category, _, _ = SEED_DISPUTES[i % len(SEED_DISPUTES)]
+            started = time.perf_counter()
+            response = local.client.post(url, {
+                'description': f"{description} (ref {threads}-{i})",
+                'amount': amount,
+                'category': category,
+            })
+            elapsed = time.perf_counter() - started
+            error = response.exc_info[1] if response.exc_info else None
+            locked = isinstance(error, OperationalError) and 'locked' in str(error)
+            return elapsed, response.status_code == 302, locked
+
+        def worker(indices):
+            try:
+                return [submit(i) for i in indices]
+            finally:
+                connection.close()
+
+        # The agent prints per-call debug lines and failed requests are logged; keep both out of the report
+        request_logger = logging.getLogger('django.request')
+        with contextlib.redirect_stdout(io.StringIO()), _silenced(request_logger):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                shards = [range(t, requests, threads) for t in range(threads)]
+                results = [r for shard in pool.map(worker, shards) for r in shard]
+            wall = time.perf_counter() - started
+
+        latencies = [elapsed for elapsed, _, _ in results]
+        errors = sum(1 for _, ok, _ in results if not ok)
+        locked = sum(1 for _, _, is_locked in results if is_locked)
+        analyses = RiskAnalysis.objects.filter(id__gt=start_id).values_list('reasoning_steps', flat=True)
+        fallbacks = sum(1 for steps in analyses if steps and steps[0] == HEURISTIC_INTRO)
+        p = latency_percentiles(latencies)
+        self.stdout.write(
+            f"{threads:>7} {len(results) / wall:>8.1f} {p[50]:>8.0f} {p[95]:>8.0f} {p[99]:>8.0f} {fallbacks:>8} {errors:>6} {locked:>6}"
+        )
+
+
+@contextlib.contextmanager
+def _silenced(logger):
+    disabled = logger.disabled
+    logger.disabled = True
+    try:
+        yield
+    finally:
+        logger.disabled = disabled
@@ -0,0 +1,38 @@
+import random
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from disputes.heuristics import heuristic_analyze, score_frame
+from .seed_disputes import SEED_DISPUTES
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark of the heuristic fallback: per-dispute cost of the scalar and vectorized paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = [
+            (text, round(amount * rng.uniform(0.2, 3.0), 2), category)
+            for text, amount, category, _, _ in (rng.choice(SEED_DISPUTES) for _ in range(options['rows']))
+        ]
+        n = len(rows)
+
+        start = time.perf_counter()
+        for text, amount, category in rows:
+            heuristic_analyze(text, amount, category)
+        scalar = (time.perf_counter() - start) / n
+
+        df = pd.DataFrame(rows, columns=['description', 'amount', 'merchant_category'])
+        start = time.perf_counter()
+        score_frame(df)
+        vectorized = (time.perf_counter() - start) / n
+
+        self.stdout.write(f"Heuristic scoring over {n} disputes:")
+        self.stdout.write(f"  Scalar (heuristic_analyze): {scalar * 1e6:8.2f} us/dispute")
+        self.stdout.write(f"  Vectorized (score_frame):   {vectorized * 1e6:8.2f} us/dispute")
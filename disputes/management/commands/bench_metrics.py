@@ -0,0 +1,110 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+
+from disputes.benchmarking import latency_percentiles, temporary_database
+from disputes.metrics import InstrumentedDjangoTemplates, MetricsMiddleware, get_registry
+from disputes.models import DisputeCase, RiskAnalysis
+
+METRICS_MIDDLEWARE = 'disputes.metrics.MetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = 'Measures the overhead of the metrics middleware and template timing on real views and on a no-op view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per view and configuration')
+        parser.add_argument('--cases', type=int, default=200)
+
+    def handle(self, *args, **options):
+        self._noop(options['requests'] * 20)
+        with temporary_database():
+            customer = User.objects.create_user('customer', password='x')
+            analyst = User.objects.create_user('analyst', password='x')
+            Group.objects.create(name='Risk Ops').user_set.add(analyst)
+            cases = DisputeCase.objects.bulk_create([
+                DisputeCase(description=f"Charged twice {i}", amount=10 + i, merchant_category='Retail', customer=customer, status='ANALYZED')
+                for i in range(options['cases'])
+            ])
+            RiskAnalysis.objects.bulk_create([
+                RiskAnalysis(case=case, risk_score='Low', classification='Duplicate Charge', recommended_action='Manual Review')
+                for case in cases
+            ])
+
+            views = [
+                ('landing', customer, reverse('landing')),
+                ('customer_dashboard', customer, reverse('customer_dashboard')),
+                ('ops_cases_api', analyst, reverse('ops_cases_api')),
+                ('dispute_result', customer, reverse('dispute_result', args=[cases[0].id])),
+            ]
+            self.stdout.write(f"{options['requests']} requests per view, alternating with and without the middleware")
+            self.stdout.write(f"{'view':>20} {'off p50 ms':>11} {'on p50 ms':>10} {'overhead us':>12} {'%':>6}")
+            for name, user, url in views:
+                off, on = self._measure(user, url, options['requests'])
+                self.stdout.write(
+                    f"{name:>20} {off:>11.3f} {on:>10.3f} {(on - off) * 1000:>12.0f} {(on - off) / off * 100:>6.1f}"
+                )
+            self._templates(options['requests'] * 4)
+
+    def _noop(self, requests):
+        # The middleware alone, around a view that does nothing
+        request = RequestFactory().get('/')
+        view = lambda request: HttpResponse('')
+        wrapped = MetricsMiddleware(view)
+        samples = {}
+        for label, handler in (('bare', view), ('metrics', wrapped)):
+            started = time.perf_counter()
+            for _ in range(requests):
+                handler(request)
+            samples[label] = (time.perf_counter() - started) / requests
+        get_registry().clear()
+        self.stdout.write(
+            f"No-op view: {samples['bare'] * 1e6:.1f}us bare, {samples['metrics'] * 1e6:.1f}us with the middleware "
+            f"({(samples['metrics'] - samples['bare']) * 1e6:.1f}us per request)"
+        )
+
+    def _measure(self, user, url, requests):
+        # A client builds its middleware chain on its first request, so the two
+        # clients keep their configurations while their requests interleave
+        middleware = [m for m in settings.MIDDLEWARE if m != METRICS_MIDDLEWARE]
+        clients = {}
+        for label, chain in (('off', middleware), ('on', [METRICS_MIDDLEWARE] + middleware)):
+            with override_settings(MIDDLEWARE=chain, DISPUTES_METRICS={'SLOW_REQUEST_SECONDS': None}):
+                clients[label] = Client()
+                clients[label].force_login(user)
+                clients[label].get(url)
+        samples = {'off': [], 'on': []}
+        with override_settings(DISPUTES_METRICS={'SLOW_REQUEST_SECONDS': None}):
+            for i in range(requests + 20):
+                for label, client in clients.items():
+                    started = time.perf_counter()
+                    client.get(url)
+                    if i >= 20:  # warm the role cache, templates and query plans first
+                        samples[label].append(time.perf_counter() - started)
+        get_registry().clear()
+        return latency_percentiles(samples['off'])[50], latency_percentiles(samples['on'])[50]
+
+    def _templates(self, renders):
+        # Template timing alone: the same template through both backends
+        params = {key: value for key, value in settings.TEMPLATES[0].items() if key != 'BACKEND'}
+        params.update({'NAME': 'bench', 'OPTIONS': dict(params.get('OPTIONS', {}))})
+        templates = {
+            'plain': DjangoTemplates(dict(params)).get_template('disputes/search.html'),
+            'timed': InstrumentedDjangoTemplates(dict(params)).get_template('disputes/search.html'),
+        }
+        context = {'query': 'charged', 'filters': {}, 'hits': [], 'risk_levels': [], 'statuses': []}
+        totals = {'plain': 0.0, 'timed': 0.0}
+        for _ in range(renders):
+            for label, template in templates.items():
+                started = time.perf_counter()
+                template.render(context)
+                totals[label] += time.perf_counter() - started
+        get_registry().clear()
+        plain, timed = (totals[label] / renders * 1e6 for label in ('plain', 'timed'))
+        self.stdout.write(f"Template render: {plain:.1f}us plain, {timed:.1f}us timed ({timed - plain:.1f}us per render)")
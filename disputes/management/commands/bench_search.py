@@ -0,0 +1,139 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from disputes.benchmarking import latency_percentiles, temporary_database
+from disputes.management.commands.seed_disputes import SEED_DISPUTES
+from disputes.search import search_cases
+
+STATUSES = ['NEW', 'ANALYZED', 'RESOLVED', 'CLOSED']
+FRAUD_SIGNALS = [
+    'card testing pattern', 'velocity spike', 'new device fingerprint', 'billing address mismatch',
+    'prior chargeback history', 'high risk merchant category', 'geolocation anomaly', 'refund abuse pattern',
+]
+REASONING = [
+    'Customer reports the charge was not recognized.', 'Merchant shows a matching refund request.',
+    'Transaction amount is consistent with prior purchases.', 'Multiple charges within minutes suggest a duplicate.',
+    'Subscription renewed after the stated cancellation date.', 'Shipping confirmation exists but delivery is disputed.',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks full-text case search (ranked, filtered, cursor-paged) over a large synthetic corpus in a temporary database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=1_000_000)
+        parser.add_argument('--analyzed', type=float, default=0.6, help='Fraction of cases with an analysis')
+        parser.add_argument('--vocabulary', type=int, default=50_000, help='Distinct filler words (Zipf-distributed)')
+        parser.add_argument('--batch', type=int, default=20_000)
+        parser.add_argument('--repeats', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        vocabulary = np.array([f"w{i:05d}" for i in range(options['vocabulary'])])
+
+        with temporary_database():
+            started = time.perf_counter()
+            self._load(rng, vocabulary, options)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Loaded {options['cases']:,} cases in {elapsed:.0f}s "
+                f"({options['cases'] / elapsed:,.0f} rows/s, indexed by the sync triggers)"
+            )
+
+            # A mid-frequency filler word: the Zipf rank decides how many cases contain it
+            rare, mid = vocabulary[5000], vocabulary[50]
+            queries = [
+                ('rare word', rare, {}),
+                ('mid word', mid, {}),
+                ('common word', 'charged', {}),
+                ('two words', f'charged {mid}', {}),
+                ('phrase', '"charged twice"', {}),
+                ('prefix', 'subscri*', {}),
+                ('signals', '"velocity spike"', {}),
+                ('common+filters', 'charged', {'category': 'Digital Goods', 'risk': 'Low', 'status': 'ANALYZED'}),
+            ]
+            self.stdout.write(f"{'query':>16} {'p50 ms':>8} {'p95 ms':>8} {'page10 ms':>10} {'LIKE ms':>8}")
+            for label, query, filters in queries:
+                self._run(label, query, filters, options['repeats'])
+
+    def _load(self, rng, vocabulary, options):
+        total, batch = options['cases'], options['batch']
+        # Zipf ranks, folded into the vocabulary
+        weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+        weights /= weights.sum()
+        now = timezone.now()
+        with connection.cursor() as db:
+            for start in range(0, total, batch):
+                size = min(batch, total - start)
+                seeds = rng.integers(len(SEED_DISPUTES), size=size)
+                fillers = rng.choice(vocabulary, size=(size, 6), p=weights)
+                statuses = rng.integers(len(STATUSES), size=size)
+                cases = []
+                for i in range(size):
+                    description, amount, category, _, _ = SEED_DISPUTES[seeds[i]]
+                    cases.append((
+                        f"{description} {' '.join(fillers[i])}", amount, category, STATUSES[statuses[i]],
+                        'MEDIUM', 2, False, now,
+                    ))
+                analyzed = np.flatnonzero(rng.random(size) < options['analyzed'])
+                signals = rng.integers(len(FRAUD_SIGNALS), size=(len(analyzed), 2))
+                steps = rng.integers(len(REASONING), size=(len(analyzed), 2))
+                with transaction.atomic():
+                    db.executemany(
+                        "INSERT INTO disputes_disputecase (description, amount, merchant_category, status, priority,"
+                        " priority_rank, is_high_risk, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                        cases,
+                    )
+                    # A fresh database numbers cases from 1
+                    db.executemany(
+                        "INSERT INTO disputes_riskanalysis (case_id, risk_score, classification, fraud_signals,"
+                        " reasoning_steps, recommended_action, financial_exposure, created_at)"
+                        " VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                        [
+                            (
+                                start + int(i) + 1, SEED_DISPUTES[seeds[i]][4], SEED_DISPUTES[seeds[i]][3],
+                                json.dumps([FRAUD_SIGNALS[s] for s in signals[n]]), json.dumps([REASONING[s] for s in steps[n]]),
+                                'Manual Review', 'Full Amount', now,
+                            )
+                            for n, i in enumerate(analyzed)
+                        ],
+                    )
+                self.stdout.write(f"  {start + size:,} / {total:,}", ending='\r')
+            self.stdout.write('')
+            db.execute("INSERT INTO disputes_case_search (disputes_case_search) VALUES ('optimize')")
+            db.execute("ANALYZE")
+
+    def _run(self, label, query, filters, repeats):
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            search_cases(query, **filters)
+            samples.append(time.perf_counter() - started)
+
+        # Ten pages deep through the cursor; each page costs about the same
+        cursor, page_time = None, 0.0
+        for _ in range(10):
+            started = time.perf_counter()
+            _, cursor = search_cases(query, cursor=cursor, **filters)
+            page_time = time.perf_counter() - started
+            if cursor is None:
+                break
+
+        # Unindexed baseline for a single word: finding every match with a LIKE scan
+        like = ''
+        word = query.strip('"*').split()[0]
+        if ' ' not in query and not filters:
+            started = time.perf_counter()
+            with connection.cursor() as db:
+                db.execute("SELECT count(*) FROM disputes_disputecase WHERE description LIKE %s", [f"%{word}%"])
+                db.fetchall()
+            like = f"{(time.perf_counter() - started) * 1000:.0f}"
+
+        p = latency_percentiles(samples)
+        self.stdout.write(f"{label:>16} {p[50]:>8.1f} {p[95]:>8.1f} {page_time * 1000:>10.1f} {like:>8}")
@@ -0,0 +1,105 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from disputes.benchmarking import latency_percentiles, temporary_database
+from disputes.models import DisputeCase
+from disputes.routing import get_router
+
+CLASSIFICATIONS = ['Unauthorized Transaction', 'Subscription Confusion', 'Merchant Dispute']
+# Group names as setup_specialists creates them ('Merchandise' is reached through the fallback chain)
+GROUPS = ['Unauthorized Transaction', 'Subscription Confusion', 'Merchandise Dispute']
+
+
+def legacy_assign(case, classification):
+    # The previous assign_specialist: group lookup, whole member list, random pick, full save
+    try:
+        group = Group.objects.get(name=f"Specialist: {classification}")
+        users = group.user_set.filter(is_active=True)
+        if users.exists():
+            specialist = random.choice(list(users))
+            case.assigned_ops = specialist
+            case.save()
+            return specialist
+    except Group.DoesNotExist:
+        pass
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks specialist assignment under concurrent submissions: legacy lookup vs the routing table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--specialists', type=int, default=8, help='Members per specialist group')
+        parser.add_argument('--cases', type=int, default=1500)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            for classification in GROUPS:
+                group = Group.objects.create(name=f"Specialist: {classification}")
+                for i in range(options['specialists']):
+                    user = User.objects.create_user(f"{classification[:5].lower()}-{i}", is_staff=True)
+                    group.user_set.add(user)
+
+            self.stdout.write(
+                f"{options['cases']} assignments, {options['threads']} threads, "
+                f"{options['specialists']} specialists per group"
+            )
+            self.stdout.write(f"{'strategy':>12} {'assign/s':>9} {'p50 ms':>7} {'p95 ms':>7} {'queries':>8} {'unrouted':>8} {'load min-max':>13} {'stdev':>6}")
+            self._run('legacy', legacy_assign, options)
+            for strategy in ('round_robin', 'least_open'):
+                with override_settings(DISPUTES_SPECIALIST_ROUTING={'STRATEGY': strategy}):
+                    get_router().reset()
+                    self._run(strategy, get_router().assign, options)
+            get_router().reset()
+
+    def _run(self, label, assign, options):
+        DisputeCase.objects.all().delete()
+        DisputeCase.objects.bulk_create([
+            DisputeCase(description="x", amount=10, merchant_category="Retail", status='ANALYZED')
+            for _ in range(options['cases'])
+        ])
+        cases = list(DisputeCase.objects.order_by('id'))
+        threads = options['threads']
+        lock = threading.Lock()
+        latencies, queries, unrouted = [], [0], [0]
+
+        def worker(shard):
+            try:
+                with CaptureQueriesContext(connection) as captured:
+                    for i in shard:
+                        started = time.perf_counter()
+                        result = assign(cases[i], CLASSIFICATIONS[i % len(CLASSIFICATIONS)])
+                        elapsed = time.perf_counter() - started
+                        with lock:
+                            latencies.append(elapsed)
+                            unrouted[0] += result is None
+                with lock:
+                    queries[0] += len(captured.captured_queries)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, [range(t, len(cases), threads) for t in range(threads)]))
+        wall = time.perf_counter() - started
+
+        loads = list(
+            DisputeCase.objects.exclude(assigned_ops=None).values('assigned_ops')
+            .annotate(total=Count('id')).values_list('total', flat=True)
+        )
+        p = latency_percentiles(latencies)
+        self.stdout.write(
+            f"{label:>12} {len(cases) / wall:>9.0f} {p[50]:>7.2f} {p[95]:>7.2f} {queries[0] / len(cases):>8.1f} "
+            f"{unrouted[0]:>8} {min(loads or [0]):>6}-{max(loads or [0]):<6} {statistics.pstdev(loads) if loads else 0:>6.1f}"
+        )
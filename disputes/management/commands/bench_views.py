@@ -0,0 +1,179 @@
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from disputes.benchmarking import latency_percentiles, temporary_database
+from disputes.models import DisputeCase
+from disputes.roles import OPS_GROUP
+from disputes.synthetic import generate, synthetic_options
+from disputes.urls import urlpatterns
+
+# url name -> (who, method, query string). Every view in disputes/urls.py needs one.
+SCENARIOS = {
+    'landing': ('customer', 'get', {}),
+    'customer_dashboard': ('customer', 'get', {}),
+    'customer_cases_api': ('customer', 'get', {}),
+    'ops_dashboard': ('ops', 'get', {}),
+    'ops_cases_api': ('ops', 'get', {}),
+    'ops_search': ('ops', 'get', {'q': 'charged'}),
+    'ops_search_api': ('ops', 'get', {'q': 'charged', 'risk': 'High'}),
+    'analyze_dispute': ('customer', 'get', {}),
+    'ingest_disputes': ('ops', 'post', {}),
+    'dispute_result': ('customer', 'get', {}),
+    'dispute_status': ('customer', 'get', {}),
+    'dispute_messages': ('customer', 'get', {}),
+    'dispute_events': ('customer', 'get', {}),
+    'insights_dashboard': ('ops', 'get', {}),
+    'metrics': ('ops', 'get', {}),
+}
+
+INGEST_CSV = b"description,amount,category\nDouble charge at the grocery store,42.10,Retail\n"
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests every view in disputes/urls.py against synthetic data at one or more scales, '
+        'recording latency and query counts; compares against a saved baseline to catch regressions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10000,100000', help='Comma-separated case counts (10k-10M)')
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per view')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads sharing the requests')
+        parser.add_argument('--profile', default=None, help='JSON file overriding SYNTHETIC_DEFAULTS')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--output', default=None, help='Write the results to this JSON file')
+        parser.add_argument('--baseline', default=None, help='Fail if results regress against this JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed p95 slowdown over the baseline (0.5 = 50%%)')
+        parser.add_argument('--min-regression-ms', type=float, default=5.0, help='Ignore p95 slowdowns smaller than this')
+
+    def handle(self, *args, **options):
+        missing = {p.name for p in urlpatterns} - set(SCENARIOS)
+        if missing:
+            raise CommandError(f"No load-test scenario for: {sorted(missing)}")
+        overrides = {}
+        if options['profile']:
+            with open(options['profile']) as f:
+                overrides = json.load(f)
+        try:
+            synthetic_options(overrides)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        results = {}
+        for scale in [int(s) for s in options['scales'].split(',')]:
+            results[str(scale)] = self._run_scale(scale, overrides, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['baseline']:
+            self._compare(results, options)
+
+    def _run_scale(self, scale, overrides, options):
+        # Insights are measured uncached, inline ingest does not queue LLM jobs and the
+        # test client (connecting from 127.0.0.1) may scrape the metrics
+        with temporary_database(), override_settings(
+            DISPUTES_INSIGHTS_CACHE_SECONDS=0, DISPUTES_INGEST={'WORKERS': 0, 'ENQUEUE': False},
+            DISPUTES_METRICS={'ALLOWED_IPS': ['127.0.0.1']},
+        ):
+            started = time.perf_counter()
+            summary = generate(
+                scale, overrides, seed=options['seed'],
+                progress=lambda done: self.stdout.write(f"  {done:,} / {scale:,} cases", ending='\r'),
+            )
+            self.stdout.write('')
+            self.stdout.write(
+                f"{scale:,} cases, {summary.analyses:,} analyses, {summary.messages:,} messages, "
+                f"{summary.customers:,} customers generated in {time.perf_counter() - started:.0f}s"
+            )
+            connection.cursor().execute("ANALYZE")
+
+            users, case = self._actors()
+            self.stdout.write(f"{'view':>20} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'queries':>8}")
+            results = {}
+            for name, (who, method, params) in SCENARIOS.items():
+                results[name] = self._drive(name, users[who], method, params, case, options)
+                r = results[name]
+                self.stdout.write(f"{name:>20} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['max']:>8.1f} {r['queries']:>8}")
+            return results
+
+    def _actors(self):
+        # The busiest customer's newest analyzed case, and a Risk Ops specialist (not staff,
+        # so role checks take the group path)
+        customer_id = (
+            DisputeCase.objects.values('customer').annotate(n=Count('id')).order_by('-n').values_list('customer', flat=True)[0]
+        )
+        case = DisputeCase.objects.filter(customer_id=customer_id, analysis__isnull=False).order_by('-id').first()
+        ops = User.objects.filter(groups__name=OPS_GROUP).order_by('id').first()
+        return {'customer': User.objects.get(pk=customer_id), 'ops': ops}, case
+
+    def _drive(self, name, user, method, params, case, options):
+        pattern = next(p for p in urlpatterns if p.name == name)
+        url = reverse(name, args=[case.id] if 'case_id' in pattern.pattern.converters else [])
+        lock = threading.Lock()
+        latencies, queries = [], []
+
+        def request(client):
+            if method == 'post':
+                upload = io.BytesIO(INGEST_CSV)
+                upload.name = 'export.csv'
+                response = client.post(url, {'file': upload})
+            else:
+                response = client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            if response.status_code >= 400:
+                raise CommandError(f"{name} answered {response.status_code}")
+
+        def worker(count):
+            client = Client()
+            client.force_login(user)
+            request(client)  # warm the role cache and this thread's connection
+            for _ in range(count):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    request(client)
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(len(captured))
+            connection.close()
+
+        threads = max(1, options['concurrency'])
+        shares = [options['requests'] // threads + (i < options['requests'] % threads) for i in range(threads)]
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for future in [pool.submit(worker, share) for share in shares if share]:
+                future.result()
+
+        p = latency_percentiles(latencies, (50, 95, 100))
+        return {'p50': p[50], 'p95': p[95], 'max': p[100], 'queries': max(queries)}
+
+    def _compare(self, results, options):
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+        regressions = []
+        for scale, views in results.items():
+            for name, current in views.items():
+                before = baseline.get(scale, {}).get(name)
+                if before is None:
+                    continue
+                if current['queries'] > before['queries']:
+                    regressions.append(f"{scale} {name}: {before['queries']} -> {current['queries']} queries")
+                slower = current['p95'] - before['p95']
+                if slower > options['min_regression_ms'] and current['p95'] > before['p95'] * (1 + options['tolerance']):
+                    regressions.append(f"{scale} {name}: p95 {before['p95']:.1f} -> {current['p95']:.1f} ms")
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from disputes.ingest import IngestError, ingest_file, ingest_options
+
+
+class Command(BaseCommand):
+    help = 'Bulk-imports disputes from a CSV or JSONL export, resuming interrupted imports of the same file'
+
+    def add_arguments(self, parser):
+        options = ingest_options()
+        parser.add_argument('path', help='CSV (.csv) or JSONL (.jsonl/.ndjson) file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help='Override detection from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=options['CHUNK_SIZE'], help='Rows per transaction')
+        parser.add_argument('--workers', type=int, default=options['WORKERS'], help='Pre-scoring processes (0 scores inline)')
+        parser.add_argument('--no-enqueue', action='store_true', help='Do not queue LLM analysis jobs for imported cases')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and import the file again')
+
+    def handle(self, *args, **options):
+        def progress(summary):
+            self.stdout.write(
+                f"  {summary.resumed_from + summary.rows_read} rows read, {summary.rows_created} created, "
+                f"{summary.rows_rejected} rejected ({summary.rows_per_second:.0f} rows/sec)"
+            )
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                summary = ingest_file(
+                    fileobj,
+                    options['path'],
+                    fmt=options['format'],
+                    chunk_size=options['chunk_size'],
+                    workers=options['workers'],
+                    enqueue=not options['no_enqueue'],
+                    restart=options['restart'],
+                    progress=progress,
+                )
+        except (OSError, IngestError) as e:
+            raise CommandError(str(e))
+
+        if summary.resumed_from:
+            self.stdout.write(f"Resumed after row {summary.resumed_from}.")
+        for error in summary.run.errors[:10]:
+            self.stdout.write(self.style.WARNING(f"  {error}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {summary.rows_created} case(s) from {summary.rows_read} row(s) "
+            f"({summary.rows_rejected} rejected) in {summary.elapsed:.1f}s ({summary.rows_per_second:.0f} rows/sec)."
+        ))
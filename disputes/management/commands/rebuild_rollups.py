@@ -0,0 +1,22 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from disputes.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the insights rollup table from DisputeCase and RiskAnalysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Only rebuild the last N days')
+
+    def handle(self, *args, **options):
+        since = timezone.localdate() - timedelta(days=options['days'] - 1) if options['days'] else None
+        started = time.perf_counter()
+        rows = rebuild_rollups(since=since)
+        elapsed = time.perf_counter() - started
+        scope = f"since {since}" if since else "all time"
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup row(s) ({scope}) in {elapsed:.2f}s."))
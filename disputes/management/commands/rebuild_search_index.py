@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from disputes.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Re-indexes every case for full-text search from DisputeCase and RiskAnalysis'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        cases = rebuild_search_index()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Indexed {cases} case(s) in {elapsed:.2f}s."))
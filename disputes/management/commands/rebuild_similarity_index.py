@@ -0,0 +1,23 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from disputes.similarity import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the near-duplicate (MinHash/LSH) index over analyzed disputes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=None, help='Only reindex cases created in the last N days')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        started = time.perf_counter()
+        indexed = rebuild_index(chunk_size=options['chunk_size'], since=since)
+        elapsed = time.perf_counter() - started
+        rate = indexed / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} case(s) in {elapsed:.1f}s ({rate:.0f} cases/sec)."))
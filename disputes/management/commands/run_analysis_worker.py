@@ -0,0 +1,79 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from disputes import jobs
+from disputes.cache import get_analysis_cache
+
+
+class Command(BaseCommand):
+    help = 'Drains the dispute analysis job queue with a pool of threads or processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Number of worker threads/processes')
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Per-worker job limit')
+        parser.add_argument('--lease-seconds', type=int, default=300, help='Requeue RUNNING jobs older than this')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        requeued = jobs.requeue_stale_jobs(options['lease_seconds'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        self.stdout.write(f"Starting {concurrency} {options['mode']} worker(s)...")
+        if options['mode'] == 'process':
+            processed = self._run_processes(concurrency, options)
+        else:
+            processed = self._run_threads(concurrency, options)
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)."))
+
+        cache = get_analysis_cache()
+        if cache is not None and options['mode'] == 'thread':
+            stats = cache.stats()
+            self.stdout.write(
+                f"Analysis cache: {stats['memory_hits']} memory hit(s), {stats['disk_hits']} disk hit(s), "
+                f"{stats['misses']} miss(es), hit rate {stats['hit_rate']:.1%}"
+            )
+
+    def _run_threads(self, concurrency, options):
+        stop_event = threading.Event()
+        results = [0] * concurrency
+
+        def target(slot):
+            results[slot] = jobs.work(
+                once=options['once'],
+                poll_interval=options['poll_interval'],
+                max_jobs=options['max_jobs'],
+                stop_event=stop_event,
+            )
+
+        threads = [threading.Thread(target=target, args=(i,), daemon=True) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers after current jobs...")
+            stop_event.set()
+            for t in threads:
+                t.join()
+        return sum(results)
+
+    def _run_processes(self, concurrency, options):
+        # Children must not inherit the parent's open database connections
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=concurrency, mp_context=context, initializer=jobs.init_worker_process) as pool:
+            futures = [
+                pool.submit(jobs.work_in_process, options['once'], options['poll_interval'], options['max_jobs'])
+                for _ in range(concurrency)
+            ]
+            return sum(f.result() for f in futures)
@@ -1,27 +1,39 @@
-from django.core.management.base import BaseCommand
+import json
+
+from django.core.management.base import BaseCommand, CommandError
 from disputes.models import DisputeCase, RiskAnalysis
-import random
-from datetime import timedelta
-from django.utils import timezone
+from disputes.synthetic import generate, synthetic_options
+
+SEED_DISPUTES = [
+    ("I did not authorize this purchase at Wal-Mart.", 45.00, "Retail", "Unauthorized Transaction", "High"),
+    ("Netflix charged me twice this month.", 15.99, "Digital Goods", "Duplicate Charge", "Low"),
+    ("The hotel room was dirty and not as described.", 250.00, "Travel & Hospitality", "Merchant Dispute", "Medium"),
+    ("I cancelled my subscription but was still charged.", 9.99, "Digital Goods", "Subscription Confusion", "Low"),
+    ("Someone stole my card and bought a TV.", 800.00, "Retail", "Unauthorized Transaction", "High"),
+    ("Food never arrived from Uber Eats.", 35.50, "Food & Beverage", "Merchant Dispute", "Medium"),
+    ("I don't recognize this charge from 'SQ *Coffee Shop'.", 4.50, "Food & Beverage", "Unknown", "Low"),
+    ("Refund was promised 10 days ago but never received.", 120.00, "Retail", "Refund Abuse", "Medium"),
+    ("Mistakenly charged for annual plan instead of monthly.", 100.00, "Software", "Subscription Confusion", "Low"),
+    ("Suspicious transaction in a country I have never visited.", 1200.00, "Travel & Hospitality", "Unauthorized Transaction", "High"),
+]
+
 
 class Command(BaseCommand):
-    help = 'Seeds synthetic dispute data'
+    help = 'Seeds synthetic dispute data: the ten demo cases, or --cases N generated at scale (disputes/synthetic.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=None, help='Generate this many cases (10k-10M) instead of the demo set')
+        parser.add_argument('--profile', default=None, help='JSON file overriding SYNTHETIC_DEFAULTS (distributions, rates)')
+        parser.add_argument('--chunk-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=None)
 
     def handle(self, *args, **kwargs):
+        if kwargs['cases']:
+            return self._generate(kwargs)
+
         self.stdout.write('Seeding data...')
         
-        disputes = [
-            ("I did not authorize this purchase at Wal-Mart.", 45.00, "Retail", "Unauthorized Transaction", "High"),
-            ("Netflix charged me twice this month.", 15.99, "Digital Goods", "Duplicate Charge", "Low"),
-            ("The hotel room was dirty and not as described.", 250.00, "Travel & Hospitality", "Merchant Dispute", "Medium"),
-            ("I cancelled my subscription but was still charged.", 9.99, "Digital Goods", "Subscription Confusion", "Low"),
-            ("Someone stole my card and bought a TV.", 800.00, "Retail", "Unauthorized Transaction", "High"),
-            ("Food never arrived from Uber Eats.", 35.50, "Food & Beverage", "Merchant Dispute", "Medium"),
-            ("I don't recognize this charge from 'SQ *Coffee Shop'.", 4.50, "Food & Beverage", "Unknown", "Low"),
-            ("Refund was promised 10 days ago but never received.", 120.00, "Retail", "Refund Abuse", "Medium"),
-            ("Mistakenly charged for annual plan instead of monthly.", 100.00, "Software", "Subscription Confusion", "Low"),
-            ("Suspicious transaction in a country I have never visited.", 1200.00, "Travel & Hospitality", "Unauthorized Transaction", "High"),
-        ]
+        disputes = SEED_DISPUTES
 
         for desc, amount, category, classification, risk in disputes:
             case = DisputeCase.objects.create(
@@ -41,3 +53,24 @@ class Command(BaseCommand):
             )
 
         self.stdout.write(self.style.SUCCESS(f'Successfully seeded {len(disputes)} cases.'))
+
+    def _generate(self, options):
+        overrides = {}
+        if options['profile']:
+            with open(options['profile']) as f:
+                overrides = json.load(f)
+        try:
+            synthetic_options(overrides)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        def progress(done):
+            self.stdout.write(f"  {done:,} / {options['cases']:,} cases", ending='\r')
+
+        summary = generate(options['cases'], overrides, chunk_size=options['chunk_size'], seed=options['seed'], progress=progress)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {summary.cases:,} cases, {summary.analyses:,} analyses and {summary.messages:,} messages for "
+            f"{summary.customers:,} customers and {summary.specialists} specialists in {summary.elapsed:.0f}s "
+            f"({summary.cases / summary.elapsed:,.0f} cases/s)."
+        ))
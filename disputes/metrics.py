@@ -0,0 +1,315 @@
+"""
+Request performance metrics.
+
+MetricsMiddleware records each request's latency and its database query
+count and time per view; the provider router records LLM call latency by
+provider, the answer parsers record which fallback tier recovered the JSON,
+and InstrumentedDjangoTemplates times template rendering. Everything lands in
+an in-process registry served in the Prometheus text format by the `metrics`
+view, which only answers scrapers sending BEARER_TOKEN or connecting from
+ALLOWED_IPS (neither is set by default).
+
+Each process keeps its own registry, so scrape every worker (the standard
+Prometheus setup for multi-process servers) rather than a load balancer.
+Requests slower than SLOW_REQUEST_SECONDS are logged to `disputes.metrics`
+with their slowest and most repeated queries.
+"""
+import bisect
+import hmac
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+METRICS_DEFAULTS = {
+    'ENABLED': True,
+    'ALLOWED_IPS': [],
+    'BEARER_TOKEN': None,
+    'SLOW_REQUEST_SECONDS': 1.0,
+    'SLOW_LOG_QUERIES': 5,
+}
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+logger = logging.getLogger(__name__)
+
+
+def metrics_options():
+    return {**METRICS_DEFAULTS, **getattr(settings, 'DISPUTES_METRICS', {})}
+
+
+def scrape_allowed(request):
+    """
+    Whether a request may read the metrics: it carries the BEARER_TOKEN, or
+    its REMOTE_ADDR is in ALLOWED_IPS (which a same-host proxy makes loopback).
+    """
+    options = metrics_options()
+    token = options['BEARER_TOKEN']
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if hmac.compare_digest(header.encode(), f"Bearer {token}".encode()):
+            return True
+    return request.META.get('REMOTE_ADDR') in options['ALLOWED_IPS']
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label set, as Prometheus expects.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets=SECONDS_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                running += count
+                yield '_bucket', label_values + (_format_value(bound),), ('le',), running
+            yield '_sum', label_values, (), total
+            yield '_count', label_values, (), running
+
+
+class CounterMetric:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._series = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] += amount
+
+    def samples(self):
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            yield '', label_values, (), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def histogram(self, name, help, labels, buckets=SECONDS_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def counter(self, name, help, labels):
+        return self._get(CounterMetric, name, help, labels)
+
+    def render(self):
+        """
+        The registry in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, label_values, extra_labels, value in metric.samples():
+                names = metric.labels + extra_labels
+                labels = ','.join(f'{name}="{_escape(label)}"' for name, label in zip(names, label_values))
+                name = metric.name + suffix
+                lines.append(f"{name}{{{labels}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._metrics = {}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_registry = Registry()
+
+
+def get_registry():
+    return _registry
+
+
+# Metric accessors for the instrumented code paths
+
+def request_seconds():
+    return _registry.histogram('disputes_request_seconds', 'Request latency by view.', ['view', 'method', 'status'])
+
+
+def request_queries():
+    return _registry.histogram('disputes_request_db_queries', 'Database queries per request by view.', ['view'], QUERY_COUNT_BUCKETS)
+
+
+def request_db_seconds():
+    return _registry.histogram('disputes_request_db_seconds', 'Database time per request by view.', ['view'])
+
+
+def llm_call_seconds():
+    return _registry.histogram('disputes_llm_call_seconds', 'LLM call latency by provider and outcome.', ['provider', 'outcome'], SECONDS_BUCKETS)
+
+
+def llm_parse_total():
+    return _registry.counter('disputes_llm_parse_total', 'LLM answers by the parse tier that recovered them.', ['tier'])
+
+
+def template_render_seconds():
+    return _registry.histogram('disputes_template_render_seconds', 'Template render time by template.', ['template'])
+
+
+def record_llm_call(provider, seconds, outcome='ok'):
+    if metrics_options()['ENABLED']:
+        llm_call_seconds().observe(seconds, provider, outcome)
+
+
+def record_parse(tier):
+    if metrics_options()['ENABLED']:
+        llm_parse_total().inc(tier)
+
+
+class _QueryRecorder:
+    # connection.execute_wrapper hook: counts and times every query, and keeps
+    # the statements themselves only when a slow log may need them
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if self.queries is not None:
+                self.queries.append((sql, elapsed))
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unresolved>'
+
+
+class MetricsMiddleware:
+    """
+    Times every request and counts its queries. Goes first in MIDDLEWARE so
+    the other middleware's queries (session, user) are included. Streaming
+    responses are timed until their headers are ready, not until the body ends.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = metrics_options()
+        if not options['ENABLED']:
+            return self.get_response(request)
+
+        slow_seconds = options['SLOW_REQUEST_SECONDS']
+        recorder = _QueryRecorder(keep_sql=slow_seconds is not None)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view = _view_name(request)
+        request_seconds().observe(elapsed, view, request.method, str(response.status_code))
+        request_queries().observe(recorder.count, view)
+        request_db_seconds().observe(recorder.seconds, view)
+        if slow_seconds is not None and elapsed >= slow_seconds:
+            log_slow_request(request, view, elapsed, recorder, options['SLOW_LOG_QUERIES'])
+        return response
+
+
+def log_slow_request(request, view, elapsed, recorder, top=5):
+    """
+    Logs a slow request with its query breakdown: the slowest statements and
+    the most repeated ones (N+1 candidates), grouped by SQL text.
+    """
+    by_sql = defaultdict(lambda: [0, 0.0])
+    for sql, seconds in recorder.queries:
+        by_sql[sql][0] += 1
+        by_sql[sql][1] += seconds
+    lines = [
+        f"Slow request: {request.method} {request.path} ({view}) took {elapsed * 1000:.0f}ms, "
+        f"{recorder.count} queries in {recorder.seconds * 1000:.0f}ms"
+    ]
+    slowest = sorted(by_sql.items(), key=lambda item: -item[1][1])[:top]
+    for sql, (count, seconds) in slowest:
+        lines.append(f"  {seconds * 1000:8.1f}ms x{count:<4} {sql[:300]}")
+    repeated = [(sql, count) for sql, (count, _) in by_sql.items() if count > 1 and sql not in dict(slowest)]
+    for sql, count in sorted(repeated, key=lambda item: -item[1])[:top]:
+        lines.append(f"  repeated x{count:<4} {sql[:300]}")
+    logger.warning('\n'.join(lines))
+
+
+class _TimedTemplate:
+    # Wraps a backend template so every top-level render is timed (includes and
+    # extends count towards the template that pulled them in)
+    def __init__(self, template):
+        self._template = template
+        self.origin = getattr(template, 'origin', None)
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        if not metrics_options()['ENABLED']:
+            return self._template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            name = getattr(self.origin, 'template_name', None) or '<string>'
+            template_render_seconds().observe(time.perf_counter() - started, name)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend with render timing; use it as TEMPLATES' BACKEND.
+    """
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
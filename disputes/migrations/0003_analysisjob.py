@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0002_disputecase_assigned_ops_disputecase_customer_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=3)),
+                ('worker_id', models.CharField(blank=True, max_length=100)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Not claimable before this time (retry backoff)')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_jobs', to='disputes.disputecase')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at', 'id'], name='job_claim_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0003_analysisjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(help_text='Hash of category, amount band, band index and band values')),
+                ('case_created_at', models.DateTimeField(help_text='Copy of the case timestamp for recency filtering')),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='disputes.disputecase')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket', 'case_created_at'], name='similarity_lookup_idx')],
+            },
+        ),
+    ]
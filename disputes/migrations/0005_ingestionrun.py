@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0004_similaritybucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='File name or path the rows came from', max_length=255)),
+                ('fingerprint', models.CharField(help_text='sha256 of the file contents', max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='RUNNING', max_length=20)),
+                ('rows_read', models.PositiveIntegerField(default=0, help_text='Checkpoint: data rows consumed so far')),
+                ('rows_created', models.PositiveIntegerField(default=0)),
+                ('rows_rejected', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(default=list, help_text='First few validation errors')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+
+
+def backfill_triage_fields(apps, schema_editor):
+    DisputeCase = apps.get_model('disputes', 'DisputeCase')
+    RiskAnalysis = apps.get_model('disputes', 'RiskAnalysis')
+    DisputeCase.objects.update(
+        priority_rank=Case(
+            When(priority='CRITICAL', then=Value(4)),
+            When(priority='HIGH', then=Value(3)),
+            When(priority='MEDIUM', then=Value(2)),
+            When(priority='LOW', then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        is_high_risk=Exists(RiskAnalysis.objects.filter(case=OuterRef('pk'), risk_score='High')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0005_ingestionrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='disputecase',
+            name='is_high_risk',
+            field=models.BooleanField(default=False, editable=False, help_text="analysis.risk_score == 'High'"),
+        ),
+        migrations.AddField(
+            model_name='disputecase',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=2, editable=False, help_text='CRITICAL=4 ... LOW=1'),
+        ),
+        migrations.RunPython(backfill_triage_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='disputecase',
+            index=models.Index(fields=['-priority_rank', '-created_at', '-id'], name='triage_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disputecase',
+            index=models.Index(fields=['is_high_risk', '-priority_rank', '-created_at', '-id'], name='triage_risk_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disputecase',
+            index=models.Index(fields=['assigned_ops', '-priority_rank', '-created_at', '-id'], name='triage_assigned_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0006_triage_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='disputecase',
+            index=models.Index(fields=['status', '-priority_rank', '-created_at', '-id'], name='triage_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disputecase',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='customer_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disputecase',
+            index=models.Index(fields=['customer', 'status', '-created_at', '-id'], name='customer_status_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:51
+
+from django.db import migrations, models
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    DisputeCase = apps.get_model('disputes', 'DisputeCase')
+    InsightRollup = apps.get_model('disputes', 'InsightRollup')
+    rows = (
+        DisputeCase.objects
+        .annotate(
+            day=TruncDate('created_at'),
+            rollup_classification=Coalesce('analysis__classification', Value('')),
+            rollup_risk=Coalesce('analysis__risk_score', Value('')),
+        )
+        .values('day', 'merchant_category', 'rollup_classification', 'rollup_risk')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    InsightRollup.objects.bulk_create([
+        InsightRollup(
+            day=row['day'],
+            merchant_category=row['merchant_category'],
+            classification=row['rollup_classification'],
+            risk_score=row['rollup_risk'],
+            cases=row['total'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0007_case_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InsightRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('merchant_category', models.CharField(max_length=100)),
+                ('classification', models.CharField(blank=True, max_length=100)),
+                ('risk_score', models.CharField(blank=True, max_length=20)),
+                ('cases', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'merchant_category', 'classification', 'risk_score'), name='insight_rollup_key')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
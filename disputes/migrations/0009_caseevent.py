@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0008_insightrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('MESSAGE', 'Message'), ('STATUS', 'Status')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='disputes.disputecase')),
+            ],
+        ),
+    ]
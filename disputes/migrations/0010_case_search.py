@@ -0,0 +1,154 @@
+# Full-text search index over case descriptions and analysis signals/reasoning
+# (see disputes/search.py). Kept in sync by database triggers, so bulk_create
+# and queryset updates are indexed too.
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE disputes_case_search USING fts5(
+        description, fraud_signals, reasoning_steps, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER disputes_case_search_insert AFTER INSERT ON disputes_disputecase BEGIN
+        INSERT INTO disputes_case_search (rowid, description, fraud_signals, reasoning_steps)
+        VALUES (new.id, new.description, '', '');
+    END
+    """,
+    """
+    CREATE TRIGGER disputes_case_search_update AFTER UPDATE OF description ON disputes_disputecase BEGIN
+        UPDATE disputes_case_search SET description = new.description WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER disputes_case_search_delete AFTER DELETE ON disputes_disputecase BEGIN
+        DELETE FROM disputes_case_search WHERE rowid = old.id;
+    END
+    """,
+    # JSON lists are indexed as their decoded, space-joined items
+    """
+    CREATE TRIGGER disputes_analysis_search_insert AFTER INSERT ON disputes_riskanalysis BEGIN
+        UPDATE disputes_case_search SET
+            fraud_signals = coalesce((SELECT group_concat(value, ' ') FROM json_each(new.fraud_signals)), ''),
+            reasoning_steps = coalesce((SELECT group_concat(value, ' ') FROM json_each(new.reasoning_steps)), '')
+        WHERE rowid = new.case_id;
+    END
+    """,
+    """
+    CREATE TRIGGER disputes_analysis_search_update
+    AFTER UPDATE OF fraud_signals, reasoning_steps, case_id ON disputes_riskanalysis BEGIN
+        UPDATE disputes_case_search SET fraud_signals = '', reasoning_steps = ''
+        WHERE rowid = old.case_id AND old.case_id != new.case_id;
+        UPDATE disputes_case_search SET
+            fraud_signals = coalesce((SELECT group_concat(value, ' ') FROM json_each(new.fraud_signals)), ''),
+            reasoning_steps = coalesce((SELECT group_concat(value, ' ') FROM json_each(new.reasoning_steps)), '')
+        WHERE rowid = new.case_id;
+    END
+    """,
+    """
+    CREATE TRIGGER disputes_analysis_search_delete AFTER DELETE ON disputes_riskanalysis BEGIN
+        UPDATE disputes_case_search SET fraud_signals = '', reasoning_steps = '' WHERE rowid = old.case_id;
+    END
+    """,
+    """
+    INSERT INTO disputes_case_search (rowid, description, fraud_signals, reasoning_steps)
+    SELECT c.id, c.description,
+        coalesce((SELECT group_concat(value, ' ') FROM json_each(a.fraud_signals)), ''),
+        coalesce((SELECT group_concat(value, ' ') FROM json_each(a.reasoning_steps)), '')
+    FROM disputes_disputecase c LEFT JOIN disputes_riskanalysis a ON a.case_id = c.id
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS disputes_analysis_search_delete",
+    "DROP TRIGGER IF EXISTS disputes_analysis_search_update",
+    "DROP TRIGGER IF EXISTS disputes_analysis_search_insert",
+    "DROP TRIGGER IF EXISTS disputes_case_search_delete",
+    "DROP TRIGGER IF EXISTS disputes_case_search_update",
+    "DROP TRIGGER IF EXISTS disputes_case_search_insert",
+    "DROP TABLE IF EXISTS disputes_case_search",
+]
+
+# Postgres: one weighted tsvector per case (description A, fraud signals B, reasoning C)
+POSTGRES_FORWARD = [
+    """
+    CREATE TABLE disputes_case_search (
+        case_id integer PRIMARY KEY REFERENCES disputes_disputecase (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX disputes_case_search_document ON disputes_case_search USING GIN (document)",
+    """
+    CREATE FUNCTION disputes_case_search_refresh(target integer) RETURNS void AS $$
+        INSERT INTO disputes_case_search (case_id, document)
+        SELECT c.id,
+            setweight(to_tsvector('english', c.description), 'A') ||
+            setweight(to_tsvector('english', coalesce((SELECT string_agg(value, ' ') FROM jsonb_array_elements_text(a.fraud_signals)), '')), 'B') ||
+            setweight(to_tsvector('english', coalesce((SELECT string_agg(value, ' ') FROM jsonb_array_elements_text(a.reasoning_steps)), '')), 'C')
+        FROM disputes_disputecase c LEFT JOIN disputes_riskanalysis a ON a.case_id = c.id
+        WHERE c.id = target
+        ON CONFLICT (case_id) DO UPDATE SET document = EXCLUDED.document
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE FUNCTION disputes_case_search_case_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM disputes_case_search_refresh(NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE FUNCTION disputes_case_search_analysis_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM disputes_case_search_refresh(OLD.case_id);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM disputes_case_search_refresh(NEW.case_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER disputes_case_search_case AFTER INSERT OR UPDATE OF description ON disputes_disputecase
+    FOR EACH ROW EXECUTE FUNCTION disputes_case_search_case_changed()
+    """,
+    """
+    CREATE TRIGGER disputes_case_search_analysis AFTER INSERT OR DELETE OR UPDATE OF fraud_signals, reasoning_steps, case_id
+    ON disputes_riskanalysis FOR EACH ROW EXECUTE FUNCTION disputes_case_search_analysis_changed()
+    """,
+    "SELECT disputes_case_search_refresh(id) FROM disputes_disputecase",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP TRIGGER IF EXISTS disputes_case_search_analysis ON disputes_riskanalysis",
+    "DROP TRIGGER IF EXISTS disputes_case_search_case ON disputes_disputecase",
+    "DROP FUNCTION IF EXISTS disputes_case_search_analysis_changed()",
+    "DROP FUNCTION IF EXISTS disputes_case_search_case_changed()",
+    "DROP FUNCTION IF EXISTS disputes_case_search_refresh(integer)",
+    "DROP TABLE IF EXISTS disputes_case_search",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0009_caseevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0010_case_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='partial',
+            field=models.JSONField(blank=True, default=dict, help_text='Answer fields received so far while a worker streams the analysis'),
+        ),
+        migrations.AlterField(
+            model_name='caseevent',
+            name='kind',
+            field=models.CharField(choices=[('MESSAGE', 'Message'), ('STATUS', 'Status'), ('ANALYSIS', 'Analysis progress')], max_length=10),
+        ),
+    ]
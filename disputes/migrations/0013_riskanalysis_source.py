@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:20
+
+from django.db import migrations, models
+
+HEURISTIC_INTRO = "Running in Heuristic Mode (No/Invalid API Key). checking keywords..."
+
+# SQLite adds the column by rebuilding disputes_riskanalysis, which drops the
+# search index triggers from 0010_case_search; they are created again as they were.
+SQLITE_SEARCH_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS disputes_analysis_search_insert",
+    "DROP TRIGGER IF EXISTS disputes_analysis_search_update",
+    "DROP TRIGGER IF EXISTS disputes_analysis_search_delete",
+    """
+    CREATE TRIGGER disputes_analysis_search_insert AFTER INSERT ON disputes_riskanalysis BEGIN
+        UPDATE disputes_case_search SET
+            fraud_signals = coalesce((SELECT group_concat(value, ' ') FROM json_each(new.fraud_signals)), ''),
+            reasoning_steps = coalesce((SELECT group_concat(value, ' ') FROM json_each(new.reasoning_steps)), '')
+        WHERE rowid = new.case_id;
+    END
+    """,
+    """
+    CREATE TRIGGER disputes_analysis_search_update
+    AFTER UPDATE OF fraud_signals, reasoning_steps, case_id ON disputes_riskanalysis BEGIN
+        UPDATE disputes_case_search SET fraud_signals = '', reasoning_steps = ''
+        WHERE rowid = old.case_id AND old.case_id != new.case_id;
+        UPDATE disputes_case_search SET
+            fraud_signals = coalesce((SELECT group_concat(value, ' ') FROM json_each(new.fraud_signals)), ''),
+            reasoning_steps = coalesce((SELECT group_concat(value, ' ') FROM json_each(new.reasoning_steps)), '')
+        WHERE rowid = new.case_id;
+    END
+    """,
+    """
+    CREATE TRIGGER disputes_analysis_search_delete AFTER DELETE ON disputes_riskanalysis BEGIN
+        UPDATE disputes_case_search SET fraud_signals = '', reasoning_steps = '' WHERE rowid = old.case_id;
+    END
+    """,
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+def backfill_analysis_source(apps, schema_editor):
+    # Existing rows are told apart by their first reasoning step
+    RiskAnalysis = apps.get_model('disputes', 'RiskAnalysis')
+    SimilarityBucket = apps.get_model('disputes', 'SimilarityBucket')
+    sources = {'heuristic': [], 'reused': []}
+    for analysis_id, case_id, steps in RiskAnalysis.objects.values_list('id', 'case_id', 'reasoning_steps').iterator():
+        first = steps[0] if isinstance(steps, list) and steps else None
+        if first == HEURISTIC_INTRO:
+            sources['heuristic'].append((analysis_id, case_id))
+        elif isinstance(first, str) and first.startswith("Near-duplicate of Case #"):
+            sources['reused'].append((analysis_id, case_id))
+    for source, rows in sources.items():
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            RiskAnalysis.objects.filter(id__in=[analysis_id for analysis_id, _ in chunk]).update(source=source)
+            SimilarityBucket.objects.filter(case_id__in=[case_id for _, case_id in chunk]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0012_sharedversion'),
+    ]
+
+    operations = [
+        # Undoing the AddField rebuilds the table too; the triggers follow it
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='riskanalysis',
+            name='source',
+            field=models.CharField(choices=[('llm', 'LLM'), ('heuristic', 'Heuristic Fallback'), ('reused', 'Reused Near-Duplicate')], default='llm', help_text='Where the analysis came from; only LLM analyses are reused', max_length=20),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_analysis_source, migrations.RunPython.noop),
+    ]
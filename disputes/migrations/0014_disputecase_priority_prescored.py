@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:30
+
+from django.db import migrations, models
+
+# SQLite adds the column by rebuilding disputes_disputecase, which drops the
+# search index triggers from 0010_case_search; they are created again as they were.
+SQLITE_SEARCH_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS disputes_case_search_insert",
+    "DROP TRIGGER IF EXISTS disputes_case_search_update",
+    "DROP TRIGGER IF EXISTS disputes_case_search_delete",
+    """
+    CREATE TRIGGER disputes_case_search_insert AFTER INSERT ON disputes_disputecase BEGIN
+        INSERT INTO disputes_case_search (rowid, description, fraud_signals, reasoning_steps)
+        VALUES (new.id, new.description, '', '');
+    END
+    """,
+    """
+    CREATE TRIGGER disputes_case_search_update AFTER UPDATE OF description ON disputes_disputecase BEGIN
+        UPDATE disputes_case_search SET description = new.description WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER disputes_case_search_delete AFTER DELETE ON disputes_disputecase BEGIN
+        DELETE FROM disputes_case_search WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0013_riskanalysis_source'),
+    ]
+
+    operations = [
+        # Undoing the AddField rebuilds the table too; the triggers follow it
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='disputecase',
+            name='priority_prescored',
+            field=models.BooleanField(default=False, editable=False, help_text='Priority is the ingest pre-score; the analysis replaces it'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
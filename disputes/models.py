@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class DisputeCase(models.Model):
     STATUS_CHOICES = [
@@ -16,6 +17,12 @@ class DisputeCase(models.Model):
         ('CRITICAL', 'Critical'),
     ]
 
+    # Numeric form of `priority` for index-friendly triage ordering
+    PRIORITY_RANKS = {'LOW': 1, 'MEDIUM': 2, 'HIGH': 3, 'CRITICAL': 4}
+
+    # Statuses that count towards a specialist's open caseload
+    OPEN_STATUSES = ('NEW', 'ANALYZED')
+
     # Core Fields
     description = models.TextField(help_text="The dispute description text")
     amount = models.DecimalField(max_digits=10, decimal_places=2, help_text="Transaction amount")
@@ -29,10 +36,53 @@ class DisputeCase(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Triage queue (denormalized for the ops dashboard): rank follows `priority` on save,
+    # the risk flag follows the case's RiskAnalysis (see disputes/signals.py)
+    priority_rank = models.PositiveSmallIntegerField(default=2, editable=False, help_text="CRITICAL=4 ... LOW=1")
+    is_high_risk = models.BooleanField(default=False, editable=False, help_text="analysis.risk_score == 'High'")
+    # Bulk-imported cases start with the heuristic pre-score as their priority (disputes/ingest.py)
+    priority_prescored = models.BooleanField(default=False, editable=False, help_text="Priority is the ingest pre-score; the analysis replaces it")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-priority_rank', '-created_at', '-id'], name='triage_order_idx'),
+            models.Index(fields=['is_high_risk', '-priority_rank', '-created_at', '-id'], name='triage_risk_idx'),
+            models.Index(fields=['assigned_ops', '-priority_rank', '-created_at', '-id'], name='triage_assigned_idx'),
+            models.Index(fields=['status', '-priority_rank', '-created_at', '-id'], name='triage_status_idx'),
+            # Customer case lists, newest first, optionally by status
+            models.Index(fields=['customer', '-created_at', '-id'], name='customer_recent_idx'),
+            models.Index(fields=['customer', 'status', '-created_at', '-id'], name='customer_status_idx'),
+        ]
+
     def __str__(self):
         return f"Case #{self.id} - {self.merchant_category} (${self.amount})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the insights rollup can move the case if its category is edited
+        instance._loaded_category = instance.__dict__.get('merchant_category')
+        # ...live result pages hear about status changes
+        instance._loaded_status = instance.__dict__.get('status')
+        # ...and specialist load counters can follow reassignment and closing
+        if 'assigned_ops_id' in instance.__dict__ and 'status' in instance.__dict__:
+            instance._loaded_assignment = (instance.assigned_ops_id, instance.status in cls.OPEN_STATUSES)
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.priority_rank = self.PRIORITY_RANKS.get(self.priority, 0)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'priority' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'priority_rank'}
+        super().save(*args, **kwargs)
+
 class RiskAnalysis(models.Model):
+    SOURCE_CHOICES = [
+        ('llm', 'LLM'),
+        ('heuristic', 'Heuristic Fallback'),
+        ('reused', 'Reused Near-Duplicate'),
+    ]
+
     case = models.OneToOneField(DisputeCase, on_delete=models.CASCADE, related_name='analysis')
     risk_score = models.CharField(max_length=20, help_text="Low, Medium, High")
     classification = models.CharField(max_length=100, help_text="Dispute reason classification")
@@ -40,11 +90,19 @@ class RiskAnalysis(models.Model):
     reasoning_steps = models.JSONField(default=list, help_text="Step-by-step reasoning logic")
     recommended_action = models.CharField(max_length=255, help_text="Suggested next step")
     financial_exposure = models.CharField(max_length=50, blank=True, null=True)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='llm', help_text="Where the analysis came from; only LLM analyses are reused")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Risk Analysis for Case #{self.case.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the insights rollup can move the case when a re-analysis changes them
+        instance._loaded_rollup_key = (instance.__dict__.get('classification'), instance.__dict__.get('risk_score'))
+        return instance
+
 class DisputeChatMessage(models.Model):
     case = models.ForeignKey(DisputeCase, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -54,3 +112,130 @@ class DisputeChatMessage(models.Model):
 
     def __str__(self):
         return f"Message by {self.sender} on Case #{self.case.id}"
+
+class AnalysisJob(models.Model):
+    """
+    Queued LLM analysis for a case, drained by the `run_analysis_worker` command.
+    Lives in the main database so no external broker is needed.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    case = models.ForeignKey(DisputeCase, on_delete=models.CASCADE, related_name='analysis_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    worker_id = models.CharField(max_length=100, blank=True)
+    available_at = models.DateTimeField(default=timezone.now, help_text="Not claimable before this time (retry backoff)")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    partial = models.JSONField(default=dict, blank=True, help_text="Answer fields received so far while a worker streams the analysis")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"Analysis job #{self.id} for Case #{self.case_id} ({self.status})"
+
+class SimilarityBucket(models.Model):
+    """
+    One LSH band of an analyzed case's description MinHash. Cases sharing a
+    bucket are near-duplicate candidates (see disputes/similarity.py).
+    """
+    case = models.ForeignKey(DisputeCase, on_delete=models.CASCADE, related_name='similarity_buckets')
+    bucket = models.BigIntegerField(help_text="Hash of category, amount band, band index and band values")
+    case_created_at = models.DateTimeField(help_text="Copy of the case timestamp for recency filtering")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'case_created_at'], name='similarity_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"Bucket {self.bucket} for Case #{self.case_id}"
+
+class IngestionRun(models.Model):
+    """
+    Progress of one bulk import (see disputes/ingest.py). The checkpoint is
+    advanced in the same transaction as each chunk of cases, so a restarted
+    import of the same file resumes exactly after the last committed chunk.
+    """
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    source = models.CharField(max_length=255, help_text="File name or path the rows came from")
+    fingerprint = models.CharField(max_length=64, unique=True, help_text="sha256 of the file contents")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    rows_read = models.PositiveIntegerField(default=0, help_text="Checkpoint: data rows consumed so far")
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, help_text="First few validation errors")
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ingestion of {self.source} ({self.status}, {self.rows_read} rows)"
+
+class InsightRollup(models.Model):
+    """
+    Case counts by day x merchant category x classification x risk level, kept
+    current by signals (see disputes/rollups.py) so insights never scan the
+    fact tables. Cases without an analysis yet count under blank
+    classification and risk. Repair with `rebuild_rollups`.
+    """
+    day = models.DateField()
+    merchant_category = models.CharField(max_length=100)
+    classification = models.CharField(max_length=100, blank=True)
+    risk_score = models.CharField(max_length=20, blank=True)
+    cases = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'merchant_category', 'classification', 'risk_score'], name='insight_rollup_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.merchant_category} / {self.classification or '-'} / {self.risk_score or '-'}: {self.cases}"
+
+class CaseEvent(models.Model):
+    """
+    Change feed for live result pages: a row per new chat message or case
+    status change, written by signals, and per partial answer published by a
+    streaming analysis worker. Each web process polls it with one query per
+    tick and wakes only the streams of the cases that changed
+    (see disputes/live.py). Old rows are pruned by the poller.
+    """
+    KIND_CHOICES = [
+        ('MESSAGE', 'Message'),
+        ('STATUS', 'Status'),
+        ('ANALYSIS', 'Analysis progress'),
+    ]
+
+    case = models.ForeignKey(DisputeCase, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} event #{self.id} for Case #{self.case_id}"
+
+class SharedVersion(models.Model):
+    """
+    Named counter that every process reads to notice changes made in another
+    one, e.g. to drop cached roles (see disputes/versions.py).
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
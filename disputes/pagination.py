@@ -0,0 +1,96 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with a WHERE on the sort key of the last row seen instead
+of an OFFSET, so every page costs the same however deep the reader goes and
+rows inserted meanwhile never shift a page. The ordering must end with a
+unique field (normally 'id').
+"""
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder rounds datetimes to milliseconds; a cursor must keep the exact value
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _field_name(order):
+    return order.lstrip('-')
+
+
+def pack_cursor(values):
+    """
+    Opaque token for a list of JSON-serializable sort key values.
+    """
+    raw = json.dumps(values, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def unpack_cursor(token, length):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor("Cursor does not match this listing")
+    return values
+
+
+def encode_cursor(row, ordering):
+    # Rows are model instances, or dicts from a .values() queryset
+    if isinstance(row, dict):
+        values = [row[_field_name(order)] for order in ordering]
+    else:
+        values = [getattr(row, _field_name(order)) for order in ordering]
+    return pack_cursor(values)
+
+
+def decode_cursor(token, model, ordering):
+    values = unpack_cursor(token, len(ordering))
+    try:
+        return [model._meta.get_field(_field_name(order)).to_python(value) for order, value in zip(ordering, values)]
+    except Exception:
+        raise InvalidCursor("Cursor does not match this listing")
+
+
+def keyset_filter(ordering, values):
+    """
+    Q selecting the rows that sort strictly after `values` in `ordering`.
+    """
+    condition = Q(pk__in=[])
+    equal = Q()
+    for order, value in zip(ordering, values):
+        name = _field_name(order)
+        lookup = 'lt' if order.startswith('-') else 'gt'
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=50):
+    """
+    Returns (rows, next_cursor) for the page after `cursor` (None for the first
+    page). `next_cursor` is None on the last page. Raises InvalidCursor.
+    """
+    ordering = list(ordering)
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor, queryset.model, ordering)))
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1], ordering)
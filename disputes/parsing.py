@@ -0,0 +1,245 @@
+"""
+Incremental parsing of streamed LLM answers.
+
+The model is asked for one JSON object. `IncrementalJSONParser` scans the
+text once as chunks arrive and emits each top-level field as soon as its
+value is complete, plus each element of list fields (e.g. reasoning steps),
+so callers can show progress and stop reading once they have what they need.
+"""
+import ast
+import json
+
+# Expected answer fields and their types; unknown keys are passed through untouched
+ANSWER_SCHEMA = {
+    'classification': str,
+    'summary': str,
+    'fraud_signals': list,
+    'risk_level': str,
+    'financial_exposure': str,
+    'recommended_action': str,
+    'reasoning_steps': list,
+}
+
+# Keys an answer must carry to be usable; anything else is treated as malformed
+REQUIRED_FIELDS = ('classification', 'risk_level', 'recommended_action')
+
+# Everything we persist on RiskAnalysis; once these are in, the rest of the stream is not needed
+PERSISTED_FIELDS = REQUIRED_FIELDS + ('fraud_signals', 'reasoning_steps', 'financial_exposure')
+
+
+class AnswerSchemaError(ValueError):
+    pass
+
+
+def check_field(key, value):
+    expected = ANSWER_SCHEMA.get(key)
+    if expected is not None and not isinstance(value, expected):
+        raise AnswerSchemaError(f"Field '{key}' should be {expected.__name__}, got {type(value).__name__}")
+
+
+def check_answer(result, required=REQUIRED_FIELDS):
+    """
+    Validates a complete answer the way the incremental parser validates a
+    streamed one: an object with every required key and known fields of the
+    expected type. Optional fields that are null are dropped. Returns the
+    answer or raises AnswerSchemaError.
+    """
+    if not isinstance(result, dict):
+        raise AnswerSchemaError(f"Expected a JSON object, got {type(result).__name__}")
+    result = {key: value for key, value in result.items() if value is not None or key in required}
+    missing = [key for key in required if key not in result]
+    if missing:
+        raise AnswerSchemaError(f"Answer is missing required keys: {missing}")
+    for key, value in result.items():
+        check_field(key, value)
+    return result
+
+
+def decode_value(text):
+    """
+    Decodes one JSON value, accepting Python-literal syntax (single quotes, True/None) too.
+    """
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return ast.literal_eval(text)
+
+
+class IncrementalJSONParser:
+    """
+    Single-pass, resumable scanner for a streamed JSON object.
+
+    Leading text such as a markdown fence is skipped up to the first '{', and
+    anything after the closing '}' is ignored. Strings may use either quote
+    style, so Python-dict output is accepted. If the object turns out to be a
+    `{'type': 'text', 'text': '...'}` content frame, the inner text is handed to
+    a nested parser once rather than re-parsing the whole answer.
+
+    `feed` returns a list of events:
+        ('field', key, value)  a top-level field is complete
+        ('item', key, value)   an element of a top-level list field is complete
+    """
+
+    def __init__(self, required=REQUIRED_FIELDS, stop_fields=PERSISTED_FIELDS):
+        self.required = tuple(required)
+        self.stop_fields = tuple(stop_fields)
+        self.fields = {}
+        self._buf = ""
+        self._pos = 0
+        self._state = 'seek'
+        self._key = None
+        self._value_start = None
+        self._depth = 0
+        self._in_list = False
+        self._item_start = None
+        self._inner = None
+
+    @property
+    def done(self):
+        """
+        True once the root object is closed.
+        """
+        if self._inner is not None:
+            return self._inner.done
+        return self._state == 'done'
+
+    @property
+    def complete(self):
+        """
+        True once every stop field has arrived; the rest of the stream can be dropped.
+        """
+        if self._inner is not None:
+            return self._inner.complete
+        return all(key in self.fields for key in self.stop_fields) or self.done
+
+    def feed(self, chunk):
+        if self._inner is not None:
+            return self._inner.feed(chunk)
+        if self._state == 'done' or not chunk:
+            return []
+        self._buf += chunk
+        events = []
+        self._scan(events)
+        return events
+
+    def close(self):
+        """
+        Returns the parsed answer. A truncated stream is accepted as long as the
+        required fields made it through.
+        """
+        if self._inner is not None:
+            return self._inner.close()
+        if not any(key in self.fields for key in self.required) and isinstance(self.fields.get('text'), str):
+            # Frame whose 'text' arrived before its 'type'
+            self._inner = IncrementalJSONParser(self.required, self.stop_fields)
+            self._inner.feed(self.fields['text'])
+            return self._inner.close()
+        missing = [key for key in self.required if key not in self.fields]
+        if missing:
+            state = "complete" if self._state == 'done' else "truncated"
+            raise AnswerSchemaError(f"Answer ({state}) is missing required keys: {missing}")
+        return dict(self.fields)
+
+    def _scan_string(self, start):
+        # Returns the index of the closing quote, or None if the string is still streaming
+        quote = self._buf[start]
+        i = start + 1
+        while i < len(self._buf):
+            c = self._buf[i]
+            if c == '\\':
+                i += 2
+                continue
+            if c == quote:
+                return i
+            i += 1
+        return None
+
+    def _scan(self, events):
+        buf = self._buf
+        while self._pos < len(buf):
+            c = buf[self._pos]
+
+            if self._state == 'seek':
+                if c == '{':
+                    self._state = 'key'
+                self._pos += 1
+
+            elif self._state == 'key':
+                if c in '"\'':
+                    end = self._scan_string(self._pos)
+                    if end is None:
+                        return
+                    self._key = decode_value(buf[self._pos:end + 1])
+                    self._pos = end + 1
+                    self._state = 'colon'
+                elif c == '}':
+                    self._state = 'done'
+                    return
+                else:
+                    self._pos += 1
+
+            elif self._state == 'colon':
+                if c == ':':
+                    self._state = 'value'
+                    self._value_start = None
+                self._pos += 1
+
+            elif self._state == 'value':
+                if self._value_start is None:
+                    if c.isspace():
+                        self._pos += 1
+                        continue
+                    self._value_start = self._pos
+                    self._depth = 0
+                    self._in_list = c == '['
+
+                if c in '"\'':
+                    end = self._scan_string(self._pos)
+                    if end is None:
+                        return
+                    self._pos = end + 1
+                    continue
+
+                if c in '{[':
+                    self._depth += 1
+                    if self._depth == 1 and self._in_list:
+                        self._item_start = self._pos + 1
+                elif c in '}]':
+                    if self._depth == 0:
+                        # Root object closes right after this value
+                        self._finish_value(events, buf[self._value_start:self._pos])
+                        self._state = 'done'
+                        return
+                    if self._depth == 1 and self._in_list:
+                        self._finish_item(events, buf[self._item_start:self._pos])
+                    self._depth -= 1
+                elif c == ',':
+                    if self._depth == 0:
+                        self._finish_value(events, buf[self._value_start:self._pos])
+                        self._state = 'key'
+                    elif self._depth == 1 and self._in_list:
+                        self._finish_item(events, buf[self._item_start:self._pos])
+                        self._item_start = self._pos + 1
+                self._pos += 1
+
+                if self._inner is not None:
+                    return
+
+    def _finish_item(self, events, text):
+        if text.strip():
+            events.append(('item', self._key, decode_value(text)))
+
+    def _finish_value(self, events, text):
+        key = self._key
+        value = decode_value(text)
+        if value is None and key not in self.required:
+            return  # an optional field the model left empty
+        check_field(key, value)
+        self.fields[key] = value
+        events.append(('field', key, value))
+
+        # Content frame around the real answer: parse the inner text once
+        if key == 'text' and isinstance(value, str) and self.fields.get('type') == 'text':
+            self._inner = IncrementalJSONParser(self.required, self.stop_fields)
+            events.extend(self._inner.feed(value))
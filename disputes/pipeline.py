@@ -0,0 +1,125 @@
+from django.db import transaction
+
+from .models import RiskAnalysis
+from .routing import get_router
+from .services import get_agent
+from .similarity import find_similar_case, reused_analysis, similarity_options
+
+
+def assign_specialist(case, classification):
+    """
+    Assigns the case to a member of 'Specialist: <Classification>' (or a fallback
+    group) through the cached routing table. Returns the specialist's id or None.
+    """
+    return get_router().assign(case, classification)
+
+
+def apply_analysis(case, analysis_json):
+    """
+    Persists an agent result for a case: writes the RiskAnalysis, applies
+    auto-routing and specialist assignment, and marks the case ANALYZED.
+    Safe to re-run for the same case (job retries overwrite the analysis).
+
+    Priority and the high-risk flag are decided before anything is written;
+    the assignee is picked, and the case (inserted here if it is not saved yet)
+    and its analysis are written, in one transaction. If that rolls back, the
+    router's load counters are restored.
+    """
+    classification = analysis_json.get('classification', 'Unknown')
+    risk_score = analysis_json.get('risk_level', 'Unknown')
+
+    # Auto-Routing Logic; a bulk import's heuristic pre-score only stands in until now
+    if case.priority_prescored:
+        case.priority = 'MEDIUM'  # what an unscored case starts from
+        case.priority_prescored = False
+    if risk_score == 'High' or classification == 'Unauthorized Transaction':
+        case.priority = 'CRITICAL'
+    case.status = 'ANALYZED'
+    # Written with the case, so the RiskAnalysis signal does not update it again
+    case.is_high_risk = risk_score == 'High'
+
+    fields = {
+        'risk_score': risk_score,
+        'classification': classification,
+        'fraud_signals': analysis_json.get('fraud_signals', []),
+        'reasoning_steps': analysis_json.get('reasoning_steps', []),
+        'recommended_action': analysis_json.get('recommended_action', 'Manual Review'),
+        'financial_exposure': analysis_json.get('financial_exposure', 'Unknown'),
+        # Anything not tagged by the agent or the similarity index is a model answer
+        'source': analysis_json.get('source') if analysis_json.get('source') in ('heuristic', 'reused') else 'llm',
+    }
+    router = get_router()
+    loaded = (case.assigned_ops_id, getattr(case, '_loaded_assignment', None))
+    assigned = None
+    try:
+        with transaction.atomic():
+            # Specialist Assignment (counted by the router; saved with the case below)
+            assigned = router.assign(case, classification, save=False)
+            analysis = _write_analysis(case, fields)
+    except Exception:
+        if assigned is not None:
+            # Nothing was written: hand the open case back to the previous assignee's counter
+            router.record_change(case._loaded_assignment, loaded[1] or (None, False))
+            case.assigned_ops_id, case._loaded_assignment = loaded
+        raise
+    return analysis
+
+
+def _write_analysis(case, fields):
+    # The case with a single INSERT or column-limited UPDATE, then its analysis
+    if case.pk is None:
+        case.save()
+        analysis = None
+    else:
+        case.save(update_fields=['priority', 'priority_prescored', 'status', 'assigned_ops', 'is_high_risk'])
+        analysis = RiskAnalysis.objects.filter(case=case).first()
+    if analysis is None:
+        analysis = RiskAnalysis(case=case, **fields)
+        update_fields = None
+    else:
+        analysis.case = case
+        for name, value in fields.items():
+            setattr(analysis, name, value)
+        update_fields = list(fields)
+    analysis._case_flag_saved = True
+    analysis.save(update_fields=update_fields)
+    return analysis
+
+
+def case_analysis(case, agent=None, progress=None):
+    """
+    The agent's answer for a case (saved or not). A recent near-duplicate's
+    analysis is reused instead of calling the LLM. With `progress`, the answer
+    is streamed and `progress(partial)` is called with the fields received so
+    far (list fields grow item by item).
+    """
+    match = find_similar_case(case) if similarity_options()['ENABLED'] else None
+    if match is not None:
+        return reused_analysis(*match)
+    agent = agent or get_agent()
+    if progress is None:
+        return agent.analyze(case.description, case.amount, case.merchant_category)
+
+    partial = {}
+    for event in agent.analyze_stream(case.description, case.amount, case.merchant_category):
+        if event[0] == 'result':
+            return event[1]
+        if event[0] == 'fallback':
+            # Heuristic events follow; drop what the model had sent
+            partial = {}
+        elif event[0] == 'item':
+            partial.setdefault(event[1], []).append(event[2])
+        elif partial.get(event[1]) == event[2]:
+            continue  # a list field closing after its items
+        else:
+            partial[event[1]] = event[2]
+        progress(dict(partial))
+
+
+def analyze_case(case, agent=None, progress=None):
+    """
+    Runs the reasoning agent for a case and persists the result. An unsaved
+    case is only written once the answer is in, together with its analysis,
+    so no transaction is held open while the model runs.
+    """
+    return apply_analysis(case, case_analysis(case, agent, progress))
@@ -0,0 +1,304 @@
+"""
+Deadline-aware routing across LLM providers.
+
+Each provider carries a circuit breaker and a rolling latency window. The
+router sends a call to the healthiest, fastest provider, fails over to the
+next one while the deadline allows, and can hedge a slow call with a second
+request to another provider. When every breaker is open it fails immediately,
+so callers drop to the heuristic path without waiting out timeouts.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from .metrics import record_llm_call
+
+
+class NoProviderAvailable(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class LatencyWindow:
+    """
+    Rolling window of recent call latencies (seconds).
+    """
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q, default=None):
+        with self._lock:
+            if not self._samples:
+                return default
+            return float(np.percentile(np.fromiter(self._samples, dtype=float), q))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, or `slow_threshold`
+    consecutive calls slower than `slow_call_seconds`. After `reset_seconds`
+    one trial call is let through (half-open); its outcome closes or re-opens
+    the breaker.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, slow_call_seconds=None, slow_threshold=3, reset_seconds=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_threshold = slow_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self._failures = 0
+        self._slow_calls = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def available(self):
+        """
+        Whether a call could be sent now, without reserving the half-open trial.
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                return self.clock() - self._opened_at >= self.reset_seconds
+            if self.state == self.HALF_OPEN:
+                return not self._trial_in_flight
+            return True
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self._opened_at < self.reset_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self, seconds=None):
+        with self._lock:
+            self._failures = 0
+            if self.slow_call_seconds is not None and seconds is not None and seconds > self.slow_call_seconds:
+                self._slow_calls += 1
+                if self.state == self.HALF_OPEN or self._slow_calls >= self.slow_threshold:
+                    self._open()
+                    return
+            else:
+                self._slow_calls = 0
+            self.state = self.CLOSED
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        Gives back a half-open trial whose call ended without an outcome (e.g. the
+        caller stopped reading a stream), so the next call can be the trial.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = self.clock()
+        self._trial_in_flight = False
+
+
+class Provider:
+    """
+    One LLM backend: its runnable chains plus health state.
+    """
+
+    def __init__(self, name, llm, chain, packed_chain=None, breaker=None, latency=None):
+        self.name = name
+        self.llm = llm
+        self.chain = chain
+        self.packed_chain = packed_chain
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyWindow()
+
+    def __repr__(self):
+        return f"<Provider {self.name} ({self.breaker.state})>"
+
+
+class _Attempt:
+    # One in-flight call. Outcomes are recorded exactly once, either by the worker
+    # thread when the call returns or by the router when it gives up on it. A hedge
+    # loser is only superseded: its own outcome still reaches the breaker.
+    def __init__(self, provider):
+        self.provider = provider
+        self.started = time.monotonic()
+        self.abandoned = False
+        self.superseded = False
+        self.lock = threading.Lock()
+
+    def run(self, fn):
+        try:
+            result = fn(self.provider)
+        except Exception:
+            with self.lock:
+                if not self.abandoned:
+                    self.provider.breaker.record_failure()
+                abandoned = self.abandoned or self.superseded
+            record_llm_call(self.provider.name, time.monotonic() - self.started, 'abandoned' if abandoned else 'error')
+            raise
+        elapsed = time.monotonic() - self.started
+        self.provider.latency.add(elapsed)
+        with self.lock:
+            if not self.abandoned:
+                self.provider.breaker.record_success(elapsed)
+            abandoned = self.abandoned or self.superseded
+        # Hedge losers and calls past the deadline finish in the background as 'abandoned'
+        record_llm_call(self.provider.name, elapsed, 'abandoned' if abandoned else 'ok')
+        return result
+
+    def supersede(self):
+        with self.lock:
+            self.superseded = True
+
+    def abandon(self):
+        with self.lock:
+            if not self.abandoned:
+                self.abandoned = True
+                self.provider.breaker.record_failure()
+
+
+class ProviderRouter:
+    """
+    Routes calls across providers by health and rolling latency.
+
+    `call(fn, deadline, hedge)` runs fn(provider) and returns the first
+    successful result. Providers with open breakers are skipped, the rest
+    are ordered by rolling median latency; providers with fewer than
+    `min_samples` measurements follow in configured order. With hedge=True a second request goes to
+    the next provider once the primary exceeds its own `hedge_percentile`.
+    """
+
+    def __init__(self, providers, hedge_percentile=95, min_samples=5, default_hedge_after=2.0, max_workers=16):
+        self.providers = list(providers)
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.default_hedge_after = default_hedge_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-router')
+
+    def close(self):
+        """
+        Releases the worker threads. Calls already running finish; a call that
+        needs a new attempt afterwards raises RuntimeError.
+        """
+        self._executor.shutdown(wait=False)
+
+    def ranked(self):
+        """
+        Providers whose breakers would currently accept a call, best first.
+        """
+        def score(item):
+            position, provider = item
+            if len(provider.latency) < self.min_samples:
+                return (float('inf'), position)
+            return (provider.latency.percentile(50), position)
+
+        healthy = [(i, p) for i, p in enumerate(self.providers) if p.breaker.available()]
+        return [p for _, p in sorted(healthy, key=score)]
+
+    def pick(self):
+        """
+        Reserves the best available provider for a call the caller runs itself
+        (batch/stream). Returns None when every breaker is open.
+        """
+        for provider in self.ranked():
+            if provider.breaker.allow_request():
+                return provider
+        return None
+
+    def call(self, fn, deadline=None, hedge=False):
+        started = time.monotonic()
+        expires = started + deadline if deadline else None
+        candidates = self.ranked()
+        if not candidates:
+            raise NoProviderAvailable("All LLM providers are unavailable (circuit open)")
+
+        pending = {}
+        errors = []
+
+        def launch():
+            while candidates:
+                provider = candidates.pop(0)
+                if not provider.breaker.allow_request():
+                    continue
+                attempt = _Attempt(provider)
+                pending[self._executor.submit(attempt.run, fn)] = attempt
+                return attempt
+            return None
+
+        if launch() is None:
+            raise NoProviderAvailable("All LLM providers are unavailable (circuit open)")
+
+        hedged = not hedge
+        while pending:
+            remaining = None if expires is None else expires - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+
+            timeout = remaining
+            if not hedged and candidates:
+                primary = next(iter(pending.values())).provider
+                hedge_at = primary.latency.percentile(self.hedge_percentile, self.default_hedge_after)
+                wait_for = max(0.0, hedge_at - (time.monotonic() - started))
+                timeout = wait_for if timeout is None else min(timeout, wait_for)
+
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if not hedged and candidates:
+                    hedged = True
+                    launch()
+                continue
+
+            for future in done:
+                pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                # First success wins; the hedge loser finishes in the background
+                for attempt in pending.values():
+                    attempt.supersede()
+                return result
+
+            # Fail over to the next provider while there is time left
+            if not pending:
+                launch()
+
+        if pending:
+            for attempt in pending.values():
+                attempt.abandon()
+            raise DeadlineExceeded(f"No provider answered within {deadline}s")
+        if errors:
+            raise errors[-1]
+        raise NoProviderAvailable("All LLM providers are unavailable (circuit open)")
@@ -0,0 +1,96 @@
+"""
+Role checks for the dispute views.
+
+`is_ops_user` resolves a user's role once per request (memoized on the user
+object, which lives for one request) and RoleCacheMiddleware keeps the result
+in the session, stamped with a role version shared through the database
+(disputes/versions.py). Group membership, group and user changes bump the
+version (see signals), so every session re-resolves on its next request in
+this process, and within DISPUTES_VERSION_POLL_SECONDS in the others; entries
+also expire after DISPUTES_ROLE_CACHE_SECONDS.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.utils.functional import empty
+
+from .versions import bump_version, current_version
+
+OPS_GROUP = 'Risk Ops'
+ROLES_VERSION_KEY = 'disputes:roles:version'
+ROLES_SESSION_KEY = '_disputes_roles'
+ROLE_CACHE_SECONDS = 300
+
+_IS_OPS = '_disputes_is_ops'
+
+
+def role_cache_seconds():
+    return getattr(settings, 'DISPUTES_ROLE_CACHE_SECONDS', ROLE_CACHE_SECONDS)
+
+
+def roles_version():
+    return current_version(ROLES_VERSION_KEY)
+
+
+def invalidate_roles():
+    """
+    Marks every session's cached role stale: at once in this process, and
+    within DISPUTES_VERSION_POLL_SECONDS in other processes and hosts.
+    """
+    bump_version(ROLES_VERSION_KEY)
+
+
+def is_ops_user(user):
+    """
+    Staff or a member of the 'Risk Ops' group. Queries at most once per request.
+    """
+    is_ops = getattr(user, _IS_OPS, None)
+    if is_ops is None:
+        is_ops = bool(user.is_staff or user.groups.filter(name=OPS_GROUP).exists())
+        setattr(user, _IS_OPS, is_ops)
+    return is_ops
+
+
+class RoleCacheMiddleware:
+    """
+    Seeds `is_ops_user` from the session and stores freshly resolved roles back.
+    Must come after SessionMiddleware and AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, 'session', None)
+        timeout = role_cache_seconds()
+        if session is None or not timeout:
+            return self.get_response(request)
+
+        user_id = session.get(SESSION_KEY)
+        version = roles_version()
+        entry = session.get(ROLES_SESSION_KEY)
+        fresh = (
+            user_id is not None and entry is not None
+            and entry['user'] == user_id and entry['version'] == version and entry['expires'] > time.time()
+        )
+        if fresh:
+            # Setting it loads the user, which the auth checks do anyway
+            setattr(request.user, _IS_OPS, entry['is_ops'])
+
+        response = self.get_response(request)
+
+        if not fresh and user_id is not None and self._resolved(request):
+            user = request.user
+            is_ops = getattr(user, _IS_OPS, None)
+            # Staff resolve without a query, so only group lookups are worth a session write.
+            # The view may also have logged the user out or in as someone else.
+            if is_ops is not None and not user.is_staff and session.get(SESSION_KEY) == user_id:
+                session[ROLES_SESSION_KEY] = {
+                    'user': user_id, 'version': version, 'is_ops': is_ops, 'expires': time.time() + timeout,
+                }
+        return response
+
+    def _resolved(self, request):
+        # Only store roles a view actually checked; never load the user just for this
+        return getattr(request.user, '_wrapped', None) is not empty
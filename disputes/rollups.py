@@ -0,0 +1,165 @@
+"""
+Incrementally maintained insight counts.
+
+Every case is counted in exactly one InsightRollup row, keyed by its creation
+day, merchant category and its analysis' classification and risk level
+(blank until analyzed). Signals move the count between rows as cases and
+analyses are created, changed and deleted; bulk writers call
+`record_new_cases`. The insights dashboard reads only this table, through a
+short-lived cache.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DisputeCase, InsightRollup, RiskAnalysis
+
+INSIGHTS_CACHE_SECONDS = 60
+
+# Time filters offered on the dashboard (days back, label); None means all time
+INSIGHT_RANGES = [(None, 'All time'), (7, '7 days'), (30, '30 days'), (90, '90 days')]
+
+
+def case_day(case):
+    return timezone.localdate(case.created_at)
+
+
+def adjust(day, merchant_category, classification, risk_score, delta):
+    """
+    Adds `delta` cases to one rollup row, creating it on first use.
+    """
+    key = {
+        'day': day,
+        'merchant_category': merchant_category or '',
+        'classification': classification or '',
+        'risk_score': risk_score or '',
+    }
+    if InsightRollup.objects.filter(**key).update(cases=F('cases') + delta):
+        return
+    try:
+        # Savepoint: a concurrent writer may create the row first
+        with transaction.atomic():
+            InsightRollup.objects.create(cases=delta, **key)
+    except IntegrityError:
+        InsightRollup.objects.filter(**key).update(cases=F('cases') + delta)
+
+
+def move(case, old_key, new_key, category=None):
+    """
+    Moves one case from (classification, risk) `old_key` to `new_key`.
+    """
+    if old_key == new_key:
+        return
+    category = case.merchant_category if category is None else category
+    day = case_day(case)
+    adjust(day, category, *old_key, -1)
+    adjust(day, category, *new_key, 1)
+
+
+def record_new_cases(cases):
+    """
+    Counts cases written without signals (bulk_create), one update per rollup row.
+    """
+    deltas = Counter((case_day(case), case.merchant_category) for case in cases)
+    for (day, category), count in deltas.items():
+        adjust(day, category, '', '', count)
+
+
+def rebuild_rollups(since=None):
+    """
+    Recomputes the rollup from the fact tables (all of it, or only days from
+    `since` on). Returns the number of rollup rows written.
+    """
+    cases = DisputeCase.objects.all()
+    rollups = InsightRollup.objects.all()
+    if since is not None:
+        cases = cases.filter(created_at__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+
+    rows = (
+        cases
+        .annotate(
+            day=TruncDate('created_at'),
+            rollup_classification=Coalesce('analysis__classification', Value('')),
+            rollup_risk=Coalesce('analysis__risk_score', Value('')),
+        )
+        .values('day', 'merchant_category', 'rollup_classification', 'rollup_risk')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = InsightRollup.objects.bulk_create([
+            InsightRollup(
+                day=row['day'],
+                merchant_category=row['merchant_category'],
+                classification=row['rollup_classification'],
+                risk_score=row['rollup_risk'],
+                cases=row['total'],
+            )
+            for row in rows
+        ], batch_size=1000)
+    return len(created)
+
+
+def insights_summary(days=None, top=5):
+    """
+    Dashboard figures for the last `days` days (all time when None).
+    """
+    rollups = InsightRollup.objects.all()
+    if days:
+        rollups = rollups.filter(day__gt=timezone.localdate() - timedelta(days=days))
+
+    totals = rollups.aggregate(
+        total=Coalesce(Sum('cases'), 0),
+        high=Coalesce(Sum('cases', filter=Q(risk_score='High')), 0),
+    )
+    categories = list(
+        rollups.values('merchant_category').annotate(total=Sum('cases')).filter(total__gt=0).order_by('-total')[:top]
+    )
+    classifications = list(
+        rollups.exclude(classification='').values('classification')
+        .annotate(total=Sum('cases')).filter(total__gt=0).order_by('-total')[:top]
+    )
+    trend = list(
+        rollups.values('day')
+        .annotate(total=Sum('cases'), high=Coalesce(Sum('cases', filter=Q(risk_score='High')), 0))
+        .order_by('day')
+    )
+    return {
+        'total_cases': totals['total'],
+        'high_risk_count': totals['high'],
+        'categories': categories,
+        'classifications': classifications,
+        'trend': trend,
+    }
+
+
+def cached_insights(days=None):
+    """
+    `insights_summary` behind a short-lived cache (DISPUTES_INSIGHTS_CACHE_SECONDS).
+    """
+    timeout = getattr(settings, 'DISPUTES_INSIGHTS_CACHE_SECONDS', INSIGHTS_CACHE_SECONDS)
+    if not timeout:
+        return insights_summary(days)
+    key = f"disputes:insights:{days or 'all'}:{timezone.localdate().isoformat()}"
+    summary = cache.get(key)
+    if summary is None:
+        summary = insights_summary(days)
+        cache.set(key, summary, timeout)
+    return summary
+
+
+def analysis_key(analysis):
+    return (analysis.classification or '', analysis.risk_score or '')
+
+
+def current_key(case):
+    analysis = RiskAnalysis.objects.filter(case_id=case.pk).values_list('classification', 'risk_score').first()
+    return tuple(v or '' for v in analysis) if analysis else ('', '')
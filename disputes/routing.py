@@ -0,0 +1,189 @@
+"""
+Specialist routing.
+
+Maps a classification to the active members of its 'Specialist: <Classification>'
+group through an in-memory table built with one query, so assigning a case needs
+no lookups beyond saving the assignment. Open-case counts per specialist are
+loaded with the table and then kept as counters: assignments and case updates
+adjust them instead of recounting.
+
+The table is rebuilt when group membership or users change (signals bump a
+version shared through the database, see disputes/versions.py: at once in
+this process, within DISPUTES_VERSION_POLL_SECONDS in the others) and at least
+every TABLE_TTL_SECONDS, which also re-syncs counters changed by other processes. Classifications with
+no staffed group follow FALLBACKS, then DEFAULT_FALLBACK.
+"""
+import itertools
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db.models import Count
+
+from .models import DisputeCase
+from .versions import bump_version, current_version
+
+SPECIALIST_GROUP_PREFIX = "Specialist: "
+ROUTING_VERSION_KEY = 'disputes:specialist-routing:version'
+
+SPECIALIST_ROUTING_DEFAULTS = {
+    'STRATEGY': 'least_open',
+    # setup_specialists creates 'Merchandise Dispute' while the analyst emits 'Merchant Dispute'
+    'FALLBACKS': {
+        'Merchant Dispute': ['Merchandise Dispute'],
+        'Merchandise Dispute': ['Merchant Dispute'],
+    },
+    'DEFAULT_FALLBACK': [],
+    'TABLE_TTL_SECONDS': 300,
+}
+
+STRATEGIES = ('least_open', 'round_robin')
+
+
+def specialist_routing_options():
+    return {**SPECIALIST_ROUTING_DEFAULTS, **getattr(settings, 'DISPUTES_SPECIALIST_ROUTING', {})}
+
+
+def invalidate_routing():
+    """
+    Marks every process's routing table stale: this process rebuilds it on its
+    next assignment, others within DISPUTES_VERSION_POLL_SECONDS.
+    """
+    bump_version(ROUTING_VERSION_KEY)
+
+
+def assignment_state(case):
+    """
+    (assignee id, counts as open) for a case, as tracked by the load counters.
+    """
+    return case.assigned_ops_id, case.status in DisputeCase.OPEN_STATUSES
+
+
+class SpecialistRouter:
+    """
+    Picks a specialist per classification, round-robin or by fewest open cases
+    (ties rotate, so equal loads still spread evenly). Thread-safe.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._table = None
+        self._open = {}
+        self._cursors = {}
+        self._version = None
+        self._built_at = 0.0
+        self.stats = Counter()
+
+    def reset(self):
+        with self._lock:
+            self._table = None
+            self._open = {}
+            self._cursors = {}
+
+    def _ensure_table(self, options):
+        version = current_version(ROUTING_VERSION_KEY)
+        fresh = self.clock() - self._built_at < options['TABLE_TTL_SECONDS']
+        if self._table is not None and version == self._version and fresh:
+            return
+        table = {}
+        members = (
+            Group.objects.filter(name__startswith=SPECIALIST_GROUP_PREFIX, user__is_active=True)
+            .values_list('name', 'user__id')
+            .order_by('name', 'user__id')
+        )
+        for name, user_id in members:
+            table.setdefault(name[len(SPECIALIST_GROUP_PREFIX):], []).append(user_id)
+        specialists = {user_id for ids in table.values() for user_id in ids}
+
+        open_cases = dict.fromkeys(specialists, 0)
+        open_cases.update(
+            DisputeCase.objects.filter(assigned_ops__in=specialists, status__in=DisputeCase.OPEN_STATUSES)
+            .values('assigned_ops').annotate(total=Count('id')).values_list('assigned_ops', 'total')
+        )
+        self._table = {classification: tuple(ids) for classification, ids in table.items()}
+        self._open = open_cases
+        self._version = version
+        self._built_at = self.clock()
+        self.stats['rebuilds'] += 1
+
+    def route(self, classification, options=None):
+        """
+        Returns (group classification, specialist ids) after following the fallback chain.
+        """
+        options = options or specialist_routing_options()
+        chain = [classification] + list(options['FALLBACKS'].get(classification, [])) + list(options['DEFAULT_FALLBACK'])
+        for route in chain:
+            members = self._table.get(route)
+            if members:
+                return route, members
+        return None, ()
+
+    def pick(self, classification):
+        """
+        Chooses a specialist id for a classification and counts the new open case
+        against them, or returns None when no group in the chain is staffed.
+        """
+        options = specialist_routing_options()
+        with self._lock:
+            self._ensure_table(options)
+            route, members = self.route(classification, options)
+            if not members:
+                self.stats['unrouted'] += 1
+                return None
+            if route != classification:
+                self.stats['fallbacks'] += 1
+
+            turn = next(self._cursors.setdefault(route, itertools.count()))
+            if options['STRATEGY'] == 'round_robin':
+                user_id = members[turn % len(members)]
+            else:
+                start = turn % len(members)
+                user_id = min(members[start:] + members[:start], key=lambda member: self._open.get(member, 0))
+            self._open[user_id] = self._open.get(user_id, 0) + 1
+            self.stats['assigned'] += 1
+            return user_id
+
+    def record_change(self, old, new):
+        """
+        Moves one open case between counters; `old`/`new` come from `assignment_state`.
+        """
+        if old == new:
+            return
+        with self._lock:
+            if self._table is None:
+                return
+            for (user_id, is_open), delta in ((old, -1), (new, 1)):
+                if user_id is not None and is_open and user_id in self._open:
+                    self._open[user_id] = max(0, self._open[user_id] + delta)
+
+    def open_cases(self):
+        with self._lock:
+            return dict(self._open)
+
+    def assign(self, case, classification, save=True):
+        """
+        Assigns a case to a specialist and returns their user id (or None).
+        With `save=False` the caller saves the case (it may not exist yet).
+        """
+        user_id = self.pick(classification)
+        if user_id is None:
+            return None
+        previous = getattr(case, '_loaded_assignment', None)
+        case.assigned_ops_id = user_id
+        # pick() already counted the case for its new assignee; release the previous one
+        if previous is not None:
+            self.record_change(previous, (None, False))
+        case._loaded_assignment = assignment_state(case)
+        if save:
+            case.save(update_fields=['assigned_ops'])
+        return user_id
+
+
+_router = SpecialistRouter()
+
+
+def get_router():
+    return _router
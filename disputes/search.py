@@ -0,0 +1,202 @@
+"""
+Full-text case search for ops.
+
+Case descriptions and their analyses' fraud signals and reasoning steps are
+indexed in `disputes_case_search`: an FTS5 table on SQLite, a GIN-indexed
+weighted tsvector on Postgres (migration 0010). Database triggers keep it in
+step with every insert, update and delete, bulk writes included; repair it
+with `manage.py rebuild_search_index`.
+
+Results are ranked (bm25 / ts_rank_cd, description matches first), carry a
+highlighted snippet, can be narrowed by category, risk level and status, and
+are paged by a cursor on (score, id).
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import DisputeCase
+from .pagination import InvalidCursor, pack_cursor, unpack_cursor
+
+SEARCH_TABLE = 'disputes_case_search'
+SEARCH_PAGE_SIZE = 20
+MAX_QUERY_TERMS = 12
+
+# bm25 column weights: description, fraud signals, reasoning steps
+SQLITE_WEIGHTS = (3.0, 2.0, 1.0)
+
+# Snippet markers; the text is HTML-escaped before they become <mark> tags
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+SearchHit = namedtuple('SearchHit', ['case', 'score', 'snippet'])
+
+_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r'\w+')
+
+
+class SearchError(ValueError):
+    pass
+
+
+def parse_query(text):
+    """
+    Splits a query into terms, all of which must match: plain words, "quoted
+    phrases" and word* prefixes. Returns a list of (words, is_prefix).
+    """
+    terms = []
+    for phrase, word in _TOKEN.findall(text or ''):
+        words = _WORD.findall(phrase or word)
+        if words:
+            terms.append((words, bool(word) and word.endswith('*') and len(words) == 1))
+    if len(terms) > MAX_QUERY_TERMS:
+        raise SearchError(f"Use at most {MAX_QUERY_TERMS} search terms")
+    return terms
+
+
+def _fts5_query(terms):
+    parts = []
+    for words, prefix in terms:
+        parts.append('"' + ' '.join(words) + '"' + ('*' if prefix else ''))
+    return ' '.join(parts)
+
+
+def _tsquery(terms):
+    parts = []
+    for words, prefix in terms:
+        parts.append(' <-> '.join(words) + (':*' if prefix else ''))
+    return ' & '.join(parts)
+
+
+def _filters_sql(category=None, risk=None, status=None):
+    clauses, params = [], []
+    if category:
+        clauses.append('c.merchant_category = %s')
+        params.append(category)
+    if risk:
+        clauses.append('a.risk_score = %s')
+        params.append(risk)
+    if status:
+        clauses.append('c.status = %s')
+        params.append(status)
+    return ''.join(f' AND {clause}' for clause in clauses), params
+
+
+def _search_sql(terms, filters):
+    # (sql, params) selecting case_id and score for every match, lower score first
+    where, params = _filters_sql(**filters)
+    if connection.vendor == 'sqlite':
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        joins = ' JOIN disputes_disputecase c ON c.id = s.rowid' if where else ''
+        if filters.get('risk'):
+            joins += ' JOIN disputes_riskanalysis a ON a.case_id = s.rowid'
+        # LIMIT -1 keeps SQLite from inlining the subquery, which would run bm25 once per
+        # reference in the cursor condition
+        sql = f"""
+            SELECT s.rowid AS case_id, bm25({SEARCH_TABLE}, {weights}) AS score
+            FROM {SEARCH_TABLE} s{joins}
+            WHERE {SEARCH_TABLE} MATCH %s{where}
+            LIMIT -1
+        """
+        return sql, [_fts5_query(terms)] + params
+    if connection.vendor == 'postgresql':
+        sql = f"""
+            SELECT s.case_id, -ts_rank_cd(s.document, to_tsquery('english', %s)) AS score
+            FROM {SEARCH_TABLE} s
+            JOIN disputes_disputecase c ON c.id = s.case_id
+            LEFT JOIN disputes_riskanalysis a ON a.case_id = c.id
+            WHERE s.document @@ to_tsquery('english', %s){where}
+        """
+        return sql, [_tsquery(terms), _tsquery(terms)] + params
+    raise SearchError(f"Full-text search is not available on {connection.vendor}")
+
+
+def _snippets_sql(terms, case_ids):
+    # (sql, params) selecting case_id, snippet for one page of matches
+    placeholders = ', '.join(['%s'] * len(case_ids))
+    if connection.vendor == 'sqlite':
+        sql = f"""
+            SELECT rowid, snippet({SEARCH_TABLE}, -1, %s, %s, '…', 24) FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({placeholders})
+        """
+        return sql, [_MARK_START, _MARK_END, _fts5_query(terms)] + list(case_ids)
+    options = f'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=30, MinWords=12, MaxFragments=2'
+    sql = f"""
+        SELECT c.id, ts_headline('english', concat_ws(' … ', c.description, a.fraud_signals::text, a.reasoning_steps::text),
+                                 to_tsquery('english', %s), %s)
+        FROM disputes_disputecase c LEFT JOIN disputes_riskanalysis a ON a.case_id = c.id
+        WHERE c.id IN ({placeholders})
+    """
+    return sql, [_tsquery(terms), options] + list(case_ids)
+
+
+def highlight(snippet):
+    """
+    HTML for a snippet: escaped text with the matched terms in <mark> tags.
+    """
+    html = escape(snippet or '')
+    return mark_safe(html.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+def search_cases(query, category=None, risk=None, status=None, cursor=None, page_size=SEARCH_PAGE_SIZE):
+    """
+    Returns (hits, next_cursor) for one page of ranked matches; `next_cursor`
+    is None on the last page. Raises SearchError or InvalidCursor.
+    """
+    terms = parse_query(query)
+    if not terms:
+        raise SearchError("Enter a search term")
+    sql, params = _search_sql(terms, {'category': category, 'risk': risk, 'status': status})
+
+    # Keyset on (score, id): scores are exact doubles, so they round-trip through the cursor
+    page_sql = f"SELECT case_id, score FROM ({sql}) hits"
+    if cursor:
+        score, case_id = unpack_cursor(cursor, 2)
+        if not isinstance(score, (int, float)) or not isinstance(case_id, int):
+            raise InvalidCursor("Cursor does not match this listing")
+        page_sql += " WHERE score > %s OR (score = %s AND case_id > %s)"
+        params += [score, score, case_id]
+    page_sql += " ORDER BY score, case_id LIMIT %s"
+    params.append(page_size + 1)
+
+    with connection.cursor() as db:
+        db.execute(page_sql, params)
+        rows = db.fetchall()
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        # Snippets only for the page, not for every match
+        snippets = {}
+        if rows:
+            db.execute(*_snippets_sql(terms, [case_id for case_id, _ in rows]))
+            snippets = dict(db.fetchall())
+
+    cases = DisputeCase.objects.select_related('analysis').in_bulk([case_id for case_id, _ in rows])
+    hits = [SearchHit(cases[case_id], score, highlight(snippets.get(case_id))) for case_id, score in rows if case_id in cases]
+    next_cursor = pack_cursor([rows[-1][1], rows[-1][0]]) if more else None
+    return hits, next_cursor
+
+
+def rebuild_search_index():
+    """
+    Re-indexes every case from DisputeCase and RiskAnalysis. Returns the number of cases indexed.
+    """
+    with transaction.atomic(), connection.cursor() as db:
+        if connection.vendor == 'sqlite':
+            db.execute(f"DELETE FROM {SEARCH_TABLE}")
+            db.execute(f"""
+                INSERT INTO {SEARCH_TABLE} (rowid, description, fraud_signals, reasoning_steps)
+                SELECT c.id, c.description,
+                    coalesce((SELECT group_concat(value, ' ') FROM json_each(a.fraud_signals)), ''),
+                    coalesce((SELECT group_concat(value, ' ') FROM json_each(a.reasoning_steps)), '')
+                FROM disputes_disputecase c LEFT JOIN disputes_riskanalysis a ON a.case_id = c.id
+            """)
+            db.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        elif connection.vendor == 'postgresql':
+            db.execute(f"DELETE FROM {SEARCH_TABLE}")
+            db.execute("SELECT disputes_case_search_refresh(id) FROM disputes_disputecase")
+        else:
+            raise SearchError(f"Full-text search is not available on {connection.vendor}")
+        db.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return db.fetchone()[0]
@@ -0,0 +1,159 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import rollups
+from .live import record_case_event
+from .models import DisputeCase, DisputeChatMessage, RiskAnalysis
+from .roles import invalidate_roles
+from .routing import assignment_state, get_router, invalidate_routing
+from .similarity import index_case, similarity_options, unindex_case
+
+
+@receiver(post_save, sender=RiskAnalysis)
+def index_analyzed_case(sender, instance, raw=False, **kwargs):
+    # Keep the near-duplicate index in step with analyses as they land. Only LLM
+    # answers are reused: a heuristic fallback or a reused copy is taken out.
+    if raw or not similarity_options()['ENABLED']:
+        return
+    if instance.source == 'llm':
+        index_case(instance.case)
+    elif not kwargs.get('created'):
+        unindex_case(instance.case)
+
+
+def _sync_high_risk(analysis, is_high_risk):
+    DisputeCase.objects.filter(pk=analysis.case_id).update(is_high_risk=is_high_risk)
+    # A caller holding the case (e.g. apply_analysis) must not save a stale flag back
+    if RiskAnalysis.case.is_cached(analysis):
+        analysis.case.is_high_risk = is_high_risk
+
+
+@receiver(post_save, sender=RiskAnalysis)
+def sync_case_risk_flag(sender, instance, raw=False, **kwargs):
+    # apply_analysis saves the flag with the case; this covers analyses written elsewhere
+    if not raw and not getattr(instance, '_case_flag_saved', False):
+        _sync_high_risk(instance, instance.risk_score == 'High')
+
+
+@receiver(post_delete, sender=RiskAnalysis)
+def clear_case_risk_flag(sender, instance, **kwargs):
+    _sync_high_risk(instance, False)
+
+
+@receiver(post_save, sender=DisputeCase)
+def count_case(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        rollups.adjust(rollups.case_day(instance), instance.merchant_category, '', '', 1)
+    else:
+        loaded = getattr(instance, '_loaded_category', None)
+        if loaded is not None and loaded != instance.merchant_category:
+            key = rollups.current_key(instance)
+            day = rollups.case_day(instance)
+            rollups.adjust(day, loaded, *key, -1)
+            rollups.adjust(day, instance.merchant_category, *key, 1)
+    instance._loaded_category = instance.merchant_category
+
+
+@receiver(post_delete, sender=DisputeCase)
+def uncount_case(sender, instance, **kwargs):
+    # Its analysis (if any) was deleted first by the cascade and moved the count back to blank
+    rollups.adjust(rollups.case_day(instance), instance.merchant_category, '', '', -1)
+
+
+@receiver(post_save, sender=RiskAnalysis)
+def count_analysis(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new_key = rollups.analysis_key(instance)
+    if created:
+        rollups.move(instance.case, ('', ''), new_key)
+    else:
+        # Instances not loaded from the database carry no old key; rebuild_rollups repairs those
+        old_key = getattr(instance, '_loaded_rollup_key', None)
+        if old_key is not None:
+            rollups.move(instance.case, tuple(v or '' for v in old_key), new_key)
+    instance._loaded_rollup_key = new_key
+
+
+@receiver(post_delete, sender=RiskAnalysis)
+def uncount_analysis(sender, instance, **kwargs):
+    case = DisputeCase.objects.filter(pk=instance.case_id).only('created_at', 'merchant_category').first()
+    if case is not None:
+        rollups.move(case, rollups.analysis_key(instance), ('', ''))
+
+
+@receiver(post_save, sender=DisputeCase)
+def track_specialist_load(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = assignment_state(instance)
+    # A case the router assigned before its first save was already counted
+    old = getattr(instance, '_loaded_assignment', (None, False) if created else None)
+    if old is not None:
+        get_router().record_change(old, new)
+    instance._loaded_assignment = new
+
+
+@receiver(post_delete, sender=DisputeCase)
+def release_specialist_load(sender, instance, **kwargs):
+    get_router().record_change(getattr(instance, '_loaded_assignment', assignment_state(instance)), (None, False))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def routing_membership_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_routing()
+
+
+@receiver(post_save, sender=User)
+def routing_user_changed(sender, update_fields=None, raw=False, **kwargs):
+    # Logins only touch last_login; anything else may change is_active
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_routing()
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def routing_groups_changed(sender, **kwargs):
+    invalidate_routing()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def roles_membership_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_roles()
+
+
+@receiver(post_save, sender=User)
+def roles_user_changed(sender, update_fields=None, raw=False, **kwargs):
+    # is_staff decides ops access; logins only touch last_login
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_roles()
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def roles_groups_changed(sender, **kwargs):
+    invalidate_roles()
+
+
+@receiver(post_save, sender=DisputeChatMessage)
+def publish_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_case_event(instance.case_id, 'MESSAGE')
+
+
+@receiver(post_save, sender=DisputeCase)
+def publish_status_change(sender, instance, created, raw=False, **kwargs):
+    # New cases have no open result pages yet
+    loaded = getattr(instance, '_loaded_status', None)
+    if not created and not raw and loaded is not None and loaded != instance.status:
+        record_case_event(instance.pk, 'STATUS')
+    instance._loaded_status = instance.status
@@ -0,0 +1,184 @@
+"""
+Near-duplicate detection over dispute descriptions.
+
+Each analyzed case's description is reduced to character 3-gram shingles and
+a MinHash signature, which is split into LSH bands. Every band becomes one
+SimilarityBucket row, hashed together with the case's merchant category and
+amount band, so lookups only ever meet cases from the same partition. A new
+dispute's candidates are the recent cases sharing at least one bucket; the
+best candidate is then confirmed by exact shingle Jaccard similarity.
+"""
+import hashlib
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .cache import amount_bucket, normalize_text
+from .models import DisputeCase, SimilarityBucket
+
+SHINGLE_SIZE = 3
+NUM_BANDS = 10
+ROWS_PER_BAND = 3
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+
+# Universal hashing (a*x + b) mod P over 32-bit shingle hashes; a, b < 2**32 keeps a*x + b inside uint64
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(20240217)
+_A = _rng.randint(1, 2 ** 32 - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2 ** 32 - 1, size=NUM_PERM, dtype=np.uint64)
+
+SIMILARITY_DEFAULTS = {
+    'ENABLED': True,
+    'THRESHOLD': 0.6,
+    'MAX_AGE_DAYS': 30,
+    'MAX_CANDIDATES': 10,
+}
+
+
+def similarity_options():
+    return {**SIMILARITY_DEFAULTS, **getattr(settings, 'DISPUTES_SIMILARITY', {})}
+
+
+def shingles(text):
+    text = normalize_text(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(shingle_set):
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    if not len(hashes):
+        return np.zeros(NUM_PERM, dtype=np.uint64)
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def partition_key(merchant_category, amount):
+    return f"{(merchant_category or '').strip().lower()}\x1f{amount_bucket(amount)}"
+
+
+def band_buckets(description, merchant_category, amount):
+    """
+    Returns the LSH bucket ids (signed 64-bit) for a dispute.
+    """
+    signature = minhash(shingles(description))
+    partition = partition_key(merchant_category, amount).encode()
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(partition + bytes([band]) + rows.tobytes(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def index_case(case):
+    """
+    (Re)indexes one analyzed case. Called whenever its LLM RiskAnalysis is saved.
+    """
+    buckets = band_buckets(case.description, case.merchant_category, case.amount)
+    with transaction.atomic():
+        SimilarityBucket.objects.filter(case=case).delete()
+        SimilarityBucket.objects.bulk_create([
+            SimilarityBucket(case=case, bucket=bucket, case_created_at=case.created_at) for bucket in buckets
+        ])
+
+
+def unindex_case(case):
+    """
+    Drops a case from the index, e.g. when a re-analysis fell back to the heuristics.
+    """
+    SimilarityBucket.objects.filter(case=case).delete()
+
+
+def rebuild_index(chunk_size=2000, since=None):
+    """
+    Rebuilds the index for every case with an LLM analysis (optionally only cases
+    created since a date). Heuristic and reused analyses are never indexed.
+    Returns the number of cases indexed.
+    """
+    cases = DisputeCase.objects.filter(analysis__source='llm').order_by('id')
+    stale = SimilarityBucket.objects.all()
+    if since is not None:
+        cases = cases.filter(created_at__gte=since)
+        stale = stale.filter(case_created_at__gte=since)
+    stale.delete()
+
+    indexed = 0
+    last_id = 0
+    while True:
+        chunk = list(cases.filter(id__gt=last_id).only('id', 'description', 'merchant_category', 'amount', 'created_at')[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        rows = [
+            SimilarityBucket(case_id=case.id, bucket=bucket, case_created_at=case.created_at)
+            for case in chunk
+            for bucket in band_buckets(case.description, case.merchant_category, case.amount)
+        ]
+        SimilarityBucket.objects.bulk_create(rows, batch_size=5000)
+        indexed += len(chunk)
+    return indexed
+
+
+def find_similar_case(case, threshold=None, max_age_days=None, max_candidates=None):
+    """
+    Returns (similar_case, similarity) for the closest recent analyzed case in the
+    same category and amount band, or None when nothing clears the threshold.
+    """
+    options = similarity_options()
+    threshold = options['THRESHOLD'] if threshold is None else threshold
+    max_age_days = options['MAX_AGE_DAYS'] if max_age_days is None else max_age_days
+    max_candidates = options['MAX_CANDIDATES'] if max_candidates is None else max_candidates
+
+    buckets = band_buckets(case.description, case.merchant_category, case.amount)
+    cutoff = timezone.now() - timedelta(days=max_age_days)
+    candidate_ids = list(
+        SimilarityBucket.objects
+        .filter(bucket__in=buckets, case_created_at__gte=cutoff)
+        .exclude(case_id=case.id)
+        .values('case_id')
+        .annotate(shared=Count('id'))
+        .order_by('-shared', '-case_id')
+        .values_list('case_id', flat=True)[:max_candidates]
+    )
+    if not candidate_ids:
+        return None
+
+    target = shingles(case.description)
+    best, best_score = None, 0.0
+    for candidate in DisputeCase.objects.filter(id__in=candidate_ids, analysis__source='llm').select_related('analysis'):
+        score = jaccard(target, shingles(candidate.description))
+        if score > best_score:
+            best, best_score = candidate, score
+    if best is None or best_score < threshold:
+        return None
+    return best, best_score
+
+
+def reused_analysis(source_case, similarity):
+    """
+    Builds an analysis result for a new case from a near-duplicate's RiskAnalysis.
+    """
+    analysis = source_case.analysis
+    return {
+        "classification": analysis.classification,
+        "fraud_signals": list(analysis.fraud_signals),
+        "risk_level": analysis.risk_score,
+        "financial_exposure": analysis.financial_exposure,
+        "recommended_action": analysis.recommended_action,
+        "reasoning_steps": [
+            f"Near-duplicate of Case #{source_case.id} (similarity {similarity:.2f}); reusing its analysis."
+        ] + list(analysis.reasoning_steps),
+        "source": "reused",
+    }
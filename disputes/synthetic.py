@@ -0,0 +1,297 @@
+"""
+Synthetic dispute data at production volume.
+
+`generate` writes customers, Risk Ops specialists, cases, analyses,
+specialist assignments and chat messages in fixed-size chunks, each chunk
+with one `bulk_create` per table in one transaction, so memory stays flat
+from ten thousand to ten million cases. The shape of the data (category,
+status, risk and classification mixes, amounts, case and message rates,
+date spread) comes from SYNTHETIC_DEFAULTS, overridable per call.
+
+bulk_create skips signals, so the denormalized columns (priority rank, high
+risk flag) are filled here and the insights rollup is rebuilt at the end;
+the search index is kept by its triggers. The near-duplicate index is left
+empty: fill it with `rebuild_similarity_index` when a benchmark needs it.
+"""
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DisputeCase, DisputeChatMessage, RiskAnalysis
+from .roles import OPS_GROUP
+from .rollups import rebuild_rollups
+from .routing import SPECIALIST_GROUP_PREFIX, invalidate_routing
+
+SYNTHETIC_DEFAULTS = {
+    # Relative weights; they need not sum to one
+    'CATEGORIES': {
+        'Retail': 30, 'Digital Goods': 20, 'Food & Beverage': 20, 'Travel & Hospitality': 15, 'Software': 15,
+    },
+    'STATUSES': {'NEW': 15, 'ANALYZED': 45, 'RESOLVED': 30, 'CLOSED': 10},
+    'CLASSIFICATIONS': {
+        'Unauthorized Transaction': 25, 'Duplicate Charge': 15, 'Subscription Confusion': 20,
+        'Merchant Dispute': 20, 'Refund Abuse': 10, 'Unknown': 10,
+    },
+    'RISK_LEVELS': {'Low': 50, 'Medium': 30, 'High': 20},
+    # Lognormal transaction amounts
+    'AMOUNT_MEDIAN': 60.0,
+    'AMOUNT_SIGMA': 1.2,
+    # Means: cases per customer, chat messages per case (Poisson)
+    'CASES_PER_CUSTOMER': 4.0,
+    'MESSAGES_PER_CASE': 1.5,
+    # Share of ops messages that are internal notes
+    'INTERNAL_NOTE_RATE': 0.2,
+    # Share of analyzed cases handed to a specialist of their classification
+    'ASSIGNED_RATE': 0.7,
+    'SPECIALISTS_PER_GROUP': 5,
+    # Cases are spread uniformly over the last DAYS days
+    'DAYS': 365,
+}
+
+# Specialist groups as setup_specialists names them ('Merchant Dispute' routes to 'Merchandise Dispute')
+SPECIALIST_GROUPS = {
+    'Unauthorized Transaction': 'Unauthorized Transaction',
+    'Subscription Confusion': 'Subscription Confusion',
+    'Refund Abuse': 'Refund Abuse',
+    'Merchant Dispute': 'Merchandise Dispute',
+}
+
+DESCRIPTIONS = {
+    'Unauthorized Transaction': [
+        "I did not authorize this purchase at {merchant}.",
+        "Someone used my card at {merchant} while it was in my wallet.",
+        "Suspicious transaction from {merchant} in a country I have never visited.",
+    ],
+    'Duplicate Charge': [
+        "{merchant} charged me twice this month.",
+        "I see the same ${amount} charge from {merchant} two times.",
+    ],
+    'Subscription Confusion': [
+        "I cancelled my {merchant} subscription but was still charged.",
+        "Mistakenly charged by {merchant} for an annual plan instead of monthly.",
+    ],
+    'Merchant Dispute': [
+        "The order from {merchant} never arrived.",
+        "What {merchant} delivered was damaged and not as described.",
+    ],
+    'Refund Abuse': [
+        "{merchant} promised a refund of ${amount} weeks ago but it never came.",
+        "Returned the item to {merchant}, still no refund.",
+    ],
+    'Unknown': [
+        "I don't recognize this ${amount} charge from {merchant}.",
+        "What is this charge from {merchant}?",
+    ],
+}
+
+MERCHANTS = {
+    'Retail': ['Wal-Mart', 'Target', 'Best Buy', 'Home Depot', 'IKEA'],
+    'Digital Goods': ['Netflix', 'Spotify', 'Steam', 'App Store', 'Audible'],
+    'Food & Beverage': ['Uber Eats', 'DoorDash', 'SQ *Coffee Shop', 'Grubhub', 'Starbucks'],
+    'Travel & Hospitality': ['Marriott', 'Delta', 'Airbnb', 'Expedia', 'Hertz'],
+    'Software': ['Adobe', 'Microsoft 365', 'Dropbox', 'Zoom', 'Notion'],
+}
+
+FRAUD_SIGNALS = {
+    'High': ['Card-not-present transaction', 'New device fingerprint', 'Geolocation mismatch', 'Velocity spike'],
+    'Medium': ['Prior dispute on this merchant', 'Amount above customer average'],
+    'Low': [],
+}
+
+ACTIONS = {'High': 'Flag Account', 'Medium': 'Manual Review Required', 'Low': 'Auto Approve Refund'}
+
+CUSTOMER_MESSAGES = [
+    "Any update on this?", "I have attached my bank statement.", "Please refund me as soon as possible.",
+    "The merchant is not answering my emails.",
+]
+OPS_MESSAGES = [
+    "We are reviewing your case.", "Could you send the receipt?", "The merchant has been contacted.",
+    "A provisional credit has been issued.",
+]
+INTERNAL_NOTES = [
+    "Customer has two prior disputes.", "Merchant has a history of this.", "Escalate if no answer in 3 days.",
+]
+
+SyntheticSummary = namedtuple('SyntheticSummary', ['customers', 'specialists', 'cases', 'analyses', 'messages', 'elapsed'])
+
+
+def synthetic_options(overrides=None):
+    options = {**SYNTHETIC_DEFAULTS, **(overrides or {})}
+    unknown = set(options) - set(SYNTHETIC_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown synthetic data options: {sorted(unknown)}")
+    for key in ('CATEGORIES', 'STATUSES', 'CLASSIFICATIONS', 'RISK_LEVELS'):
+        if not options[key] or min(options[key].values()) < 0 or not sum(options[key].values()):
+            raise ValueError(f"{key} needs at least one positive weight")
+    return options
+
+
+def _choices(rng, weights, size):
+    names = list(weights)
+    p = np.array([weights[name] for name in names], dtype=float)
+    return np.array(names, dtype=object)[rng.choice(len(names), size=size, p=p / p.sum())]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Lets bulk_create keep the created_at values it is given: auto_now_add
+    would otherwise stamp every row with the current time.
+    """
+    fields = [model._meta.get_field('created_at') for model in models]
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in zip(fields, saved):
+            field.auto_now_add = auto_now_add
+
+
+def create_staff(options, tag):
+    """
+    Risk Ops specialists, SPECIALISTS_PER_GROUP in each specialist group.
+    Returns {classification: [user ids]}.
+    """
+    ops_group, _ = Group.objects.get_or_create(name=OPS_GROUP)
+    specialists = {}
+    for classification, group_name in SPECIALIST_GROUPS.items():
+        group, _ = Group.objects.get_or_create(name=f"{SPECIALIST_GROUP_PREFIX}{group_name}")
+        users = User.objects.bulk_create([
+            User(username=f"ops-{tag}-{group_name.split()[0].lower()}-{i}", password='!')
+            for i in range(options['SPECIALISTS_PER_GROUP'])
+        ])
+        group.user_set.add(*users)
+        ops_group.user_set.add(*users)
+        specialists[classification] = [user.id for user in users]
+    return specialists
+
+
+def generate(cases, options=None, chunk_size=10_000, seed=None, progress=None):
+    """
+    Writes `cases` synthetic disputes with their customers, specialists,
+    analyses and messages. Returns a SyntheticSummary; `progress` is called
+    with the number of cases written after every chunk.
+    """
+    options = synthetic_options(options)
+    rng = np.random.default_rng(seed)
+    tag = uuid.uuid4().hex[:6]
+    started = time.perf_counter()
+    now = timezone.now()
+
+    specialists = create_staff(options, tag)
+    customer_count = max(1, int(round(cases / options['CASES_PER_CUSTOMER'])))
+    customer_ids = []
+    for start in range(0, customer_count, chunk_size):
+        users = User.objects.bulk_create([
+            User(username=f"customer-{tag}-{i}", password='!')
+            for i in range(start, min(start + chunk_size, customer_count))
+        ])
+        customer_ids.extend(user.id for user in users)
+    customer_ids = np.array(customer_ids)
+    any_specialist = [user_id for ids in specialists.values() for user_id in ids]
+
+    totals = {'analyses': 0, 'messages': 0}
+    with explicit_timestamps(DisputeCase, RiskAnalysis, DisputeChatMessage):
+        for start in range(0, cases, chunk_size):
+            size = min(chunk_size, cases - start)
+            with transaction.atomic():
+                written = _write_chunk(rng, size, options, now, customer_ids, specialists, any_specialist)
+            totals['analyses'] += written[0]
+            totals['messages'] += written[1]
+            if progress:
+                progress(start + size)
+
+    rebuild_rollups()
+    invalidate_routing()
+    return SyntheticSummary(
+        len(customer_ids), len(any_specialist), cases, totals['analyses'], totals['messages'], time.perf_counter() - started,
+    )
+
+
+def _write_chunk(rng, size, options, now, customer_ids, specialists, any_specialist):
+    categories = _choices(rng, options['CATEGORIES'], size)
+    statuses = _choices(rng, options['STATUSES'], size)
+    classifications = _choices(rng, options['CLASSIFICATIONS'], size)
+    risks = _choices(rng, options['RISK_LEVELS'], size)
+    amounts = np.clip(np.round(rng.lognormal(np.log(options['AMOUNT_MEDIAN']), options['AMOUNT_SIGMA'], size), 2), 0.5, 99_999)
+    ages = rng.uniform(0, options['DAYS'] * 86400, size)
+    customers = customer_ids[rng.integers(len(customer_ids), size=size)]
+    assigned = rng.random(size) < options['ASSIGNED_RATE']
+    picks = rng.random(size)
+    variants = rng.integers(1 << 30, size=size)
+
+    cases, analyses = [], []
+    for i in range(size):
+        category, classification, risk = categories[i], classifications[i], risks[i]
+        analyzed = statuses[i] != 'NEW'
+        merchants = MERCHANTS.get(category) or [category]
+        templates = DESCRIPTIONS.get(classification) or DESCRIPTIONS['Unknown']
+        description = templates[variants[i] % len(templates)].format(
+            merchant=merchants[variants[i] // 7 % len(merchants)], amount=f"{amounts[i]:.2f}",
+        )
+        # The same routing the analysis pipeline applies
+        priority = 'CRITICAL' if analyzed and (risk == 'High' or classification == 'Unauthorized Transaction') else 'MEDIUM'
+        team = specialists.get(classification) if analyzed and assigned[i] else None
+        created_at = now - timedelta(seconds=float(ages[i]))
+        cases.append(DisputeCase(
+            description=description,
+            amount=Decimal(f"{amounts[i]:.2f}"),
+            merchant_category=category,
+            status=statuses[i],
+            priority=priority,
+            priority_rank=DisputeCase.PRIORITY_RANKS[priority],
+            is_high_risk=analyzed and risk == 'High',
+            customer_id=int(customers[i]),
+            assigned_ops_id=team[int(picks[i] * len(team))] if team else None,
+            created_at=created_at,
+        ))
+        if analyzed:
+            signals = FRAUD_SIGNALS.get(risk, [])
+            analyses.append(RiskAnalysis(
+                risk_score=risk,
+                classification=classification,
+                fraud_signals=signals[:1 + variants[i] % 3] if signals else [],
+                reasoning_steps=[
+                    f"Claim reads as {classification.lower()}.",
+                    f"Amount ${amounts[i]:.2f} at a {category} merchant.",
+                    f"Risk assessed as {risk.lower()}.",
+                ],
+                recommended_action=ACTIONS.get(risk, 'Manual Review Required'),
+                financial_exposure='Full Amount' if risk == 'High' else 'Partial',
+                created_at=created_at + timedelta(minutes=2),
+            ))
+
+    DisputeCase.objects.bulk_create(cases)
+    analyzed_cases = [case for case in cases if case.status != 'NEW']
+    for case, analysis in zip(analyzed_cases, analyses):
+        analysis.case_id = case.id
+    RiskAnalysis.objects.bulk_create(analyses)
+
+    # Customers and ops take turns; some ops turns are internal notes
+    counts = rng.poisson(options['MESSAGES_PER_CASE'], size)
+    rolls = iter(rng.random(int(counts.sum())))
+    messages = []
+    for case, count in zip(cases, counts):
+        ops_id = case.assigned_ops_id or (any_specialist[case.id % len(any_specialist)] if any_specialist else None)
+        for n in range(count):
+            roll = next(rolls)
+            message = DisputeChatMessage(case_id=case.id, created_at=min(case.created_at + timedelta(hours=n + 1), now))
+            if n % 2 == 0 or ops_id is None:
+                message.sender_id, message.message = case.customer_id, CUSTOMER_MESSAGES[int(roll * len(CUSTOMER_MESSAGES))]
+            elif roll < options['INTERNAL_NOTE_RATE']:
+                message.sender_id, message.message, message.is_internal_note = ops_id, INTERNAL_NOTES[n % len(INTERNAL_NOTES)], True
+            else:
+                message.sender_id, message.message = ops_id, OPS_MESSAGES[int(roll * len(OPS_MESSAGES))]
+            messages.append(message)
+    DisputeChatMessage.objects.bulk_create(messages)
+    return len(analyses), len(messages)
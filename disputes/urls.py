@@ -7,7 +7,16 @@ urlpatterns = [
     path('', core_views.home, name='landing'),
     path('dashboard/', views.customer_dashboard, name='customer_dashboard'),
     path('ops/', views.ops_dashboard, name='ops_dashboard'),
+    path('api/cases/', views.customer_cases_api, name='customer_cases_api'),
+    path('api/ops/cases/', views.ops_cases_api, name='ops_cases_api'),
+    path('ops/search/', views.ops_search, name='ops_search'),
+    path('api/ops/search/', views.ops_search_api, name='ops_search_api'),
     path('analyze/', views.analyze_dispute, name='analyze_dispute'),
+    path('ingest/', views.ingest_disputes, name='ingest_disputes'),
     path('result/<int:case_id>/', views.dispute_result, name='dispute_result'),
+    path('result/<int:case_id>/status/', views.dispute_status, name='dispute_status'),
+    path('result/<int:case_id>/messages/', views.dispute_messages, name='dispute_messages'),
+    path('result/<int:case_id>/events/', views.dispute_events, name='dispute_events'),
     path('insights/', views.insights_dashboard, name='insights_dashboard'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
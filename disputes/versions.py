@@ -0,0 +1,54 @@
+"""
+Version stamps shared by every process through the database.
+
+Caches that live in a process or a session (ops roles, the specialist routing
+table) are stamped with a named version, and changes bump it with one UPDATE.
+Unlike the default cache, which is per process unless CACHES names a shared
+backend, the row is seen by every worker and host. Reads are memoized per
+process for at most DISPUTES_VERSION_POLL_SECONDS, which bounds how long
+another process can keep using a stale entry; a bump clears the memo in its
+own process at once.
+"""
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import SharedVersion
+
+VERSION_POLL_SECONDS = 1.0
+
+# name -> (version, monotonic time it was read)
+_memo = {}
+
+
+def version_poll_seconds():
+    return getattr(settings, 'DISPUTES_VERSION_POLL_SECONDS', VERSION_POLL_SECONDS)
+
+
+def current_version(name):
+    """
+    The version of `name` (0 until first bumped), at most VERSION_POLL_SECONDS old.
+    """
+    now = time.monotonic()
+    memo = _memo.get(name)
+    if memo is not None and now - memo[1] < version_poll_seconds():
+        return memo[0]
+    version = SharedVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+    _memo[name] = (version, now)
+    return version
+
+
+def bump_version(name):
+    """
+    Increments the version of `name`, creating its row on first use.
+    """
+    if not SharedVersion.objects.filter(name=name).update(version=F('version') + 1):
+        try:
+            with transaction.atomic():
+                SharedVersion.objects.create(name=name, version=1)
+        except IntegrityError:
+            # Another process created it first
+            SharedVersion.objects.filter(name=name).update(version=F('version') + 1)
+    _memo.pop(name, None)
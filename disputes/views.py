@@ -1,147 +1,404 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import DisputeCase, RiskAnalysis, DisputeChatMessage
-from .services import DisputeReasoningAgent
-from django.db.models import Count, Q, Case, When, IntegerField, Value
-from django.contrib.auth.models import Group, User
-import random
-from django.utils import timezone
+from .ingest import IngestError, ingest_file
+from .jobs import enqueue_analysis
+from .live import case_stream, message_payload, messages_after, visible_messages
+from .metrics import get_registry, scrape_allowed
+from .pagination import InvalidCursor, keyset_page
+from .pipeline import analyze_case
+from .roles import is_ops_user
+from .rollups import INSIGHT_RANGES, cached_insights
+from .search import SEARCH_PAGE_SIZE, SearchError, search_cases
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 
-def is_ops_user(user):
-    return user.is_staff or user.groups.filter(name='Risk Ops').exists()
+def can_view_case(user, case):
+    # Owner or ops; compares ids so checking ownership does not load the customer
+    return (case.customer_id is not None and user.id == case.customer_id) or is_ops_user(user)
+
+CASE_LIST_ORDERING = ['-created_at', '-id']
+CASE_LIST_PAGE_SIZE = 25
+
+TRIAGE_ORDERING = ['-priority_rank', '-created_at', '-id']
+TRIAGE_PAGE_SIZE = 50
+
+# Fields the list APIs can project (?fields=...), mapped to ORM paths. Related
+# fields are only joined when asked for.
+CASE_LIST_FIELDS = {
+    'id': 'id',
+    'description': 'description',
+    'amount': 'amount',
+    'merchant_category': 'merchant_category',
+    'status': 'status',
+    'priority': 'priority',
+    'created_at': 'created_at',
+    'is_high_risk': 'is_high_risk',
+    'customer': 'customer__username',
+    'assigned_ops': 'assigned_ops__username',
+    'risk_score': 'analysis__risk_score',
+    'classification': 'analysis__classification',
+}
+CUSTOMER_LIST_DEFAULT_FIELDS = ['id', 'merchant_category', 'amount', 'status', 'created_at']
+OPS_LIST_DEFAULT_FIELDS = ['id', 'priority', 'is_high_risk', 'classification', 'customer', 'amount', 'created_at']
+API_MAX_PAGE_SIZE = 100
+
+def triage_queue(user):
+    # Filter: Show cases assigned to ME, or Critical, or High Risk. Plain columns on
+    # DisputeCase (no join, no DISTINCT), each branch backed by an index in triage order
+    return DisputeCase.objects.filter(
+        Q(is_high_risk=True) |
+        Q(assigned_ops=user) |
+        Q(priority_rank=DisputeCase.PRIORITY_RANKS['CRITICAL'])
+    )
+
+def _case_list_response(request, queryset, ordering, default_fields):
+    """
+    One keyset page of a case list as JSON, projected to ?fields= and filtered by ?status= / ?priority=.
+    """
+    # 1. Projection
+    fields = [f for f in request.GET.get('fields', '').split(',') if f] or default_fields
+    unknown = [f for f in fields if f not in CASE_LIST_FIELDS]
+    if unknown:
+        return JsonResponse({'error': f"Unknown fields: {', '.join(unknown)}", 'allowed': sorted(CASE_LIST_FIELDS)}, status=400)
+
+    # 2. Filters
+    status = request.GET.get('status')
+    if status:
+        if status not in dict(DisputeCase.STATUS_CHOICES):
+            return JsonResponse({'error': f"Unknown status '{status}'"}, status=400)
+        queryset = queryset.filter(status=status)
+    priority = request.GET.get('priority')
+    if priority:
+        if priority not in DisputeCase.PRIORITY_RANKS:
+            return JsonResponse({'error': f"Unknown priority '{priority}'"}, status=400)
+        queryset = queryset.filter(priority_rank=DisputeCase.PRIORITY_RANKS[priority])
+
+    try:
+        limit = min(max(int(request.GET.get('limit', CASE_LIST_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': "limit must be an integer"}, status=400)
+
+    # 3. Keyset page over only the projected columns (plus the sort key)
+    paths = {name: CASE_LIST_FIELDS[name] for name in fields}
+    columns = dict.fromkeys(list(paths.values()) + [order.lstrip('-') for order in ordering])
+    try:
+        rows, next_cursor = keyset_page(queryset.values(*columns), ordering, request.GET.get('after'), limit)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'results': [{name: row[path] for name, path in paths.items()} for row in rows],
+        'next_cursor': next_cursor,
+    })
 
 @login_required
 def customer_dashboard(request):
-    cases = DisputeCase.objects.filter(customer=request.user).order_by('-created_at')
-    return render(request, 'disputes/dashboard.html', {'cases': cases})
+    cases = DisputeCase.objects.filter(customer=request.user)
+    try:
+        cases, next_cursor = keyset_page(cases, CASE_LIST_ORDERING, request.GET.get('after'), CASE_LIST_PAGE_SIZE)
+    except InvalidCursor:
+        return redirect('customer_dashboard')
+    return render(request, 'disputes/dashboard.html', {'cases': cases, 'next_cursor': next_cursor})
+
+@login_required
+def customer_cases_api(request):
+    return _case_list_response(
+        request, DisputeCase.objects.filter(customer=request.user), CASE_LIST_ORDERING, CUSTOMER_LIST_DEFAULT_FIELDS
+    )
 
 @user_passes_test(is_ops_user)
 def ops_dashboard(request):
-    # Sort Logic: CRITICAL(4) > HIGH(3) > MEDIUM(2) > LOW(1)
-    # Filter: Show cases assigned to ME, or Critical Unassigned, or High Risk
-    
-    # 1. Base Query: High Risk OR Assigned to Me OR Critical
-    base_qs = DisputeCase.objects.filter(
-        Q(analysis__risk_score='High') | 
-        Q(assigned_ops=request.user) |
-        Q(priority='CRITICAL')
-    ).distinct()
-
-    # 2. Annotate with numeric priority
-    cases = base_qs.annotate(
-        priority_val=Case(
-            When(priority='CRITICAL', then=Value(4)),
-            When(priority='HIGH', then=Value(3)),
-            When(priority='MEDIUM', then=Value(2)),
-            When(priority='LOW', then=Value(1)),
-            default=Value(0),
-            output_field=IntegerField(),
-        )
-    ).order_by('-priority_val', '-created_at')
-    
-    return render(request, 'disputes/ops_dashboard.html', {'cases': cases})
+    # Sort Logic: CRITICAL(4) > HIGH(3) > MEDIUM(2) > LOW(1), newest first
+    queue = triage_queue(request.user).select_related('analysis', 'customer')
+
+    # Keyset page: constant cost however deep the reader pages
+    try:
+        cases, next_cursor = keyset_page(queue, TRIAGE_ORDERING, request.GET.get('after'), TRIAGE_PAGE_SIZE)
+    except InvalidCursor:
+        return redirect('ops_dashboard')
+
+    return render(request, 'disputes/ops_dashboard.html', {'cases': cases, 'next_cursor': next_cursor})
+
+@login_required
+def ops_cases_api(request):
+    if not is_ops_user(request.user):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    # Same order as the dashboard, so lazy-loaded pages continue it
+    return _case_list_response(request, triage_queue(request.user), TRIAGE_ORDERING, OPS_LIST_DEFAULT_FIELDS)
 
-def assign_specialist(case, classification):
+SEARCH_RISK_LEVELS = ['High', 'Medium', 'Low']
+
+def _search_request(request):
     """
-    Finds a group named 'Specialist: <Classification>' and assigns a random member.
+    (query, filters) from ?q=&category=&risk=&status=. Raises SearchError for unknown values.
     """
-    group_name = f"Specialist: {classification}"
+    filters = {
+        'category': request.GET.get('category', '').strip() or None,
+        'risk': request.GET.get('risk') or None,
+        'status': request.GET.get('status') or None,
+    }
+    if filters['risk'] and filters['risk'] not in SEARCH_RISK_LEVELS:
+        raise SearchError(f"Unknown risk level '{filters['risk']}'")
+    if filters['status'] and filters['status'] not in dict(DisputeCase.STATUS_CHOICES):
+        raise SearchError(f"Unknown status '{filters['status']}'")
+    return request.GET.get('q', '').strip(), filters
+
+@user_passes_test(is_ops_user)
+def ops_search(request):
+    hits, next_cursor, error = [], None, None
     try:
-        group = Group.objects.get(name=group_name)
-        users = group.user_set.filter(is_active=True)
-        if users.exists():
-            # Pick one randomly or round-robin (random for MVP)
-            specialist = random.choice(list(users))
-            case.assigned_ops = specialist
-            case.save()
-            return specialist
-    except Group.DoesNotExist:
-        pass
-    return None
+        query, filters = _search_request(request)
+        if query:
+            hits, next_cursor = search_cases(query, cursor=request.GET.get('after'), **filters)
+    except (SearchError, InvalidCursor) as e:
+        query, filters, error = request.GET.get('q', ''), {}, str(e)
+
+    # The next page keeps the query and filters
+    next_params = request.GET.copy()
+    next_params['after'] = next_cursor or ''
+    return render(request, 'disputes/search.html', {
+        'query': query,
+        'filters': filters,
+        'hits': hits,
+        'next_url': f"?{next_params.urlencode()}" if next_cursor else None,
+        'error': error,
+        'risk_levels': SEARCH_RISK_LEVELS,
+        'statuses': DisputeCase.STATUS_CHOICES,
+    })
+
+@login_required
+def ops_search_api(request):
+    if not is_ops_user(request.user):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    try:
+        query, filters = _search_request(request)
+        limit = min(max(int(request.GET.get('limit', SEARCH_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+        hits, next_cursor = search_cases(query, cursor=request.GET.get('after'), page_size=limit, **filters)
+    except ValueError as e:  # SearchError, InvalidCursor, a bad limit
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'results': [
+            {
+                'id': hit.case.id,
+                'merchant_category': hit.case.merchant_category,
+                'amount': hit.case.amount,
+                'status': hit.case.status,
+                'priority': hit.case.priority,
+                'risk_score': getattr(getattr(hit.case, 'analysis', None), 'risk_score', None),
+                'classification': getattr(getattr(hit.case, 'analysis', None), 'classification', None),
+                'created_at': hit.case.created_at,
+                'score': hit.score,
+                'snippet': hit.snippet,
+            }
+            for hit in hits
+        ],
+        'next_cursor': next_cursor,
+    })
 
 @login_required
 def analyze_dispute(request):
-    result = None
     if request.method == 'POST':
         description = request.POST.get('description')
         amount = request.POST.get('amount')
         category = request.POST.get('category')
         
-        # Save Case
-        case = DisputeCase.objects.create(
+        case = DisputeCase(
             customer=request.user,
             description=description,
             amount=amount,
             merchant_category=category,
-            status='ANALYZED'
+            status='NEW'
         )
-        
-        # Run Agent
-        agent = DisputeReasoningAgent()
-        analysis_json = agent.analyze(description, amount, category)
-        
-        # Save Analysis
-        classification = analysis_json.get('classification', 'Unknown')
-        analysis = RiskAnalysis.objects.create(
-            case=case,
-            risk_score=analysis_json.get('risk_level', 'Unknown'),
-            classification=classification,
-            fraud_signals=analysis_json.get('fraud_signals', []),
-            reasoning_steps=analysis_json.get('reasoning_steps', []),
-            recommended_action=analysis_json.get('recommended_action', 'Manual Review'),
-            financial_exposure=analysis_json.get('financial_exposure', 'Unknown')
-        )
-        
-        # Auto-Routing Logic
-        if analysis.risk_score == 'High' or classification == 'Unauthorized Transaction':
-            case.priority = 'CRITICAL'
-            case.save()
-        
-        # Attempt Specialist Assignment
-        assign_specialist(case, classification)
+        if settings.DISPUTES_ASYNC_ANALYSIS:
+            # Save Case and hand analysis off to the worker queue
+            with transaction.atomic():
+                case.save()
+                enqueue_analysis(case)
+        else:
+            # Analyze first; the case, its analysis and assignment are then written in one transaction
+            analyze_case(case)
         
         return redirect('dispute_result', case_id=case.id)
         
     return render(request, 'disputes/analyze.html')
 
+@user_passes_test(is_ops_user)
+@require_POST
+def ingest_disputes(request):
+    """
+    Bulk upload of a CSV/JSONL export (multipart field 'file'). Large uploads are
+    spooled to disk by Django and streamed through the importer.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': "Upload a CSV or JSONL file in the 'file' field."}, status=400)
+    try:
+        summary = ingest_file(upload.file, upload.name, fmt=request.POST.get('format') or None)
+    except IngestError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'ingestion_id': summary.run.id,
+        'status': summary.run.status,
+        'resumed_from': summary.resumed_from,
+        'rows_read': summary.rows_read,
+        'rows_created': summary.rows_created,
+        'rows_rejected': summary.rows_rejected,
+        'errors': summary.run.errors,
+        'rows_per_second': round(summary.rows_per_second, 1),
+    })
+
 def dispute_result(request, case_id):
     case = get_object_or_404(DisputeCase, id=case_id)
     # Security check: only allow owner or ops
-    if request.user != case.customer and not is_ops_user(request.user):
+    if not can_view_case(request.user, case):
         return redirect('customer_dashboard')
         
     if request.method == 'POST' and 'message' in request.POST:
-        message_text = request.POST.get('message')
-        if message_text:
-            DisputeChatMessage.objects.create(
-                case=case,
-                sender=request.user,
-                message=message_text,
-                is_internal_note=False 
-            )
-            return redirect('dispute_result', case_id=case.id)
-            
-    messages = case.messages.all().order_by('created_at')
+        _post_message(request, case)
+        return redirect('dispute_result', case_id=case.id)
+
+    # Internal notes are for the ops team only
+    is_ops = is_ops_user(request.user)
+    messages = list(visible_messages(case.id, include_internal=is_ops).select_related('sender').order_by('id'))
+
+    # Analysis runs in the background worker; the page waits for it over the live stream
+    analysis_pending = not hasattr(case, 'analysis')
+    latest_job = case.analysis_jobs.order_by('-id').first() if analysis_pending else None
         
-    return render(request, 'disputes/result.html', {'case': case, 'chat_messages': messages})
+    return render(request, 'disputes/result.html', {
+        'case': case,
+        'chat_messages': messages,
+        'last_message_id': messages[-1].id if messages else 0,
+        'is_ops': is_ops,
+        'analysis_pending': analysis_pending,
+        'analysis_failed': latest_job is not None and latest_job.status == 'FAILED',
+    })
+
+def _post_message(request, case):
+    # Returns the new message, or None for an empty one. Only ops can write internal notes.
+    message_text = (request.POST.get('message') or '').strip()
+    if not message_text:
+        return None
+    return DisputeChatMessage.objects.create(
+        case=case,
+        sender=request.user,
+        message=message_text,
+        is_internal_note=bool(request.POST.get('internal')) and is_ops_user(request.user),
+    )
+
+@login_required
+def dispute_messages(request, case_id):
+    """
+    Chat without page reloads: GET returns the messages after ?after=<id>,
+    POST adds one and returns it.
+    """
+    case = get_object_or_404(DisputeCase, id=case_id)
+    if not can_view_case(request.user, case):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+
+    if request.method == 'POST':
+        message = _post_message(request, case)
+        if message is None:
+            return JsonResponse({'error': 'message is required'}, status=400)
+        return JsonResponse(message_payload(message, request.user.id), status=201)
+
+    try:
+        after = int(request.GET.get('after') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'after must be a message id'}, status=400)
+    messages = messages_after(case.id, request.user.id, is_ops_user(request.user), after)
+    return JsonResponse({'messages': messages, 'last_id': messages[-1]['id'] if messages else after})
+
+async def dispute_events(request, case_id):
+    """
+    Server-sent events for the result page: new chat messages and case status
+    changes (see disputes/live.py). Follows the case until STREAM_SECONDS under
+    ASGI; under WSGI each connection sends what is new and the browser reconnects.
+    """
+    case, include_internal = await sync_to_async(_stream_access)(request, case_id)
+    if case is None:
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    # A reconnecting EventSource resumes after the last message it received
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.GET.get('after') or 0)
+    except ValueError:
+        after = 0
+
+    follow = isinstance(request, ASGIRequest)
+    events = case_stream(case.id, request.user.id, include_internal, after, follow=follow)
+    if not follow:
+        # WSGI serves async iterators by buffering them anyway; hand it the finished list
+        events = [event async for event in events]
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _stream_access(request, case_id):
+    # The sync auth checks for the async stream view, on the request's own (role-cached)
+    # user; login_required would load the user a second time through request.auser()
+    case = get_object_or_404(DisputeCase, id=case_id)
+    if not can_view_case(request.user, case):
+        return None, False
+    return case, is_ops_user(request.user)
+
+@login_required
+def dispute_status(request, case_id):
+    """
+    Lightweight poll target for the result page while analysis is pending.
+    """
+    case = get_object_or_404(DisputeCase, id=case_id)
+    if not can_view_case(request.user, case):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+
+    latest_job = case.analysis_jobs.order_by('-id').values('status', 'attempts', 'partial').first()
+    return JsonResponse({
+        'case_id': case.id,
+        'status': case.status,
+        'analyzed': RiskAnalysis.objects.filter(case=case).exists(),
+        'job': latest_job,
+    })
 
 def insights_dashboard(request):
     if not is_ops_user(request.user):
          return redirect('customer_dashboard')
-         
-    total_cases = DisputeCase.objects.count()
-    high_risk = RiskAnalysis.objects.filter(risk_score='High').count()
-    
-    # Top Categories
-    categories = DisputeCase.objects.values('merchant_category').annotate(total=Count('id')).order_by('-total')[:5]
-    
-    # Common Classifications
-    classifications = RiskAnalysis.objects.values('classification').annotate(total=Count('id')).order_by('-total')[:5]
-    
+
+    # Optional time range (?days=7|30|90); figures come from the rollup table, not the fact tables
+    allowed_days = {days for days, _ in INSIGHT_RANGES if days}
+    try:
+        days = int(request.GET.get('days', 0)) or None
+    except ValueError:
+        days = None
+    if days not in allowed_days:
+        days = None
+
+    insights = cached_insights(days)
+    trend = insights['trend']
+    peak = max([day['total'] for day in trend] or [0])
+
     context = {
-        'total_cases': total_cases,
-        'high_risk_count': high_risk,
-        'categories': categories,
-        'classifications': classifications
+        'total_cases': insights['total_cases'],
+        'high_risk_count': insights['high_risk_count'],
+        'categories': insights['categories'],
+        'classifications': insights['classifications'],
+        'max_classification': max([c['total'] for c in insights['classifications']] or [0]),
+        'trend': trend,
+        'trend_peak': peak,
+        'ranges': INSIGHT_RANGES,
+        'days': days,
     }
     return render(request, 'disputes/insights.html', context)
+
+def metrics(request):
+    # Prometheus scrape endpoint; hidden from anything but the configured scrapers
+    if not scrape_allowed(request):
+        raise Http404
+    return HttpResponse(get_registry().render(), content_type='text/plain; version=0.0.4; charset=utf-8')